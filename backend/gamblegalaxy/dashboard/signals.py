@@ -5,6 +5,8 @@ from .models import UserStats, RecentActivity, TopWinner
 from wallet.models import Transaction
 from betting.models import Bet
 from games.models import AviatorBet
+from wallet.signals import transactions_recorded
+from games.signals import aviator_bets_cashed_out, aviator_bets_placed
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_stats(sender, instance, created, **kwargs):
@@ -14,14 +16,22 @@ def create_user_stats(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Transaction)
 def create_activity_from_transaction(sender, instance, created, **kwargs):
     if created:
-        activity_type = instance.transaction_type
-        RecentActivity.objects.create(
-            user=instance.user,
-            activity_type=activity_type,
-            amount=instance.amount,
-            description=f"{activity_type.title()} of KES {instance.amount}",
-            status='completed'
-        )
+        transaction_activity(instance).save()
+
+@receiver(transactions_recorded)
+def create_activity_from_transactions(sender, transactions, **kwargs):
+    RecentActivity.objects.bulk_create([transaction_activity(t) for t in transactions])
+
+def transaction_activity(transaction):
+    """Unsaved activity row for a wallet transaction"""
+    activity_type = transaction.transaction_type
+    return RecentActivity(
+        user_id=transaction.user_id,
+        activity_type=activity_type,
+        amount=transaction.amount,
+        description=f"{activity_type.title()} of KES {transaction.amount}",
+        status='completed'
+    )
 
 @receiver(post_save, sender=Bet)
 def create_activity_from_bet(sender, instance, created, **kwargs):
@@ -71,33 +81,62 @@ def create_activity_from_bet(sender, instance, created, **kwargs):
 @receiver(post_save, sender=AviatorBet)
 def create_activity_from_aviator_bet(sender, instance, created, **kwargs):
     if created:
-        RecentActivity.objects.create(
-            user=instance.user,
-            activity_type='bet',
-            game_type='aviator',
-            amount=instance.amount,
-            description=f"Aviator bet of KES {instance.amount}",
-            status='pending'
-        )
+        aviator_bet_activity(instance).save()
     
     # Handle aviator wins
     if instance.is_winner and instance.cash_out_multiplier:
-        win_amount = instance.win_amount()
-        RecentActivity.objects.create(
-            user=instance.user,
-            activity_type='cashout',
-            game_type='aviator',
+        activity, top_winner = aviator_cashout_records(instance, instance.win_amount())
+        activity.save()
+        if top_winner:
+            top_winner.save()
+
+@receiver(aviator_bets_cashed_out)
+def create_activity_from_aviator_cashouts(sender, bets, **kwargs):
+    activities = []
+    top_winners = []
+    for bet in bets:
+        win_amount = round(float(bet.amount) * bet.cash_out_multiplier, 2)
+        activity, top_winner = aviator_cashout_records(bet, win_amount)
+        activities.append(activity)
+        if top_winner:
+            top_winners.append(top_winner)
+    RecentActivity.objects.bulk_create(activities)
+    TopWinner.objects.bulk_create(top_winners)
+
+@receiver(aviator_bets_placed)
+def create_activity_from_aviator_bets(sender, bets, **kwargs):
+    RecentActivity.objects.bulk_create([aviator_bet_activity(bet) for bet in bets])
+
+def aviator_bet_activity(bet):
+    """Unsaved activity row for a newly placed Aviator bet"""
+    return RecentActivity(
+        user_id=bet.user_id,
+        activity_type='bet',
+        game_type='aviator',
+        amount=bet.amount,
+        description=f"Aviator bet of KES {bet.amount}",
+        status='pending'
+    )
+
+def aviator_cashout_records(bet, win_amount):
+    """Unsaved activity row (and top winner row for big wins) for an Aviator cashout"""
+    activity = RecentActivity(
+        user_id=bet.user_id,
+        activity_type='cashout',
+        game_type='aviator',
+        amount=win_amount,
+        multiplier=bet.cash_out_multiplier,
+        description=f"Aviator cashout at {bet.cash_out_multiplier}x",
+        status='completed'
+    )
+    
+    # Create top winner entry for big wins
+    top_winner = None
+    if win_amount >= 1000:
+        top_winner = TopWinner(
+            user_id=bet.user_id,
             amount=win_amount,
-            multiplier=instance.cash_out_multiplier,
-            description=f"Aviator cashout at {instance.cash_out_multiplier}x",
-            status='completed'
+            game_type='aviator',
+            multiplier=bet.cash_out_multiplier
         )
-        
-        # Create top winner entry for big wins
-        if win_amount >= 1000:
-            TopWinner.objects.create(
-                user=instance.user,
-                amount=win_amount,
-                game_type='aviator',
-                multiplier=instance.cash_out_multiplier
-            )
\ No newline at end of file
+    return activity, top_winner
@@ -7,6 +7,7 @@ django.setup()
 
 # Now it's safe to import things that use Django settings
 import games.routing
+from games.ws_auth import JWTAuthMiddleware
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 from channels.auth import AuthMiddlewareStack
@@ -14,8 +15,10 @@ from channels.auth import AuthMiddlewareStack
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
-        URLRouter(
-            games.routing.websocket_urlpatterns
+        JWTAuthMiddleware(
+            URLRouter(
+                games.routing.websocket_urlpatterns
+            )
         )
     ),
 })
\ No newline at end of file
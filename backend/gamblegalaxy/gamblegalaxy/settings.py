@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -81,6 +82,56 @@ else:
         },
     }
 
+# Aviator engine
+# 'redis' shares the round state between every worker; 'local' keeps it in-process
+AVIATOR_ROUND_STATE_BACKEND = os.getenv('AVIATOR_ROUND_STATE_BACKEND', 'redis' if REDIS_URL else 'local')
+# Only the holder of this lease runs the game loop; others take over within TTL seconds of it dying
+AVIATOR_LOOP_LEASE_BACKEND = os.getenv('AVIATOR_LOOP_LEASE_BACKEND', 'redis' if REDIS_URL else 'local')
+AVIATOR_LOOP_LEASE_TTL = float(os.getenv('AVIATOR_LOOP_LEASE_TTL', '10'))
+# Set to False when `manage.py start_aviator_loop` runs the loop so web workers never campaign for it
+AVIATOR_LOOP_IN_WEB = os.getenv('AVIATOR_LOOP_IN_WEB', 'True') == 'True'
+# Tables one loop worker runs side by side, served on ws/aviator/<table>/ (see games.tables.AviatorTable)
+AVIATOR_TABLES = json.loads(os.getenv('AVIATOR_TABLES', '{"default": {}}'))
+# 'stream' sends a multiplier frame every tick; 'curve' sends the flight curve once and
+# clients extrapolate it, with a sync beacon every AVIATOR_SYNC_INTERVAL seconds
+AVIATOR_TICK_MODE = os.getenv('AVIATOR_TICK_MODE', 'stream')
+AVIATOR_SYNC_INTERVAL = float(os.getenv('AVIATOR_SYNC_INTERVAL', '2.0'))
+# How often, while betting is open, the loop picks up bets inserted outside the round actor (e.g. simulate_bots)
+AVIATOR_BET_BOOK_REFRESH_INTERVAL = float(os.getenv('AVIATOR_BET_BOOK_REFRESH_INTERVAL', '1.0'))
+# Crash settlement slower than this many milliseconds per 1000 losing bets (and at least one budget per round) is logged
+AVIATOR_SETTLEMENT_BUDGET_MS = float(os.getenv('AVIATOR_SETTLEMENT_BUDGET_MS', '50'))
+# Bets and cashouts are group-committed every AVIATOR_JOURNAL_FLUSH_MS or AVIATOR_JOURNAL_BATCH_SIZE events
+AVIATOR_JOURNAL_FLUSH_MS = float(os.getenv('AVIATOR_JOURNAL_FLUSH_MS', '5'))
+AVIATOR_JOURNAL_BATCH_SIZE = int(os.getenv('AVIATOR_JOURNAL_BATCH_SIZE', '200'))
+# Fold bets, cashouts and bot actions into one 'frame' message per tick instead of one message each;
+# workers not running the loop flush their own events every AVIATOR_FRAME_INTERVAL seconds.
+# Clients must unpack 'frame' messages (lib/websocket.ts does) - turn on only once they all do
+AVIATOR_EVENT_FRAMES = os.getenv('AVIATOR_EVENT_FRAMES', 'False') == 'True'
+AVIATOR_FRAME_INTERVAL = float(os.getenv('AVIATOR_FRAME_INTERVAL', '0.1'))
+# Game loop ticks later than this past their deadline are counted as late in the round's timing report
+AVIATOR_TICK_LATE_MS = float(os.getenv('AVIATOR_TICK_LATE_MS', '10'))
+# The compiled crash sampler is rebuilt on CrashMultiplierSetting changes in-process, and at least this often
+AVIATOR_CRASH_SAMPLER_TTL = float(os.getenv('AVIATOR_CRASH_SAMPLER_TTL', '60'))
+# Rounds are pre-generated AVIATOR_ROUND_BATCH_SIZE at a time whenever fewer than AVIATOR_ROUND_LOW_WATER are queued
+AVIATOR_ROUND_BATCH_SIZE = int(os.getenv('AVIATOR_ROUND_BATCH_SIZE', '20'))
+AVIATOR_ROUND_LOW_WATER = int(os.getenv('AVIATOR_ROUND_LOW_WATER', '5'))
+# Split aviator_room into this many sub-groups (aviator_room.0 ...) that are published to in parallel
+AVIATOR_ROOM_SHARDS = int(os.getenv('AVIATOR_ROOM_SHARDS', '1'))
+# Conflate ticks for, and disconnect, sockets more than AVIATOR_OUTBOX_LIMIT frames or AVIATOR_OUTBOX_MAX_LAG
+# seconds behind. Only works on an ASGI server whose send waits for the socket to drain (uvicorn, hypercorn);
+# daphne, which render.yaml runs, buffers every frame instead, so leave it off there (see ConnectionOutbox)
+AVIATOR_OUTBOX_BACKPRESSURE = os.getenv('AVIATOR_OUTBOX_BACKPRESSURE', 'False') == 'True'
+AVIATOR_OUTBOX_LIMIT = int(os.getenv('AVIATOR_OUTBOX_LIMIT', '256'))
+AVIATOR_OUTBOX_MAX_LAG = float(os.getenv('AVIATOR_OUTBOX_MAX_LAG', '15'))
+# Bets/cashouts the round actor may hold before refusing more; REST views wait AVIATOR_ROUND_ACTOR_TIMEOUT seconds for it
+AVIATOR_ROUND_ACTOR_QUEUE = int(os.getenv('AVIATOR_ROUND_ACTOR_QUEUE', '1000'))
+AVIATOR_ROUND_ACTOR_TIMEOUT = float(os.getenv('AVIATOR_ROUND_ACTOR_TIMEOUT', '5'))
+# Events of the current round kept for clients resuming with their last sequence number
+AVIATOR_REPLAY_BUFFER = int(os.getenv('AVIATOR_REPLAY_BUFFER', '1024'))
+# Sockets silent for AVIATOR_IDLE_TIMEOUT seconds (clients ping every 30s) are dropped from the room; 0 disables
+AVIATOR_IDLE_TIMEOUT = float(os.getenv('AVIATOR_IDLE_TIMEOUT', '75'))
+AVIATOR_IDLE_SWEEP_INTERVAL = float(os.getenv('AVIATOR_IDLE_SWEEP_INTERVAL', '15'))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -0,0 +1,92 @@
+import bisect
+
+from .models import AviatorBet
+
+
+class BookEntry:
+    """An open bet as the game loop needs it - no model instance, no lazy relations"""
+
+    __slots__ = ('bet_id', 'user_id', 'username', 'amount', 'auto_cashout')
+
+    def __init__(self, bet_id, user_id, username, amount, auto_cashout=None):
+        self.bet_id = bet_id
+        self.user_id = user_id
+        self.username = username
+        self.amount = amount
+        self.auto_cashout = auto_cashout
+
+    def win_amount(self):
+        """Payout when the bet is cashed out at its auto-cashout threshold"""
+        return round(float(self.amount) * self.auto_cashout, 2)
+
+    def __repr__(self):
+        return f"BookEntry(bet={self.bet_id}, user={self.username}, auto={self.auto_cashout})"
+
+
+class RoundBetBook:
+    """
+    Open bets of the active round, keyed by user and indexed by auto-cashout threshold.
+
+    The index is a sorted list of (threshold, bet_id), so finding every bet whose
+    threshold the multiplier crossed is one bisect plus a slice. Bets that leave
+    the book another way (manual cashout) are dropped lazily from the index.
+    """
+
+    def __init__(self, round_id):
+        self.round_id = round_id
+        self.version = 0  # bumped whenever a bet enters or leaves the book
+        self._by_bet = {}
+        self._by_user = {}
+        self._auto_index = []
+
+    def __len__(self):
+        return len(self._by_bet)
+
+    def add(self, entry):
+        if entry.bet_id in self._by_bet:
+            return
+        self._by_bet[entry.bet_id] = entry
+        self._by_user[entry.user_id] = entry
+        self.version += 1
+        if entry.auto_cashout:
+            bisect.insort(self._auto_index, (entry.auto_cashout, entry.bet_id))
+
+    def get_for_user(self, user_id):
+        return self._by_user.get(user_id)
+
+    def discard(self, bet_id):
+        """Remove a bet settled outside the auto-cashout path; returns its entry if it was open"""
+        entry = self._by_bet.pop(bet_id, None)
+        if entry is not None:
+            self.version += 1
+            if self._by_user.get(entry.user_id) is entry:
+                del self._by_user[entry.user_id]
+        return entry
+
+    def crossed(self, multiplier):
+        """Whether some threshold is <= multiplier (possibly of a bet that already left the book)"""
+        return bool(self._auto_index) and self._auto_index[0][0] <= multiplier
+
+    def pop_crossed(self, multiplier):
+        """Remove and return the open bets whose auto-cashout threshold is <= multiplier"""
+        cut = bisect.bisect_right(self._auto_index, (multiplier, float('inf')))
+        if not cut:
+            return []
+        crossed = self._auto_index[:cut]
+        del self._auto_index[:cut]
+        return [entry for entry in (self.discard(bet_id) for _, bet_id in crossed) if entry]
+
+    def open_entries(self):
+        return list(self._by_bet.values())
+
+
+def fetch_open_bets(round_id):
+    """
+    Load the round's uncashed bets as book entries, in one query. All of them, not
+    just ids above the last one seen: ids are not committed in order.
+    """
+    rows = AviatorBet.objects.filter(
+        round_id=round_id,
+        cash_out_multiplier__isnull=True
+    ).values_list('id', 'user_id', 'user__username', 'amount', 'auto_cashout')
+    return [BookEntry(*row) for row in rows]
@@ -1,578 +1,410 @@
 import asyncio
-from decimal import Decimal
-import json
-import random
 import time
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django.db import transaction
+from django.conf import settings
 from django.utils import timezone
-from .models import AviatorRound, AviatorBet, SureOdd, CrashMultiplierSetting
-from wallet.models import Wallet, Transaction
+from .round_state import get_round_state_store
+from .game_loop import run_tables
+from .tables import DEFAULT_TABLE, get_table
+from .round_actor import send_to_round_actor
+from .journal import clean_bet, JournalRejected
+from .event_frames import frame_after, run_frame_flusher
+from .wire_format import negotiate
+from .room_shards import shard_for
+from .subscriptions import SUBSCRIBABLE, class_group, user_group, parse_subscriptions, is_subscribed
+from .outbox import ConnectionOutbox
+from .idle_reaper import idle_reaper, run_idle_reaper, PING_FRAMES
 
 # 🔧 CRITICAL FIX: Global game loop management
 _game_loop_task = None
 _game_loop_lock = asyncio.Lock()
-
-# 🔧 IMPROVED: Global round state tracking with better initialization
-_current_round_state = {
-    'round_id': None,
-    'crash_multiplier': None,
-    'current_multiplier': 1.0,
-    'is_active': False,
-    'is_betting': False,
-    'crashed': False,
-    'last_update': 0,
-    'round_start_time': None
-}
-_round_state_lock = asyncio.Lock()
+_frame_flusher_task = None
+_idle_reaper_task = None
 
 class AviatorConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        await self.accept()
-        self.room_group_name = 'aviator_room'
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
-        print(f"[WebSocket] Client connected to {self.room_group_name} at {timezone.now()}")
+        # ws/aviator/<table>/ picks one of AVIATOR_TABLES; ws/aviator/ is the default table
+        self.table = get_table(self.scope["url_route"]["kwargs"].get("table", DEFAULT_TABLE))
+        if self.table is None:
+            await self.close()
+            return
 
-        # 🔧 FIX: Ensure only ONE global game loop runs
-        await self.ensure_single_game_loop()
+        # JSON unless the client negotiated a compact encoding via subprotocol or ?encoding=
+        self.codec, subprotocol = negotiate(self.scope)
+        # Everything we send goes through the outbox, so a slow link never stalls our handlers
+        self.outbox = ConnectionOutbox(self.send, self.close_laggard)
+        await self.accept(subprotocol)
+        self.outbox.start()
+        self.room_group_name = self.table.room_group_name
+        # With AVIATOR_ROOM_SHARDS > 1 the room is split into sub-groups fanned out in parallel
+        self.shard_group_name = shard_for(self.room_group_name, self.channel_name)
+        await self.channel_layer.group_add(self.shard_group_name, self.channel_name)
+        print(f"[WebSocket] Client connected to {self.shard_group_name} at {timezone.now()}")
+
+        # 🔧 Other players' bets, cashouts and the top winners list are opt-out: a client
+        # connecting with ?subscribe= (empty) only gets ticks, round events and its own results
+        self.subscriptions = set()
+        query = parse_qs(self.scope.get("query_string", b"").decode(), keep_blank_values=True)
+        try:
+            subscriptions = parse_subscriptions(query["subscribe"][0]) if "subscribe" in query else SUBSCRIBABLE
+        except ValueError as e:
+            await self.send_message({"error": str(e)})
+            subscriptions = SUBSCRIBABLE
+        await self.subscribe(subscriptions)
+
+        self.player_group_name = None
+        if self.scope["user"].is_authenticated:
+            # Auto cashouts are announced to the owner here, whatever they subscribe to
+            self.player_group_name = user_group(self.room_group_name, self.scope["user"].id)
+            await self.channel_layer.group_add(self.player_group_name, self.channel_name)
+
+        # 🔧 A reconnecting client passes ?resume=<stream>:<sequence> and gets just the
+        # events it missed; everyone else gets the current round and its open bets
+        self.held = None
+        resume_from = self.resume_point()
+        if resume_from is not None:
+            await self.start_resume(*resume_from)
+        else:
+            await self.send_state_frame()
+
+        # 🔧 FIX: Ensure only ONE global game loop runs - unless a start_aviator_loop
+        # process runs it and web workers only serve sockets
+        if settings.AVIATOR_LOOP_IN_WEB:
+            await self.ensure_single_game_loop()
+        self.ensure_frame_flusher()
+        self.ensure_idle_reaper()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
-        print(f"[WebSocket] Client disconnected from {self.room_group_name} at {timezone.now()}")
+        if self.table is None:
+            return
+        if self.held is not None:
+            self.resume_timeout.cancel()
+        self.outbox.close()
+        await self.channel_layer.group_discard(self.shard_group_name, self.channel_name)
+        await self.subscribe(set())
+        if self.player_group_name:
+            await self.channel_layer.group_discard(self.player_group_name, self.channel_name)
+        idle_reaper.unregister(self)
+        print(f"[WebSocket] Client disconnected from {self.shard_group_name} at {timezone.now()}")
 
     async def ensure_single_game_loop(self):
-        """Ensure only one game loop runs globally across all connections"""
+        """
+        Make sure this process campaigns for the game loop lease of every table.
+
+        Every worker runs one campaign task, but only the holder of a table's
+        lease actually runs its loop, so exactly one loop per table is live
+        across the cluster.
+        """
         global _game_loop_task, _game_loop_lock
         
         async with _game_loop_lock:
-            # Check if game loop is already running
+            # Check if this process is already campaigning
             if _game_loop_task is None or _game_loop_task.done():
-                print("🎮 Starting new global game loop")
-                _game_loop_task = asyncio.create_task(self.run_aviator_game())
+                print("🎮 Starting game loop leader campaign")
+                _game_loop_task = asyncio.create_task(run_tables(self.channel_layer))
             else:
-                print("🎮 Game loop already running, skipping creation")
+                print("🎮 Game loop campaign already running, skipping creation")
 
-    @staticmethod
-    async def get_current_round_state():
-        """Get the current round state - can be called from anywhere"""
-        global _current_round_state, _round_state_lock
-        async with _round_state_lock:
-            return _current_round_state.copy()
+    def ensure_frame_flusher(self):
+        """
+        With event frames on, every worker flushes the events its own consumers and views raise.
+        While this worker holds a table's loop lease, the loop's ticks do it instead.
+        """
+        global _frame_flusher_task
 
-    @staticmethod
-    async def update_round_state(**kwargs):
-        """Update the current round state - thread safe"""
-        global _current_round_state, _round_state_lock
-        async with _round_state_lock:
-            _current_round_state.update(kwargs)
-            _current_round_state['last_update'] = int(time.time() * 1000)
-        # Only log important state changes, not every multiplier update
-        if 'current_multiplier' not in kwargs or kwargs.get('current_multiplier', 0) % 1 == 0:
-            print(f"[STATE UPDATE] {kwargs}")
-
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        action = data.get("action")
-        # Only log important actions, not pings
-        if action != "ping":
-            print(f"[WebSocket] Received: {data} at {timezone.now()}")
+        if settings.AVIATOR_EVENT_FRAMES and (_frame_flusher_task is None or _frame_flusher_task.done()):
+            _frame_flusher_task = asyncio.create_task(run_frame_flusher(self.channel_layer))
 
-    async def send_to_group(self, event):
-        """Handle messages sent to the group"""
-        if "type_override" in event:
-            event["type"] = event.pop("type_override")
-        
-        await self.send(text_data=json.dumps(event))
+    def ensure_idle_reaper(self):
+        """Track this socket for the worker's idle sweep (AVIATOR_IDLE_TIMEOUT = 0 turns it off)"""
+        global _idle_reaper_task
 
-    async def send_game_state(self):
-        # 🔧 IMPROVED: Send comprehensive game state
-        state = await self.get_current_round_state()
-        
-        print(f"[GAME STATE] Sending state: {state}")
-        
-        await self.send(json.dumps({
-            "type": "game_state",
-            "round_id": state['round_id'],
-            "is_active": state['is_active'],
-            "is_betting": state['is_betting'],
-            "current_multiplier": state['current_multiplier'],
-            "crash_multiplier": state['crash_multiplier'],
-            "crashed": state['crashed'],
-            "server_time": int(time.time() * 1000),
-            "round_start_time": state.get('round_start_time')
-        }))
-
-    async def run_aviator_game(self):
-        """Global game loop - runs once for all connections"""
-        print("🚀 GLOBAL GAME LOOP STARTED")
-        
-        while True:
-            try:
-                # 🔧 PHASE 1: BETTING
-                print(f"[GAME] Starting betting phase at {timezone.now()}")
-                
-                await self.update_round_state(
-                    is_betting=True,
-                    is_active=False,
-                    crashed=False,
-                    current_multiplier=1.0,
-                    crash_multiplier=None,
-                    round_id=None,
-                    round_start_time=None
-                )
-                
-                await self.channel_layer.group_send(self.room_group_name, {
-                    'type': 'send_to_group',
-                    'type_override': 'betting_open',
-                    'message': 'Place your bets now!',
-                    'countdown': 5,
-                    'server_time': int(time.time() * 1000)
-                })
-                await asyncio.sleep(5)
-
-                # 🔧 PHASE 2: CREATE ROUND WITH PROPER ACTIVATION
-                crash_multiplier = await self.generate_crash_multiplier()
-                
-                # 🔧 CRITICAL: Create round and mark as active immediately
-                aviator_round = await database_sync_to_async(AviatorRound.objects.create)(
-                    crash_multiplier=crash_multiplier,
-                    is_active=True  # 🔧 ENSURE ROUND IS ACTIVE
-                )
-                
-                print(f"[GAME] Round {aviator_round.id} created - CRASH AT: {crash_multiplier}x - ACTIVE: {aviator_round.is_active}")
-
-                # 🔧 CRITICAL: Update global state with new round IMMEDIATELY
-                round_start_time = int(time.time() * 1000)
-                await self.update_round_state(
-                    round_id=aviator_round.id,
-                    crash_multiplier=crash_multiplier,
-                    is_betting=False,
-                    is_active=True,
-                    crashed=False,
-                    current_multiplier=1.0,
-                    round_start_time=round_start_time
-                )
-
-                # 🔧 PHASE 3: ROUND START - SEND ROUND ID TO FRONTEND
-                multiplier = 1.00
-                sequence_number = 0
-
-                await self.channel_layer.group_send(self.room_group_name, {
-                    'type': 'send_to_group',
-                    'type_override': 'round_started',
-                    'multiplier': multiplier,
-                    'round_id': aviator_round.id,  # 🔧 CRITICAL: Send round ID
-                    'crash_multiplier': crash_multiplier,  # 🔧 Send crash multiplier
-                    'sequence': sequence_number,
-                    'server_time': int(time.time() * 1000),
-                    'is_active': True  # 🔧 Confirm round is active
-                })
-
-                print(f"[GAME] Round {aviator_round.id} started - sent to frontend")
-
-                # 🔧 PHASE 4: MULTIPLIER UPDATES
-                while multiplier < crash_multiplier:
-                    sequence_number += 1
-                    
-                    # Fixed step progression based on current multiplier
-                    if multiplier < 2:
-                        step = 0.01
-                        delay = 0.1
-                    elif multiplier < 5:
-                        step = 0.02
-                        delay = 0.08
-                    elif multiplier < 20:
-                        step = 0.05
-                        delay = 0.06
-                    else:
-                        step = 0.1
-                        delay = 0.04
-
-                    await asyncio.sleep(delay)
-                    
-                    # 🔧 FIX: Ensure we don't overshoot the crash multiplier
-                    next_multiplier = round(multiplier + step, 2)
-                    if next_multiplier >= crash_multiplier:
-                        break
-                        
-                    multiplier = next_multiplier
-
-                    # 🔧 CRITICAL: Update global state with current multiplier
-                    await self.update_round_state(current_multiplier=multiplier)
-                    # Only log every 1.0x milestone to reduce noise
-                    if multiplier % 1.0 == 0:
-                        print(f"[MULTIPLIER] Round {aviator_round.id} reached {multiplier}x")
-
-                    await self.channel_layer.group_send(self.room_group_name, {
-                        'type': 'send_to_group',
-                        'type_override': 'multiplier',
-                        'multiplier': multiplier,
-                        'round_id': aviator_round.id,
-                        'sequence': sequence_number,
-                        'server_time': int(time.time() * 1000)
-                    })
-
-                    await self.auto_cashout(multiplier, aviator_round)
-
-                # 🔧 PHASE 5: CRASH
-                sequence_number += 1
-                print(f"[GAME] CRASH! Round {aviator_round.id} crashed at {crash_multiplier}x")
-                
-                # 🔧 CRITICAL: Mark as crashed in global state
-                await self.update_round_state(
-                    crashed=True,
-                    is_active=False,
-                    current_multiplier=crash_multiplier
-                )
-                
-                await self.channel_layer.group_send(self.room_group_name, {
-                    'type': 'send_to_group',
-                    'type_override': 'crash',
-                    'multiplier': crash_multiplier,
-                    'round_id': aviator_round.id,
-                    'sequence': sequence_number,
-                    'server_time': int(time.time() * 1000),
-                    'final': True
-                })
-
-                await self.end_round(aviator_round.id)
-
-                await self.channel_layer.group_send(self.room_group_name, {
-                    'type': 'send_to_group',
-                    'type_override': 'round_summary',
-                    'crash_multiplier': crash_multiplier,
-                    'message': 'Round complete. Preparing next...',
-                    'server_time': int(time.time() * 1000)
-                })
-
-                await asyncio.sleep(3)
-
-            except Exception as e:
-                print(f"[GAME] Error in game loop: {e}")
-                import traceback
-                traceback.print_exc()
-                await asyncio.sleep(5)
-
-    async def place_bet(self, data):
-        user = self.scope["user"]
-        round_id = data.get("round_id")
-        amount = float(data.get("amount", 0))
-
-        print(f"[PLACE BET] User: {user.username}, Round: {round_id}, Amount: {amount}")
-
-        if amount <= 0:
-            await self.send(json.dumps({"error": "Invalid amount."}))
-            return
-
-        # 🔧 IMPROVED: Get current round state for validation
-        current_state = await self.get_current_round_state()
-        print(f"[PLACE BET] Current state: {current_state}")
-
-        # 🔧 Use current round if provided round is invalid
-        if not round_id or round_id != current_state.get('round_id'):
-            round_id = current_state.get('round_id')
-            print(f"[PLACE BET] Using current round: {round_id}")
-
-        if not round_id:
-            await self.send(json.dumps({"error": "No active round available."}))
+        if settings.AVIATOR_IDLE_TIMEOUT <= 0:
             return
+        idle_reaper.register(self)
+        if _idle_reaper_task is None or _idle_reaper_task.done():
+            _idle_reaper_task = asyncio.create_task(run_idle_reaper())
 
-        # 🔧 Check if betting is allowed
-        if not current_state.get('is_betting', False):
-            await self.send(json.dumps({"error": "Betting is not open."}))
+    @staticmethod
+    async def get_current_round_state(table=DEFAULT_TABLE):
+        """Get a table's current round state - can be called from anywhere"""
+        return await get_round_state_store(table).aget()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        self.last_seen = time.monotonic()
+        # 🔧 Heartbeats only need to prove the client is there - skip decoding them
+        if text_data in PING_FRAMES:
             return
 
         try:
-            aviator_round = await self.get_round(round_id)
-            print(f"[PLACE BET] Found round {aviator_round.id}, active: {aviator_round.is_active}")
-        except AviatorRound.DoesNotExist:
-            await self.send(json.dumps({"error": "Round not found."}))
+            data = self.codec.decode(text_data, bytes_data)
+        except ValueError:
+            await self.send_message({"error": "Malformed message."})
             return
-
-        if not aviator_round.is_active:
-            await self.send(json.dumps({"error": "Round is not active."}))
+        if not isinstance(data, dict):
+            await self.send_message({"error": "Malformed message."})
             return
 
-        if await self.get_existing_bet(user, aviator_round):
-            await self.send(json.dumps({"error": "You already placed a bet in this round."}))
-            return
+        action = data.get("action")
+        # Only log important actions, not pings
+        if action != "ping":
+            print(f"[WebSocket] Received: {data} at {timezone.now()}")
 
-        success, wallet = await self.withdraw_wallet(user, amount)
-        if not success:
-            await self.send(json.dumps({"error": "Insufficient balance."}))
+        # 🔧 Bets and cashouts over the socket skip a full HTTPS round trip to the REST views
+        if action == "resume":
+            # Allowed without a token: it only replays room broadcasts
+            try:
+                await self.start_resume(str(data["stream"]), int(data["sequence"]), data.get("request_id"))
+            except (KeyError, TypeError, ValueError):
+                await self.reply(data, {"error": "resume needs a stream and a sequence."})
             return
 
-        bet = await database_sync_to_async(AviatorBet.objects.create)(
-            user=user,
-            round=aviator_round,
-            amount=amount,
-            auto_cashout=data.get("auto_cashout")
-        )
-
-        try:
-            await database_sync_to_async(Transaction.objects.create)(
-                user=user,
-                amount=-amount,
-                transaction_type='withdraw',
-                description='Aviator bet placed'
-            )
-        except Exception as e:
-            print(f"Error creating transaction: {str(e)}")
-            await self.send(json.dumps({"error": f"Failed to create transaction: {str(e)}"}))
+        if action == "subscribe":
+            try:
+                await self.subscribe(parse_subscriptions(data.get("events") or []))
+            except ValueError as e:
+                await self.reply(data, {"error": str(e)})
+                return
+            await self.reply(data, {"type": "subscribed", "events": sorted(self.subscriptions)})
             return
 
-        await self.channel_layer.group_send(self.room_group_name, {
-            'type': 'send_to_group',
-            'type_override': 'bet_placed',
-            'username': user.username,
-            'amount': amount,
-            'auto_cashout': data.get("auto_cashout"),
-            'round_id': round_id,
-            'user_id': user.id,
-            'server_time': int(time.time() * 1000)
-        })
-
-        await self.send(json.dumps({
-            "type": "bet_placed",
-            "message": "Bet placed successfully",
-            "round_id": round_id,
-            "amount": amount,
-            "bet_id": bet.id,
-            "user_id": user.id,
-            "new_balance": float(wallet.balance),
-            "server_time": int(time.time() * 1000)
-        }))
-
-        print(f"[PLACE BET] SUCCESS: {user.username} placed bet {bet.id} in round {round_id}")
-
-    async def cashout_bet(self, data):
-        user = self.scope["user"]
-        bet_id = data.get("bet_id")
-        multiplier = data.get("multiplier", 0)
-
-        print(f"[Cashout] cashout_bet data: bet_id={bet_id}, multiplier={multiplier}, user={user.username}")
-
-        if not bet_id or not multiplier:
-            await self.send(json.dumps({"error": f"Bet ID and multiplier are required. Received: bet_id={bet_id}, multiplier={multiplier}"}))
+        if action == "get_game_state":
+            # Allowed without a token: the snapshot is what every room member sees anyway
+            await self.send_state_frame()
             return
 
-        try:
-            bet = await self.get_bet(bet_id)
-        except AviatorBet.DoesNotExist:
-            await self.send(json.dumps({"error": "Bet not found."}))
+        handler = self.action_handlers.get(action)
+        if handler is None:
+            if action != "ping":
+                await self.reply(data, {"error": f"Unknown action: {action}"})
             return
 
-        if bet.user != user:
-            await self.send(json.dumps({"error": "Unauthorized: You can only cash out your own bets."}))
+        if not self.scope["user"].is_authenticated:
+            await self.reply(data, {"error": "Authentication required. Connect with ?token=<access token>."})
             return
 
-        if bet.cash_out_multiplier is not None:
-            await self.send(json.dumps({"error": "Already cashed out."}))
-            return
+        await handler(self, data)
 
-        try:
-            multiplier = float(multiplier)
-            if multiplier <= 0:
-                raise ValueError
-        except (ValueError, TypeError):
-            await self.send(json.dumps({"error": f"Invalid multiplier format: {multiplier}"}))
-            return
+    async def reply(self, data, message):
+        """
+        Answer a client action. The reply echoes the action's request_id so the
+        client can match it up; the success or error reply is the action's ack.
+        """
+        if data.get("request_id") is not None:
+            message["request_id"] = data["request_id"]
+        await self.send_message(message)
+
+    async def send_message(self, message):
+        """Send a message to this client in its negotiated encoding"""
+        text_data, bytes_data = self.codec.encode(message)
+        self.outbox.put(text_data, bytes_data)
 
-        # 🔧 CRITICAL FIX: Validate against CURRENT ROUND STATE, not bet's round
-        current_state = await self.get_current_round_state()
+    async def send_to_group(self, event):
+        """Handle messages sent to the group"""
+        if "type_override" in event:
+            event["type"] = event.pop("type_override")
         
-        if current_state['crashed']:
-            print(f"[Cashout] Round already crashed at {current_state['crash_multiplier']}x")
-            await self.send(json.dumps({"error": f"Too late, round crashed at {current_state['crash_multiplier']}x!"}))
-            return
+        await self.send_message(event)
 
-        if not current_state['is_active']:
-            print(f"[Cashout] Round not active")
-            await self.send(json.dumps({"error": "Round is not active"}))
+    async def send_encoded(self, event):
+        """Handle a broadcast the publisher already encoded: forward our codec's frame verbatim"""
+        if self.held is not None:
+            # Resuming: live events wait until the replay before them has been sent
+            self.held.append(event)
             return
-
-        # 🔧 CRITICAL: Check against CURRENT round's crash multiplier
-        current_crash_multiplier = current_state['crash_multiplier']
-        if multiplier >= (current_crash_multiplier - 0.01):
-            print(f"[Cashout] Multiplier too high: {multiplier} >= {current_crash_multiplier} for CURRENT round {current_state['round_id']}")
-            await self.send(json.dumps({"error": f"Too late, will crash at {current_crash_multiplier}x!"}))
+        self.forward_encoded(event)
+
+    def forward_encoded(self, event):
+        frame = event["frames"].get(self.codec.name)
+        if frame is None:
+            # Publisher could not encode for our codec (e.g. msgpack missing there)
+            frame = event["frames"]["json"]
+        text_data, bytes_data = frame
+        # Multiplier ticks still waiting in the outbox are replaced by this one
+        self.outbox.put(text_data, bytes_data, conflatable=event.get("conflate", False))
+
+    async def reap(self):
+        """
+        Silent past AVIATOR_IDLE_TIMEOUT: close the socket so the room's groups are left
+        now rather than at group_expiry. The server answers the close with websocket.disconnect,
+        which runs disconnect() once.
+        """
+        print(f"[WebSocket] Reaping idle client {self.channel_name}")
+        await self.close(code=4009)
+
+    async def close_laggard(self):
+        """The outbox gave up on this client; 4008 tells it to reconnect and resync"""
+        await self.close(code=4008)
+
+    async def send_state_frame(self):
+        """
+        Forward the game_state frame the loop pre-encodes every tick for our codec.
+        Falls back to building one from the round state before the loop has stored any.
+        """
+        frame = await get_round_state_store(self.table.name).aget_state_frame(self.codec.name)
+        if frame is None:
+            await self.send_game_state()
             return
+        text_data, bytes_data = frame
+        self.outbox.put(text_data, bytes_data)
+
+    async def subscribe(self, subscriptions):
+        """Join the class sub-groups newly in `subscriptions` and leave the ones no longer in it"""
+        for event_class in subscriptions - self.subscriptions:
+            group = shard_for(class_group(self.room_group_name, event_class), self.channel_name)
+            await self.channel_layer.group_add(group, self.channel_name)
+        for event_class in self.subscriptions - subscriptions:
+            group = shard_for(class_group(self.room_group_name, event_class), self.channel_name)
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.subscriptions = set(subscriptions)
+
+    def resume_point(self):
+        """(stream, sequence) from ?resume=<stream>:<sequence>, or None"""
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        stream, _, sequence = query.get("resume", [""])[0].partition(":")
+        try:
+            return stream, int(sequence)
+        except ValueError:
+            return None
+
+    async def start_resume(self, stream, sequence, request_id=None):
+        """
+        Ask the round actor for the events after `sequence`. Live broadcasts are
+        held back meanwhile so none overtakes the replay; the actor answers in
+        queue order, so nothing published before its reply is missing from it.
+        """
+        if self.held is None:
+            self.held = []
+        else:
+            self.resume_timeout.cancel()
+        await send_to_round_actor(self.channel_layer, {
+            "type": "resume",
+            "stream": stream,
+            "sequence": sequence,
+            "request_id": request_id,
+            "reply_to": self.channel_name,
+        }, self.table.name)
+        # No loop to answer (or a busy one): fall back to a snapshot rather than hold forever
+        self.resume_timeout = asyncio.get_running_loop().call_later(
+            settings.AVIATOR_ROUND_ACTOR_TIMEOUT,
+            lambda: asyncio.ensure_future(self.finish_resume({"type": "resync", "stream": None}))
+        )
 
-        # 🔧 ADDITIONAL CHECK: Ensure bet is from current round
-        if bet.round.id != current_state['round_id']:
-            print(f"[Cashout] Bet from wrong round: bet round {bet.round.id} vs current round {current_state['round_id']}")
-            await self.send(json.dumps({"error": "Bet is from a different round"}))
+    async def finish_resume(self, message):
+        """Send the replay (or a fresh game_state on resync), then the live events held meanwhile"""
+        if self.held is None:
             return
+        held, self.held = self.held, None
+        self.resume_timeout.cancel()
+
+        if message.get("type") == "resumed":
+            # The replay holds every class; leave out the ones this client is not subscribed to
+            events = [event for event in message.pop("events") if is_subscribed(event, self.subscriptions)]
+            message["count"] = len(events)
+            await self.send_message(message)
+            for replayed in events:
+                await self.send_message(replayed)
+            replayed_up_to = message["sequence"]
+        else:
+            await self.send_message(message)
+            await self.send_state_frame()
+            replayed_up_to = None
+
+        for event in held:
+            sequence = event.get("sequence")
+            if replayed_up_to is not None and sequence is not None:
+                if sequence <= replayed_up_to:
+                    continue
+                if event.get("frame"):
+                    # A frame's sequence is its last event's; the earlier ones may be in the replay
+                    await self.send_message(frame_after(event, replayed_up_to))
+                    continue
+            self.forward_encoded(event)
 
-        win_amount = round(float(bet.amount) * multiplier, 2)
+    async def send_game_state(self):
+        # 🔧 IMPROVED: Send comprehensive game state
+        state = await self.get_current_round_state(self.table.name)
+        
+        await self.send_message({
+            "type": "game_state",
+            "round_id": state['round_id'],
+            "is_active": state['is_active'],
+            "is_betting": state['is_betting'],
+            "current_multiplier": state['current_multiplier'],
+            "crash_multiplier": state['crash_multiplier'] if state['crashed'] else None,
+            "crashed": state['crashed'],
+            "server_time": int(time.time() * 1000),
+            "round_start_time": state.get('round_start_time'),
+            "bets": []
+        })
 
-        bet.cash_out_multiplier = multiplier
-        bet.final_multiplier = multiplier
-        bet.is_winner = True
-        await database_sync_to_async(bet.save)()
+    async def place_bet(self, data):
+        user = self.scope["user"]
+        round_id = data.get("round_id")
 
-        wallet = await self.deposit_wallet(user, win_amount)
+        print(f"[PLACE BET] User: {user.username}, Round: {round_id}, Amount: {data.get('amount')}")
 
+        # 🔧 NaN, infinite or non-numeric stakes and auto cashouts never reach the actor
         try:
-            await database_sync_to_async(Transaction.objects.create)(
-                user=user,
-                amount=win_amount,
-                transaction_type='winning',
-                description=f'Cashed out from Aviator at {multiplier}x'
-            )
-        except Exception as e:
-            print(f"Error creating transaction: {str(e)}")
-            await self.send(json.dumps({"error": f"Failed to create transaction: {str(e)}"}))
+            amount, auto_cashout = clean_bet(data.get("amount"), data.get("auto_cashout"))
+        except JournalRejected as e:
+            await self.reply(data, {"error": str(e)})
             return
 
-        await self.channel_layer.group_send(self.room_group_name, {
-            'type': 'send_to_group',
-            'type_override': 'cash_out',
-            'username': user.username,
-            'multiplier': multiplier,
-            'amount': float(bet.amount),
-            'win_amount': win_amount,
-            'server_time': int(time.time() * 1000)
-        })
-
-        await self.send(json.dumps({
-            "type": "cash_out_success",
-            "message": "Cashout successful",
-            "win_amount": win_amount,
-            "multiplier": multiplier,
-            "new_balance": float(wallet.balance),
+        # 🔧 The round actor takes the bet into whichever round is open for betting when it
+        # gets there, in order with the loop's take-off; its answer comes back as actor_reply
+        await send_to_round_actor(self.channel_layer, {
+            "type": "place_bet",
             "user_id": user.id,
-            "server_time": int(time.time() * 1000)
-        }))
-
-        print(f"[Cashout] SUCCESS: {user.username} cashed out at {multiplier}x for {win_amount} from round {current_state['round_id']}")
+            "username": user.username,
+            "amount": float(amount),
+            "auto_cashout": auto_cashout,
+            "request_id": data.get("request_id"),
+            "reply_to": self.channel_name,
+        }, self.table.name)
 
-    async def auto_cashout(self, current_multiplier, aviator_round):
-        bets = await database_sync_to_async(list)(aviator_round.bets.filter(
-            cash_out_multiplier__isnull=True,
-            auto_cashout__lte=current_multiplier
-        ))
-
-        for bet in bets:
-            win_amount = round(float(bet.amount) * bet.auto_cashout, 2)
-
-            bet.cash_out_multiplier = bet.auto_cashout
-            bet.final_multiplier = bet.auto_cashout
-            bet.is_winner = True
-            await database_sync_to_async(bet.save)()
+    async def cashout_bet(self, data):
+        # 🔧 The round actor prices the cashout by when it reaches the game loop; a client
+        # supplied multiplier is ignored, so "cash out now" only needs the bet id
+        user = self.scope["user"]
+        bet_id = data.get("bet_id")
 
-            wallet = await self.deposit_wallet(bet.user, win_amount)
+        print(f"[Cashout] cashout_bet data: bet_id={bet_id}, user={user.username}")
 
-            try:
-                await database_sync_to_async(Transaction.objects.create)(
-                    user=bet.user,
-                    amount=win_amount,
-                    transaction_type='winning',
-                    description=f'Auto-cashout on Aviator at {bet.auto_cashout}x'
-                )
-            except Exception as e:
-                print(f"Error creating transaction: {str(e)}")
-                continue
-
-            await self.channel_layer.group_send(self.room_group_name, {
-                'type': 'send_to_group',
-                'type_override': 'cash_out',
-                'username': bet.user.username,
-                'multiplier': bet.auto_cashout,
-                'amount': float(bet.amount),
-                'win_amount': win_amount,
-                'server_time': int(time.time() * 1000)
-            })
-
-    @database_sync_to_async
-    def withdraw_wallet(self, user, amount):
-        with transaction.atomic():
-            try:
-                wallet = Wallet.objects.select_for_update().get(user=user)
-                if wallet.balance >= Decimal(str(amount)):
-                    wallet.balance -= Decimal(str(amount))
-                    wallet.save()
-                    return True, wallet
-                return False, wallet
-            except Wallet.DoesNotExist:
-                return False, None
-
-    @database_sync_to_async
-    def deposit_wallet(self, user, amount):
-        with transaction.atomic():
-            try:
-                wallet = Wallet.objects.select_for_update().get(user=user)
-                wallet.balance += Decimal(str(amount))
-                wallet.save()
-                return wallet
-            except Wallet.DoesNotExist:
-                raise Exception("Wallet not found")
-
-    @database_sync_to_async
-    def get_wallet(self, user):
-        return Wallet.objects.get(user=user)
-
-    @database_sync_to_async
-    def end_round(self, round_id):
         try:
-            aviator_round = AviatorRound.objects.select_related().get(id=round_id)
-            aviator_round.is_active = False
-            aviator_round.ended_at = timezone.now()
-            aviator_round.save()
-            print(f"[END ROUND] Round {round_id} marked as inactive")
-
-            for bet in aviator_round.bets.filter(cash_out_multiplier__isnull=True):
-                bet.final_multiplier = aviator_round.crash_multiplier
-                bet.is_winner = False
-                bet.save()
-        except AviatorRound.DoesNotExist:
-            pass
-
-    @database_sync_to_async
-    def get_verified_sure_odd(self):
-        odd = SureOdd.objects.filter(verified_by_admin=True, is_used=False).order_by('created_at').first()
-        if odd:
-            odd.is_used = True
-            odd.save()
-            return odd.odd
-        return None
-
-    @database_sync_to_async
-    def get_round(self, round_id):
-        return AviatorRound.objects.get(id=round_id)
-
-    @database_sync_to_async
-    def get_bet(self, bet_id):
-        return AviatorBet.objects.get(id=bet_id)
-
-    @database_sync_to_async
-    def get_existing_bet(self, user, round):
-        return AviatorBet.objects.filter(user=user, round=round).first()
-
-    @database_sync_to_async
-    def get_crash_multiplier_settings(self):
-        return list(CrashMultiplierSetting.objects.all())
-
-    @database_sync_to_async
-    def get_latest_round(self):
-        return AviatorRound.objects.filter(is_active=True).order_by('-start_time').first()
-
-    async def generate_crash_multiplier(self):
-        settings = await self.get_crash_multiplier_settings()
-        if settings:
-            selected_range = random.choices(
-                settings,
-                weights=[s.weight for s in settings],
-                k=1
-            )[0]
-            min_val = selected_range.min_value
-            max_val = selected_range.max_value
-        else:
-            min_val, max_val = 1.00, 2.00
-
-        sure_odd = await self.get_verified_sure_odd()
-        if sure_odd:
-            return float(sure_odd)
+            bet_id = int(bet_id)
+        except (TypeError, ValueError):
+            await self.reply(data, {"error": "Bet ID is required."})
+            return
 
-        return round(random.uniform(min_val, max_val), 2)
+        # 🔧 The round actor sequences it against the crash; its answer comes back as actor_reply
+        await send_to_round_actor(self.channel_layer, {
+            "type": "cashout",
+            "user_id": user.id,
+            "username": user.username,
+            "bet_id": bet_id,
+            "description": "Cashed out from Aviator at {multiplier}x",
+            "request_id": data.get("request_id"),
+            "reply_to": self.channel_name,
+        }, self.table.name)
+
+    async def actor_reply(self, event):
+        """The round actor's answer to one of this client's bets, cashouts or resumes"""
+        message = event["message"]
+        if message.get("type") in ("resumed", "resync"):
+            # Answers to a resume we already gave up on are dropped
+            await self.finish_resume(message)
+            return
+        await self.send_message(message)
+
+    async def player_result(self, event):
+        """A result for this player the loop produced on its own, e.g. an auto cashout"""
+        await self.send_message(event["message"])
+
+    # Socket actions; "cashout_bet" is accepted as an alias of "cashout"
+    action_handlers = {
+        "place_bet": place_bet,
+        "cashout": cashout_bet,
+        "cashout_bet": cashout_bet,
+    }
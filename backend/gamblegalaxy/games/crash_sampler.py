@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+
+
+class CrashSampler:
+    """
+    Draws crash multipliers from weighted (min, max) ranges in O(1).
+
+    The range is picked with Vose's alias method - one uniform index and one
+    coin flip, whatever the number of ranges - then the multiplier is drawn
+    uniformly inside it, matching `random.choices` + `random.uniform`.
+    """
+
+    def __init__(self, ranges):
+        ranges = [(float(low), float(high), weight) for low, high, weight in ranges if weight > 0]
+        if not ranges:
+            raise ValueError("CrashSampler needs at least one range with a positive weight")
+
+        self.ranges = [(low, high) for low, high, _ in ranges]
+        # Equal for samplers built from the same ranges, so a rebuild can tell whether they changed
+        self.key = tuple(ranges)
+        count = len(ranges)
+        total = sum(weight for _, _, weight in ranges)
+        scaled = [weight * count / total for _, _, weight in ranges]
+
+        self._prob = [1.0] * count
+        self._alias = list(range(count))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def draw_range(self, rng=random):
+        column = int(rng.random() * len(self._prob))
+        if rng.random() < self._prob[column]:
+            return self.ranges[column]
+        return self.ranges[self._alias[column]]
+
+    def draw(self, rng=random):
+        return round(rng.uniform(*self.draw_range(rng)), 2)
+
+
+class _Cached:
+    """A value rebuilt at most every AVIATOR_CRASH_SAMPLER_TTL seconds, or after invalidate()"""
+
+    def __init__(self, build):
+        self._build = build
+        self._value = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._built_at is None or now - self._built_at >= settings.AVIATOR_CRASH_SAMPLER_TTL:
+                self._value = self._build()
+                self._built_at = now
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+
+def _build_sampler():
+    # Imported lazily: AviatorRound.save() uses this module from inside games.models
+    from .models import CrashMultiplierSetting
+
+    ranges = CrashMultiplierSetting.objects.values_list('min_value', 'max_value', 'weight')
+    try:
+        return CrashSampler(ranges)
+    except ValueError:
+        return None
+
+
+def _sure_odds_pending():
+    from .models import SureOdd
+
+    return SureOdd.objects.filter(verified_by_admin=True, is_used=False).exists()
+
+
+_sampler = _Cached(_build_sampler)
+_sure_odds = _Cached(_sure_odds_pending)
+
+
+def get_crash_sampler(default=None):
+    """
+    The process-wide sampler compiled from CrashMultiplierSetting, or `default`
+    when no setting has a positive weight.
+
+    It is rebuilt when a setting is saved or deleted in this process (see
+    games.signals) and at least every AVIATOR_CRASH_SAMPLER_TTL seconds, which
+    bounds how long other workers keep drawing from an old table.
+    """
+    return _sampler.get() or default
+
+
+def sure_odds_pending():
+    """Whether a verified, unused SureOdd may be waiting; cached like the sampler"""
+    return _sure_odds.get()
+
+
+def invalidate_crash_sampler():
+    _sampler.invalidate()
+
+
+def invalidate_sure_odds():
+    _sure_odds.invalidate()
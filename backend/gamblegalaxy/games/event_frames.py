@@ -0,0 +1,149 @@
+import asyncio
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from .wire_format import encode_once
+from .room_shards import send_to_room
+from .outbox import is_conflatable
+from .subscriptions import event_group
+
+
+class EventFrameBuffer:
+    """
+    Game events produced in this process since the last flush, per group.
+
+    With AVIATOR_EVENT_FRAMES on, bets, cashouts and bot actions are not sent
+    as individual group messages; they pile up here and go out as one frame per
+    tick, so fan-out cost follows the tick rate rather than player activity.
+    Safe to feed from the event loop and from sync views' threads alike.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, group, event):
+        with self._lock:
+            self._pending.setdefault(group, []).append(event)
+
+    def drain(self):
+        """Take every pending event, in the order they were added"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+_buffer = EventFrameBuffer()
+# Game loops running in this process; while there is one, its ticks are the only flushes
+_loops_flushing = 0
+
+
+@contextmanager
+def loop_flushes_frames():
+    """Mark a game loop as flushing this process's buffer, so run_frame_flusher stands aside"""
+    global _loops_flushing
+    _loops_flushing += 1
+    try:
+        yield
+    finally:
+        _loops_flushing -= 1
+
+
+def client_event(message):
+    """The event as the client sees it from a send_to_group message"""
+    event = dict(message)
+    event.pop('type', None)
+    if 'type_override' in event:
+        event['type'] = event.pop('type_override')
+    return event
+
+
+def last_sequence(message):
+    """Highest game-loop sequence in a client event or frame, None if unsequenced"""
+    if message.get('type') == 'frame':
+        return max((event['sequence'] for event in message['events'] if 'sequence' in event), default=None)
+    return message.get('sequence')
+
+
+def encoded_message(message):
+    """Group message carrying `message` pre-encoded for every wire format"""
+    return {
+        'type': 'send_encoded',
+        'frames': encode_once(message),
+        'conflate': is_conflatable(message),
+        'sequence': last_sequence(message),
+        'frame': message.get('type') == 'frame',
+    }
+
+
+def frame_after(encoded, sequence):
+    """
+    The frame of a send_encoded message without its events up to `sequence`, for a
+    resuming client whose replay already sent those. Unsequenced events are kept.
+    """
+    frame = json.loads(encoded['frames']['json'][0])
+    frame['events'] = [
+        event for event in frame['events']
+        if event.get('sequence') is None or event['sequence'] > sequence
+    ]
+    return frame
+
+
+async def publish_event(channel_layer, group, message):
+    """
+    Send a send_to_group message now, or queue it for the next frame when frames are on.
+    Events of an optional class go to that class's sub-group of `group` instead.
+    """
+    event = client_event(message)
+    if settings.AVIATOR_EVENT_FRAMES:
+        _buffer.add(event_group(group, event), event)
+    else:
+        await send_to_room(channel_layer, event_group(group, event), encoded_message(event))
+
+
+def publish_event_sync(channel_layer, group, message):
+    """publish_event for sync callers (REST views, management commands)"""
+    event = client_event(message)
+    if settings.AVIATOR_EVENT_FRAMES:
+        _buffer.add(event_group(group, event), event)
+    else:
+        async_to_sync(send_to_room)(channel_layer, event_group(group, event), encoded_message(event))
+
+
+async def flush_event_frames(channel_layer):
+    """Send one frame per group holding its events since the last flush; no-op if none"""
+    for group, events in _buffer.drain().items():
+        await send_to_room(channel_layer, group, encoded_message({
+            'type': 'frame',
+            'events': events,
+            'server_time': int(time.time() * 1000)
+        }))
+
+
+def flush_event_frames_sync(channel_layer):
+    if settings.AVIATOR_EVENT_FRAMES:
+        async_to_sync(flush_event_frames)(channel_layer)
+
+
+async def run_frame_flusher(channel_layer):
+    """
+    Flush this process's events every AVIATOR_FRAME_INTERVAL seconds.
+
+    The game loop flushes at the end of each tick itself; this covers events raised
+    on workers that do not run the loop (bets, REST cashouts). A worker that wins
+    the loop lease stops flushing here until its loop exits, so the buffer is never
+    drained by two flushers whose frames could overtake each other.
+    """
+    while True:
+        await asyncio.sleep(settings.AVIATOR_FRAME_INTERVAL)
+        if _loops_flushing:
+            continue
+        try:
+            await flush_event_frames(channel_layer)
+        except Exception as e:
+            print(f"[FRAMES] Flush failed: {e}")
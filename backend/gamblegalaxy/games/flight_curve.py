@@ -0,0 +1,76 @@
+class FlightCurve:
+    """
+    Multiplier as a function of time since the plane took off.
+
+    The curve is piecewise linear: each segment climbs at `step` every `delay`
+    seconds until it reaches `upto` (None for the last, open-ended segment). The
+    default segments reproduce the classic tick table of the game loop, so a
+    client extrapolating from `to_params()` shows the same flight the server
+    used to stream tick by tick.
+    """
+
+    DEFAULT_SEGMENTS = (
+        (2.0, 0.01, 0.1),
+        (5.0, 0.02, 0.08),
+        (20.0, 0.05, 0.06),
+        (None, 0.1, 0.04),
+    )
+
+    def __init__(self, segments=DEFAULT_SEGMENTS, start=1.0):
+        self.start = start
+        self.segments = tuple(segments)
+
+    @classmethod
+    def default(cls):
+        return cls()
+
+    def _rates(self):
+        for upto, step, delay in self.segments:
+            yield upto, step / delay
+
+    def multiplier_at(self, elapsed):
+        """Exact (unrounded) multiplier `elapsed` seconds after take-off"""
+        multiplier = self.start
+        remaining = max(elapsed, 0.0)
+        for upto, rate in self._rates():
+            if upto is not None:
+                if multiplier >= upto:
+                    continue
+                segment_time = (upto - multiplier) / rate
+                if remaining >= segment_time:
+                    remaining -= segment_time
+                    multiplier = upto
+                    continue
+            return multiplier + rate * remaining
+        return multiplier
+
+    def elapsed_for(self, target):
+        """Seconds after take-off at which the curve reaches `target`"""
+        multiplier = self.start
+        elapsed = 0.0
+        for upto, rate in self._rates():
+            if upto is not None and multiplier >= upto:
+                continue
+            if upto is None or target <= upto:
+                return elapsed + max(target - multiplier, 0.0) / rate
+            elapsed += (upto - multiplier) / rate
+            multiplier = upto
+        return elapsed
+
+    def tick_interval(self, multiplier):
+        """Server tick spacing for the segment `multiplier` is in"""
+        for upto, step, delay in self.segments:
+            if upto is None or multiplier < upto:
+                return delay
+        return self.segments[-1][2]
+
+    def to_params(self):
+        """Parameters clients need to draw the flight locally"""
+        return {
+            'kind': 'piecewise_linear',
+            'start': self.start,
+            'segments': [
+                {'upto': upto, 'rate': round(step / delay, 6)}
+                for upto, step, delay in self.segments
+            ],
+        }
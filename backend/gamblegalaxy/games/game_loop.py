@@ -0,0 +1,467 @@
+import asyncio
+import time
+import uuid
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import SureOdd
+from .round_state import get_round_state_store, RoundSnapshot
+from .flight_curve import FlightCurve
+from .bet_book import RoundBetBook, fetch_open_bets
+from .settlement import void_abandoned_rounds
+from .round_actor import RoundActor
+from .event_frames import publish_event, flush_event_frames, client_event, loop_flushes_frames
+from .replay import ReplayBuffer
+from .tables import DEFAULT_TABLE, get_table, get_tables
+from .loop_lease import run_as_leader
+from .wire_format import encode_once
+from .tick_scheduler import TickScheduler
+from .room_shards import shard_latency
+from .outbox import outbox_stats
+from .idle_reaper import idle_reaper
+from .round_schedule import RoundSchedule, start_round_now
+from .crash_sampler import CrashSampler, get_crash_sampler, sure_odds_pending, invalidate_sure_odds
+
+# Uniform 1.00x-2.00x until an admin configures CrashMultiplierSetting ranges
+FALLBACK_CRASH_SAMPLER = CrashSampler([(1.00, 2.00, 1)])
+
+
+class AviatorGame:
+    """
+    The Aviator game loop, publishing everything through the channel layer.
+
+    It needs no socket: web workers run it from the first AviatorConsumer to
+    connect (AVIATOR_LOOP_IN_WEB), or the start_aviator_loop command runs it in
+    its own process. Either way run_as_leader keeps a single loop cluster-wide.
+
+    Each instance plays one table, with its own room, round state, rounds and
+    actor; run_tables plays several side by side in one process.
+    """
+
+    def __init__(self, channel_layer, table=None):
+        self.channel_layer = channel_layer
+        self.table = table or get_table(DEFAULT_TABLE)
+        self.room_group_name = self.table.room_group_name
+        self.store = get_round_state_store(self.table.name)
+        # The loop is the only writer, so it keeps its own copy instead of reading the store back
+        self.state = RoundSnapshot()
+        self.bet_book = None
+        self._bets_payload = (None, None, [])
+        # Every event the loop publishes carries the next `sequence` of this stream; clients
+        # resume with (stream_id, last sequence seen) and get what they missed from `replay`
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.sequence = 0
+        self.replay = ReplayBuffer(settings.AVIATOR_REPLAY_BUFFER)
+
+    async def publish(self, message):
+        """
+        Stamp the next sequence, keep the event for resuming clients and broadcast it
+        to the room, folded into the next tick frame when AVIATOR_EVENT_FRAMES is on.
+        """
+        self.sequence += 1
+        message['sequence'] = self.sequence
+        self.replay.append(self.sequence, client_event(message))
+        await publish_event(self.channel_layer, self.room_group_name, message)
+
+    def resume(self, stream_id, after):
+        """The events a client that last saw `after` missed, or a resync if they are gone"""
+        events = self.replay.since(after) if stream_id == self.stream_id else None
+        if events is None:
+            return {"type": "resync", "stream": self.stream_id, "sequence": self.sequence}
+        return {"type": "resumed", "stream": self.stream_id, "sequence": self.sequence, "events": events}
+
+    async def end_tick(self):
+        """Send everything published since the last tick as one frame, and refresh the late-joiner snapshot"""
+        await flush_event_frames(self.channel_layer)
+        await self.refresh_state_frame()
+
+    async def pause(self, seconds):
+        """Sleep between phases, still flushing event frames every AVIATOR_FRAME_INTERVAL"""
+        if not settings.AVIATOR_EVENT_FRAMES:
+            await asyncio.sleep(seconds)
+            return
+        loop = asyncio.get_running_loop()
+        resume_at = loop.time() + seconds
+        while loop.time() < resume_at:
+            await asyncio.sleep(max(0, min(settings.AVIATOR_FRAME_INTERVAL, resume_at - loop.time())))
+            await flush_event_frames(self.channel_layer)
+
+    async def update_round_state(self, **kwargs):
+        """Update the shared round state - visible to every worker"""
+        self.state = self.state.replace(**kwargs)
+        await self.store.aupdate(**kwargs)
+        # Only log important state changes, not every multiplier update
+        if 'current_multiplier' not in kwargs or kwargs.get('current_multiplier', 0) % 1 == 0:
+            print(f"[STATE UPDATE] {kwargs}")
+
+    async def run_aviator_game(self):
+        """Global game loop - runs once for all connections"""
+        print(f"🚀 GLOBAL GAME LOOP STARTED for table {self.table.name}")
+
+        # Future rounds are drawn and inserted in bulk ahead of time
+        schedule = RoundSchedule(self.generate_crash_multiplier, self.table.name, distribution=self.crash_distribution)
+        # Bets, cashouts and the crash are applied in strict order by the round actor
+        self.round_actor = RoundActor(self.channel_layer, publish=self.publish, resume=self.resume, table=self.table)
+        try:
+            # 🔧 A previous owner that lost the lease mid-round left it active with open bets
+            await database_sync_to_async(void_abandoned_rounds)(self.table.name)
+            await self.round_actor.start()
+            await schedule.start()
+            # This process's frame flusher idles while the loop's ticks and pauses flush
+            with loop_flushes_frames():
+                await self.play_rounds(schedule)
+        finally:
+            self.round_actor.close()
+            schedule.close()
+
+    async def play_rounds(self, schedule):
+        while True:
+            try:
+                # 🔧 PHASE 1: BETTING
+                print(f"[GAME] Starting betting phase at {timezone.now()}")
+                self.bet_book = None
+                # Resuming across a round boundary means a resync, so replay only covers this round
+                self.replay.reset()
+                
+                await self.update_round_state(
+                    is_betting=True,
+                    is_active=False,
+                    crashed=False,
+                    current_multiplier=1.0,
+                    crash_multiplier=None,
+                    round_id=None,
+                    round_start_time=None
+                )
+                
+                await self.publish({
+                    'type': 'send_to_group',
+                    'type_override': 'betting_open',
+                    'message': 'Place your bets now!',
+                    'countdown': self.table.betting_seconds,
+                    'server_time': int(time.time() * 1000)
+                })
+                await self.end_tick()
+
+                # 🔧 PHASE 2: ROUND ACTIVATION - the next pre-generated round is popped and
+                # activated inside the betting window, so take-off does no DB insert
+                betting_ends = asyncio.get_running_loop().time() + self.table.betting_seconds
+                aviator_round = await self.next_round(schedule)
+                crash_multiplier = aviator_round.crash_multiplier
+                
+                print(f"[GAME] Round {aviator_round.id} activated - CRASH AT: {crash_multiplier}x - ACTIVE: {aviator_round.is_active}")
+                # 🔧 Open bets for this round live in memory; auto-cashout never queries per tick
+                self.bet_book = RoundBetBook(aviator_round.id)
+
+                # Socket bets placed during the rest of the window go into this round
+                await self.update_round_state(round_id=aviator_round.id)
+                await self.round_actor.tell('betting', aviator_round=aviator_round, bet_book=self.bet_book)
+
+                # Keep the late-joiner snapshot's bet list current while bets come in
+                loop = asyncio.get_running_loop()
+                while loop.time() < betting_ends:
+                    await self.refresh_bet_book()
+                    await self.refresh_state_frame()
+                    await self.pause(max(0, min(settings.AVIATOR_BET_BOOK_REFRESH_INTERVAL, betting_ends - loop.time())))
+                await self.refresh_bet_book()
+
+                # 🔧 CRITICAL: Update global state with new round IMMEDIATELY
+                round_start_time = int(time.time() * 1000)
+                await self.update_round_state(
+                    round_id=aviator_round.id,
+                    crash_multiplier=crash_multiplier,
+                    is_betting=False,
+                    is_active=True,
+                    crashed=False,
+                    current_multiplier=1.0,
+                    round_start_time=round_start_time
+                )
+                # Bets still queued behind this are refused; cashouts are priced by the time since
+                # take-off on this process's monotonic clock, which the actor stamps commands with
+                await self.round_actor.tell('take_off', started_at=time.monotonic())
+
+                # 🔧 PHASE 3: ROUND START - SEND ROUND ID TO FRONTEND
+                multiplier = 1.00
+                curve_mode = settings.AVIATOR_TICK_MODE == 'curve'
+
+                round_started = {
+                    'type': 'send_to_group',
+                    'type_override': 'round_started',
+                    'multiplier': multiplier,
+                    'round_id': aviator_round.id,  # 🔧 CRITICAL: Send round ID
+                    # No crash_multiplier: chain_hash commits to it and the crash event reveals it
+                    'server_time': int(time.time() * 1000),
+                    'is_active': True,  # 🔧 Confirm round is active
+                    'chain_hash': aviator_round.chain_hash  # Commitment, verifiable once the salt is revealed
+                }
+                if curve_mode:
+                    # Clients draw the flight themselves from the curve and our start time
+                    round_started.update({
+                        'curve': FlightCurve.default().to_params(),
+                        'server_start_time': round_start_time,
+                        'sync_interval': settings.AVIATOR_SYNC_INTERVAL,
+                    })
+                await self.publish(round_started)
+                await self.end_tick()
+
+                print(f"[GAME] Round {aviator_round.id} started - sent to frontend")
+
+                # 🔧 PHASE 4: MULTIPLIER UPDATES
+                # Ticks are paced on absolute deadlines so DB work and broadcasts don't stretch the round
+                scheduler = TickScheduler(late_after=settings.AVIATOR_TICK_LATE_MS / 1000)
+                if curve_mode:
+                    multiplier = await self.fly_curve(aviator_round, crash_multiplier, scheduler)
+                else:
+                    while multiplier < crash_multiplier:
+                        # Fixed step progression based on current multiplier
+                        if multiplier < 2:
+                            step = 0.01
+                            delay = 0.1
+                        elif multiplier < 5:
+                            step = 0.02
+                            delay = 0.08
+                        elif multiplier < 20:
+                            step = 0.05
+                            delay = 0.06
+                        else:
+                            step = 0.1
+                            delay = 0.04
+
+                        # If we fell behind, the missed ticks are merged and the multiplier catches up
+                        ticks = await scheduler.wait(delay)
+                    
+                        # 🔧 FIX: Ensure we don't overshoot the crash multiplier
+                        next_multiplier = round(multiplier + step * ticks, 2)
+                        if next_multiplier >= crash_multiplier:
+                            break
+                        
+                        multiplier = next_multiplier
+
+                        # 🔧 CRITICAL: Update global state with current multiplier
+                        await self.update_round_state(current_multiplier=multiplier)
+                        # Only log every 1.0x milestone to reduce noise
+                        if multiplier % 1.0 == 0:
+                            print(f"[MULTIPLIER] Round {aviator_round.id} reached {multiplier}x")
+
+                        await self.publish({
+                            'type': 'send_to_group',
+                            'type_override': 'multiplier',
+                            'multiplier': multiplier,
+                            'round_id': aviator_round.id,
+                            'server_time': int(time.time() * 1000)
+                        })
+
+                        await self.auto_cashout(multiplier)
+                        await self.end_tick()
+
+                # 🔧 PHASE 5: CRASH
+                print(f"[GAME] CRASH! Round {aviator_round.id} crashed at {crash_multiplier}x")
+                print(f"[GAME] Round {aviator_round.id} tick timing: {scheduler.report()}")
+                print(f"[GAME] Round {aviator_round.id} publish latency per shard: {shard_latency.report()}")
+                print(f"[GAME] Socket outboxes: {outbox_stats.snapshot()}")
+                print(f"[GAME] Room members on this worker: {idle_reaper.snapshot()}")
+
+                # 🔧 CRITICAL: Cashouts queued behind the crash are refused; settlement runs
+                # once the ones ahead of it have committed
+                settled = await self.round_actor.tell('crash')
+                
+                # 🔧 CRITICAL: Mark as crashed in global state
+                await self.update_round_state(
+                    crashed=True,
+                    is_active=False,
+                    current_multiplier=crash_multiplier
+                )
+                
+                await self.publish({
+                    'type': 'send_to_group',
+                    'type_override': 'crash',
+                    'multiplier': crash_multiplier,
+                    'round_id': aviator_round.id,
+                    'server_time': int(time.time() * 1000),
+                    'final': True,
+                    'salt': aviator_round.salt
+                })
+                await self.end_tick()
+
+                lost, elapsed_ms = await settled
+                print(f"[END ROUND] Round {aviator_round.id} marked as inactive - settled {lost} losing bets in {elapsed_ms:.1f}ms")
+                print(f"[GAME] Round {aviator_round.id} actor: {self.round_actor.stats.report()}")
+
+                await self.publish({
+                    'type': 'send_to_group',
+                    'type_override': 'round_summary',
+                    'crash_multiplier': crash_multiplier,
+                    'message': 'Round complete. Preparing next...',
+                    'server_time': int(time.time() * 1000)
+                })
+                await self.end_tick()
+
+                await self.pause(3)
+
+            except Exception as e:
+                print(f"[GAME] Error in game loop: {e}")
+                import traceback
+                traceback.print_exc()
+                await self.pause(5)
+
+    async def fly_curve(self, aviator_round, crash_multiplier, scheduler):
+        """
+        Curve mode flight: the multiplier follows the server clock and clients
+        extrapolate it, so only a sync beacon every AVIATOR_SYNC_INTERVAL seconds
+        goes out instead of a frame per tick. Returns the last multiplier.
+        """
+        curve = FlightCurve.default()
+        loop = asyncio.get_running_loop()
+        take_off = loop.time()
+        crash_at = curve.elapsed_for(crash_multiplier)
+        last_beacon = take_off
+        multiplier = curve.start
+
+        while True:
+            await scheduler.wait(curve.tick_interval(multiplier))
+
+            now = loop.time()
+            next_multiplier = round(curve.multiplier_at(now - take_off), 2)
+            if now - take_off >= crash_at or next_multiplier >= crash_multiplier:
+                break
+            multiplier = next_multiplier
+
+            await self.update_round_state(current_multiplier=multiplier)
+
+            if now - last_beacon >= settings.AVIATOR_SYNC_INTERVAL:
+                last_beacon = now
+                await self.publish({
+                    'type': 'send_to_group',
+                    'type_override': 'sync',
+                    'multiplier': multiplier,
+                    'elapsed_ms': int((now - take_off) * 1000),
+                    'round_id': aviator_round.id,
+                    'server_time': int(time.time() * 1000)
+                })
+
+            await self.auto_cashout(multiplier)
+            await self.end_tick()
+
+        return multiplier
+
+    def open_bets_payload(self):
+        """The open bet list for game_state, rebuilt only when the bet book changed"""
+        book = self.bet_book
+        if book is None:
+            return []
+        round_id, version, payload = self._bets_payload
+        if (round_id, version) != (book.round_id, book.version):
+            payload = [
+                {
+                    'bet_id': entry.bet_id,
+                    'username': entry.username,
+                    'amount': float(entry.amount),
+                    'auto_cashout': entry.auto_cashout,
+                }
+                for entry in book.open_entries()
+            ]
+            self._bets_payload = (book.round_id, book.version, payload)
+        return payload
+
+    async def refresh_state_frame(self):
+        """
+        Pre-encode the game_state a client connecting now is sent.
+
+        Consumers forward the stored frame on connect as is, so a reconnect storm
+        costs one store read per socket rather than a state build and an encode each.
+        """
+        state = self.state
+        await self.store.aset_state_frame(encode_once({
+            "type": "game_state",
+            "round_id": state.round_id,
+            "is_active": state.is_active,
+            "is_betting": state.is_betting,
+            "current_multiplier": state.current_multiplier,
+            # Secret until the crash, like in round_started
+            "crash_multiplier": state.crash_multiplier if state.crashed else None,
+            "crashed": state.crashed,
+            "server_time": int(time.time() * 1000),
+            "round_start_time": state.round_start_time,
+            "bets": self.open_bets_payload(),
+            "stream": self.stream_id,
+            "sequence": self.sequence,
+            "table": self.table.name
+        }))
+
+    async def refresh_bet_book(self):
+        """
+        Pull bets inserted without going through the actor (e.g. simulate_bots) into
+        the book. Only done while betting is open; bets already in it are skipped.
+        """
+        book = self.bet_book
+        for entry in await database_sync_to_async(fetch_open_bets)(book.round_id):
+            book.add(entry)
+
+    async def auto_cashout(self, current_multiplier):
+        """
+        Have the round actor settle the bets whose auto-cashout threshold was crossed,
+        in order with manual cashouts and the crash. The tick does not wait for it,
+        and reads no DB: bets the actor accepts are added to the book as they commit.
+        """
+        if self.bet_book.crossed(current_multiplier):
+            await self.round_actor.tell('auto_cashout', multiplier=current_multiplier)
+
+    async def next_round(self, schedule):
+        """
+        Activate the round to play next.
+
+        Verified sure odds are kept out of the schedule's pre-drawn batch: a batch
+        is drawn up to AVIATOR_ROUND_BATCH_SIZE rounds ahead, so a sure odd drawn
+        into it would be marked used long before it is played. Instead the default
+        table checks for one here, when the round starts, and plays it in a round
+        created on the spot; the scheduled rounds wait for the next turn.
+        """
+        if self.table.name == DEFAULT_TABLE and await database_sync_to_async(sure_odds_pending)():
+            aviator_round = await self.play_sure_odd()
+            if aviator_round:
+                return aviator_round
+            invalidate_sure_odds()
+        return await schedule.next_round()
+
+    @database_sync_to_async
+    def play_sure_odd(self):
+        """Mark the oldest verified sure odd used and start a round crashing at it, or None if there is none"""
+        with transaction.atomic():
+            odd = SureOdd.objects.select_for_update().filter(
+                verified_by_admin=True, is_used=False
+            ).order_by('created_at').first()
+            if odd is None:
+                return None
+            odd.is_used = True
+            odd.save()
+            return start_round_now(float(odd.odd), self.table.name)
+
+    async def crash_sampler(self):
+        if self.table.sampler is not None:
+            # A table with its own crash_ranges ignores the admin's ranges
+            return self.table.sampler
+        # Served from an in-process cache; the DB is only hit when it expires
+        return await database_sync_to_async(get_crash_sampler)(default=FALLBACK_CRASH_SAMPLER)
+
+    async def crash_distribution(self):
+        """Which ranges rounds are drawn from now; queued rounds from other ranges are redrawn"""
+        return (await self.crash_sampler()).key
+
+    async def generate_crash_multiplier(self):
+        """Draw a crash multiplier for the schedule's batch (never a sure odd, see next_round)"""
+        return (await self.crash_sampler()).draw()
+
+
+async def run_tables(channel_layer, tables=None):
+    """
+    Campaign for the loop lease of every table (all of AVIATOR_TABLES by default).
+    Each table's lease is separate, so the tables one process wins run here as
+    concurrent tasks and the rest wherever their leases are held.
+    """
+    tables = tables or list(get_tables().values())
+    await asyncio.gather(*(
+        run_as_leader(AviatorGame(channel_layer, table).run_aviator_game, table=table.name)
+        for table in tables
+    ))
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from django.conf import settings
+
+# The frontend's heartbeat, matched verbatim so a ping costs no JSON parse
+PING_FRAMES = frozenset({'{"action":"ping"}', '{"action": "ping"}'})
+
+
+class IdleReaper:
+    """
+    This process's Aviator sockets, and how long each has been silent.
+
+    A socket whose client vanished without a close frame stays in the room's
+    channel-layer groups until group_expiry, so every tick is still published
+    to it. Consumers stamp `last_seen` on every message they receive (the
+    frontend pings every 30s); the sweep takes any socket silent for longer
+    than AVIATOR_IDLE_TIMEOUT out of its groups and closes it.
+    """
+
+    def __init__(self):
+        self._consumers = set()
+        self.reaped = 0
+
+    def register(self, consumer):
+        consumer.last_seen = time.monotonic()
+        self._consumers.add(consumer)
+
+    def unregister(self, consumer):
+        self._consumers.discard(consumer)
+
+    def stale(self, timeout=None):
+        cutoff = time.monotonic() - (timeout or settings.AVIATOR_IDLE_TIMEOUT)
+        return [consumer for consumer in self._consumers if consumer.last_seen < cutoff]
+
+    async def sweep(self):
+        for consumer in self.stale():
+            self.unregister(consumer)
+            self.reaped += 1
+            await consumer.reap()
+
+    def snapshot(self):
+        """Room members on this worker: still heard from, silent past the timeout, and reaped so far"""
+        stale = len(self.stale())
+        return {
+            'members': len(self._consumers),
+            'live': len(self._consumers) - stale,
+            'stale': stale,
+            'reaped': self.reaped,
+        }
+
+
+idle_reaper = IdleReaper()
+
+
+async def run_idle_reaper():
+    """Reap idle sockets every AVIATOR_IDLE_SWEEP_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(settings.AVIATOR_IDLE_SWEEP_INTERVAL)
+        try:
+            await idle_reaper.sweep()
+        except Exception as e:
+            print(f"[REAPER] Sweep failed: {e}")
@@ -0,0 +1,284 @@
+import asyncio
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+
+from .models import AviatorBet
+from .signals import aviator_bets_placed, aviator_bets_cashed_out
+from wallet.models import Wallet, Transaction
+from wallet.signals import transactions_recorded
+
+
+class JournalRejected(Exception):
+    """A journaled event was refused (e.g. insufficient balance); the message is user-facing"""
+
+
+# Largest stake AviatorBet.amount (10 digits, 2 decimal places) can hold
+MAX_STAKE = Decimal('99999999.99')
+
+
+def clean_bet(amount, auto_cashout=None):
+    """
+    A client's stake and auto-cashout target, validated.
+
+    Returns (amount as Decimal cents, auto_cashout as float or None); raises
+    JournalRejected with a user-facing message for NaN, infinities, non-numbers,
+    stakes that are not positive and auto cashouts that are not above 1.
+    """
+    try:
+        amount = Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+    except (InvalidOperation, ValueError):
+        raise JournalRejected("Invalid amount.")
+    if not amount.is_finite() or amount <= 0 or amount > MAX_STAKE:
+        raise JournalRejected("Invalid amount.")
+
+    if auto_cashout is None or auto_cashout == '':
+        return amount, None
+    try:
+        auto_cashout = float(auto_cashout)
+    except (TypeError, ValueError):
+        raise JournalRejected("Invalid auto cashout.")
+    if not math.isfinite(auto_cashout) or auto_cashout <= 1:
+        raise JournalRejected("Auto cashout must be a number above 1.")
+    return amount, auto_cashout
+
+
+class JournalEvent:
+    """
+    A game event waiting in the journal.
+
+    `ack` resolves once the group commit holding the event is durable in the
+    database - to the event itself with its results filled in, or to an error.
+    """
+
+    def __init__(self):
+        self.ack = Future()
+        self.balance = None
+        # Why the group refused it; only acted on once the group has committed
+        self.rejected = None
+
+
+class PlaceBet(JournalEvent):
+    """Debit the stake, insert the bet and its withdraw transaction"""
+
+    def __init__(self, user, aviator_round, amount, auto_cashout=None):
+        super().__init__()
+        self.user = user
+        self.round = aviator_round
+        # Checked (see clean_bet) inside the group, so a bad one is refused on its own
+        self.amount = amount
+        self.auto_cashout = auto_cashout
+        self.bet = None
+
+
+class CashOut(JournalEvent):
+    """Mark an open bet as won, credit the winnings and record the transaction"""
+
+    def __init__(self, user, bet_id, multiplier, description, round_id=None):
+        super().__init__()
+        self.user = user
+        self.bet_id = bet_id
+        # When set, the bet must belong to this round (the one the multiplier was priced for)
+        self.round_id = round_id
+        self.multiplier = multiplier
+        self.description = description
+        self.bet = None
+        self.win_amount = None
+
+
+class GameJournal:
+    """
+    Ordered write-behind journal for bets and cashouts.
+
+    Events are queued in arrival order and a single writer thread commits them in
+    groups: a group closes after `flush_interval` seconds or `batch_size` events,
+    and is written with one wallet lock query, bulk inserts and bulk updates in one
+    transaction. Events are applied in order within the group, so balances and
+    duplicate checks behave exactly as if they were committed one by one.
+    """
+
+    def __init__(self, flush_interval, batch_size):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, event):
+        """Queue an event; returns its ack future"""
+        self._ensure_writer()
+        self._queue.put(event)
+        return event.ack
+
+    async def asubmit(self, event):
+        """Queue an event and wait until it is durable; raises JournalRejected if refused"""
+        return await asyncio.wrap_future(self.submit(event))
+
+    def _ensure_writer(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='aviator-journal', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            group = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(group) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    group.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            close_old_connections()
+            try:
+                commit_group(group)
+            except Exception as e:
+                print(f"[JOURNAL] Group commit of {len(group)} events failed: {e}")
+                if len(group) == 1:
+                    group[0].ack.set_exception(e)
+                    continue
+                # Retry each event on its own, so whatever broke the batch only fails itself
+                for event in group:
+                    try:
+                        commit_group([event])
+                    except Exception as e:
+                        print(f"[JOURNAL] {type(event).__name__} for user {event.user.id} failed: {e}")
+                        event.ack.set_exception(e)
+
+
+def commit_group(events):
+    """
+    Apply a group of journal events in one transaction.
+
+    Every ack is resolved once the transaction has committed: refused events to
+    JournalRejected, the rest to the event. If the transaction fails no ack is
+    touched, so the events can be committed again. Wallets are locked before
+    bets, both by id, the same order settle_auto_cashouts uses.
+    """
+    placed, cashed_out, transactions = [], [], []
+    for event in events:
+        event.rejected = None
+
+    with transaction.atomic():
+        wallets = {
+            wallet.user_id: wallet
+            for wallet in Wallet.objects.select_for_update().filter(
+                user_id__in={event.user.id for event in events}
+            ).order_by('id')
+        }
+        open_bets = {
+            bet.id: bet
+            for bet in AviatorBet.objects.select_for_update().filter(
+                id__in=[event.bet_id for event in events if isinstance(event, CashOut)],
+                cash_out_multiplier__isnull=True
+            ).order_by('id')
+        }
+        bet_events = [event for event in events if isinstance(event, PlaceBet)]
+        taken = set(AviatorBet.objects.filter(
+            round_id__in={event.round.id for event in bet_events},
+            user_id__in={event.user.id for event in bet_events}
+        ).values_list('user_id', 'round_id'))
+
+        for event in events:
+            wallet = wallets.get(event.user.id)
+            if wallet is None:
+                event.rejected = JournalRejected("Wallet not found.")
+                continue
+
+            if isinstance(event, PlaceBet):
+                try:
+                    event.amount, event.auto_cashout = clean_bet(event.amount, event.auto_cashout)
+                except JournalRejected as e:
+                    event.rejected = e
+                    continue
+                if (event.user.id, event.round.id) in taken:
+                    event.rejected = JournalRejected("You already placed a bet in this round.")
+                    continue
+                if wallet.balance < event.amount:
+                    event.rejected = JournalRejected("Insufficient balance.")
+                    continue
+                taken.add((event.user.id, event.round.id))
+                wallet.balance -= event.amount
+                event.bet = AviatorBet(
+                    user=event.user,
+                    round=event.round,
+                    amount=event.amount,
+                    auto_cashout=event.auto_cashout
+                )
+                placed.append(event.bet)
+                transactions.append(Transaction(
+                    user=event.user,
+                    amount=-event.amount,
+                    transaction_type='withdraw',
+                    description='Aviator bet placed'
+                ))
+            else:
+                bet = open_bets.pop(event.bet_id, None)
+                if bet is None or bet.user_id != event.user.id:
+                    event.rejected = JournalRejected("Already cashed out.")
+                    continue
+                if event.round_id is not None and bet.round_id != event.round_id:
+                    open_bets[bet.id] = bet
+                    event.rejected = JournalRejected("Bet is from a different round")
+                    continue
+                event.win_amount = round(float(bet.amount) * event.multiplier, 2)
+                bet.cash_out_multiplier = event.multiplier
+                bet.final_multiplier = event.multiplier
+                bet.is_winner = True
+                event.bet = bet
+                wallet.balance += Decimal(str(event.win_amount))
+                cashed_out.append(bet)
+                transactions.append(Transaction(
+                    user=event.user,
+                    amount=Decimal(str(event.win_amount)),
+                    transaction_type='winning',
+                    description=event.description
+                ))
+            event.balance = wallet.balance
+
+        Wallet.objects.bulk_update(wallets.values(), ['balance'])
+        AviatorBet.objects.bulk_create(placed)
+        AviatorBet.objects.bulk_update(cashed_out, ['cash_out_multiplier', 'final_multiplier', 'is_winner'])
+        Transaction.objects.bulk_create(transactions)
+
+        # Bulk writes skip post_save; let the dashboard record its activity in bulk too
+        if placed:
+            aviator_bets_placed.send(sender=AviatorBet, bets=placed)
+        if cashed_out:
+            aviator_bets_cashed_out.send(sender=AviatorBet, bets=cashed_out)
+        if transactions:
+            transactions_recorded.send(sender=Transaction, transactions=transactions)
+
+    for event in events:
+        if event.rejected is not None:
+            event.ack.set_exception(event.rejected)
+        else:
+            event.ack.set_result(event)
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """Return the process-wide game journal"""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = GameJournal(
+                    flush_interval=settings.AVIATOR_JOURNAL_FLUSH_MS / 1000,
+                    batch_size=settings.AVIATOR_JOURNAL_BATCH_SIZE
+                )
+    return _journal
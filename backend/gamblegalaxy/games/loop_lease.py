@@ -0,0 +1,194 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from .tables import DEFAULT_TABLE, table_key
+
+LEASE_KEY = 'aviator:game_loop:leader'
+
+
+def default_owner_id():
+    """Identify this process in the lease so operators can see who owns the loop"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LoopLease:
+    """
+    Cluster-wide lease guarding the single Aviator game loop.
+
+    A holder must renew before the TTL runs out; if it dies the lease simply
+    expires and the next candidate to retry acquires it.
+    """
+
+    async def acquire(self, owner, ttl):
+        raise NotImplementedError
+
+    async def renew(self, owner, ttl):
+        raise NotImplementedError
+
+    async def release(self, owner):
+        raise NotImplementedError
+
+    async def holder(self):
+        raise NotImplementedError
+
+
+class LocalLoopLease(LoopLease):
+    """
+    In-memory lease for single-process setups and local testing.
+
+    Several candidates sharing one instance behave like processes sharing Redis;
+    pass a fake `clock` to step through expiry without sleeping.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._owner = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _expired(self):
+        return self._owner is None or self.clock() >= self._expires_at
+
+    async def acquire(self, owner, ttl):
+        with self._lock:
+            if self._expired() or self._owner == owner:
+                self._owner = owner
+                self._expires_at = self.clock() + ttl
+                return True
+            return False
+
+    async def renew(self, owner, ttl):
+        with self._lock:
+            if self._owner != owner or self._expired():
+                return False
+            self._expires_at = self.clock() + ttl
+            return True
+
+    async def release(self, owner):
+        with self._lock:
+            if self._owner == owner:
+                self._owner = None
+
+    async def holder(self):
+        with self._lock:
+            return None if self._expired() else self._owner
+
+
+class RedisLoopLease(LoopLease):
+    """Lease stored as a single Redis key with a millisecond expiry"""
+
+    # Only the current owner may extend or drop the key
+    RENEW_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url, key=LEASE_KEY):
+        import redis.asyncio
+
+        self.key = key
+        self._client = redis.asyncio.Redis.from_url(url)
+        self._renew = self._client.register_script(self.RENEW_SCRIPT)
+        self._release = self._client.register_script(self.RELEASE_SCRIPT)
+
+    async def acquire(self, owner, ttl):
+        acquired = await self._client.set(self.key, owner, nx=True, px=int(ttl * 1000))
+        if acquired:
+            return True
+        # Re-acquiring our own lease after a restart of the campaign is a renewal
+        return await self.renew(owner, ttl)
+
+    async def renew(self, owner, ttl):
+        return bool(await self._renew(keys=[self.key], args=[owner, int(ttl * 1000)]))
+
+    async def release(self, owner):
+        await self._release(keys=[self.key], args=[owner])
+
+    async def holder(self):
+        owner = await self._client.get(self.key)
+        return owner.decode() if owner else None
+
+
+_leases = {}
+_lease_lock = threading.Lock()
+
+
+def get_loop_lease(table=DEFAULT_TABLE):
+    """Return the process-wide lease backend of a table's loop, configured by AVIATOR_LOOP_LEASE_BACKEND"""
+    lease = _leases.get(table)
+    if lease is None:
+        with _lease_lock:
+            lease = _leases.get(table)
+            if lease is None:
+                if settings.AVIATOR_LOOP_LEASE_BACKEND == 'redis':
+                    lease = RedisLoopLease(settings.REDIS_URL, key=table_key(LEASE_KEY, table))
+                else:
+                    lease = LocalLoopLease()
+                _leases[table] = lease
+    return lease
+
+
+async def run_as_leader(loop_factory, lease=None, owner=None, ttl=None, retry_interval=None, table=DEFAULT_TABLE):
+    """
+    Campaign for the lease forever and run `loop_factory()` only while holding it.
+
+    The holder renews every ttl/3 and cancels its loop as soon as a renewal fails,
+    so two loops never overlap for longer than one renewal interval. If the holder
+    dies, another candidate takes over within ttl + retry_interval.
+    """
+    lease = lease or get_loop_lease(table)
+    owner = owner or default_owner_id()
+    ttl = ttl or settings.AVIATOR_LOOP_LEASE_TTL
+    renew_interval = ttl / 3
+    retry_interval = retry_interval or renew_interval
+
+    while True:
+        try:
+            acquired = await lease.acquire(owner, ttl)
+        except Exception as e:
+            print(f"[LEASE] Could not reach lease backend: {e}")
+            acquired = False
+
+        if not acquired:
+            await asyncio.sleep(retry_interval)
+            continue
+
+        print(f"👑 [LEASE] {owner} now owns the Aviator game loop of table {table}")
+        game_task = asyncio.create_task(loop_factory())
+        try:
+            while True:
+                done, _ = await asyncio.wait({game_task}, timeout=renew_interval)
+                if done:
+                    print(f"[LEASE] Game loop of table {table} exited, giving up leadership")
+                    break
+                try:
+                    renewed = await lease.renew(owner, ttl)
+                except Exception as e:
+                    print(f"[LEASE] Renewal error: {e}")
+                    renewed = False
+                if not renewed:
+                    print(f"[LEASE] {owner} lost the lease, stopping game loop of table {table}")
+                    break
+        finally:
+            game_task.cancel()
+            await asyncio.gather(game_task, return_exceptions=True)
+            try:
+                await lease.release(owner)
+            except Exception as e:
+                print(f"[LEASE] Release error: {e}")
+
+        await asyncio.sleep(retry_interval)
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+import json
+import time
+
+from games.wire_format import CODECS, encode_once
+
+
+class Command(BaseCommand):
+    help = 'Measure per-tick broadcast encoding CPU against the number of connected clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', default='10,100,1000,5000',
+                            help='Comma-separated connected-client counts to measure')
+        parser.add_argument('--ticks', type=int, default=200, help='Ticks per measurement')
+        parser.add_argument('--encoding', default='json', choices=sorted(CODECS),
+                            help='Wire encoding every simulated client negotiated')
+
+    def tick_message(self, sequence):
+        return {
+            'type': 'send_to_group',
+            'type_override': 'multiplier',
+            'multiplier': round(1 + sequence / 100, 2),
+            'round_id': 12345,
+            'sequence': sequence,
+            'server_time': int(time.time() * 1000)
+        }
+
+    def per_consumer(self, clients, ticks):
+        """Old path: every consumer pops type_override and json.dumps the group message itself"""
+        for sequence in range(ticks):
+            message = self.tick_message(sequence)
+            for _ in range(clients):
+                event = dict(message)
+                event['type'] = event.pop('type_override')
+                json.dumps(event)
+
+    def pre_encoded(self, clients, ticks, encoding):
+        """New path: the loop encodes once, every consumer forwards its codec's frame"""
+        for sequence in range(ticks):
+            message = self.tick_message(sequence)
+            message['type'] = message.pop('type_override')
+            frames = encode_once(message)
+            for _ in range(clients):
+                text_data, bytes_data = frames.get(encoding, frames['json'])
+
+    def measure(self, run, *args):
+        started = time.process_time()
+        run(*args)
+        return time.process_time() - started
+
+    def handle(self, *args, **options):
+        ticks = options['ticks']
+        encoding = options['encoding']
+
+        self.stdout.write(f"{'clients':>8} {'per-consumer ms/tick':>22} {'pre-encoded ms/tick':>21} {'speedup':>8}")
+        for clients in (int(c) for c in options['clients'].split(',')):
+            before = self.measure(self.per_consumer, clients, ticks) * 1000 / ticks
+            after = self.measure(self.pre_encoded, clients, ticks, encoding) * 1000 / ticks
+            speedup = before / after if after else float('inf')
+            self.stdout.write(f"{clients:>8} {before:>22.3f} {after:>21.3f} {speedup:>7.1f}x")
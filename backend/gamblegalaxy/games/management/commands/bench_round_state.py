@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+import threading
+import time
+
+from games.round_state import DEFAULT_ROUND_STATE, LocalRoundStateStore
+
+
+class LockedDictStore:
+    """Old store: every read and write takes the lock, every read copies the dict"""
+
+    def __init__(self):
+        self._state = dict(DEFAULT_ROUND_STATE)
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            return dict(self._state)
+
+    def update(self, **fields):
+        with self._lock:
+            self._state.update(fields)
+            self._state['last_update'] = int(time.time() * 1000)
+
+
+class Command(BaseCommand):
+    help = 'Measure round state read/write cost per tick, with readers in the loop and in other threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', default='10,100,1000,5000',
+                            help='Comma-separated reads per tick (one per connected consumer)')
+        parser.add_argument('--ticks', type=int, default=200, help='Ticks per measurement')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Background threads reading the state in a tight loop meanwhile')
+
+    def run_ticks(self, store, readers, ticks):
+        for sequence in range(ticks):
+            store.update(current_multiplier=round(1 + sequence / 100, 2))
+            for _ in range(readers):
+                state = store.get()
+                state['current_multiplier']
+                state['is_active']
+
+    def measure(self, store, readers, ticks, threads):
+        """Wall-clock ms per tick in the loop thread while `threads` other readers compete"""
+        stop = threading.Event()
+
+        def hammer():
+            while not stop.is_set():
+                store.get()['round_id']
+
+        workers = [threading.Thread(target=hammer, daemon=True) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        started = time.perf_counter()
+        self.run_ticks(store, readers, ticks)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for worker in workers:
+            worker.join()
+        return elapsed * 1000 / ticks
+
+    def handle(self, *args, **options):
+        ticks = options['ticks']
+        threads = options['threads']
+
+        self.stdout.write(f"{'readers':>8} {'locked ms/tick':>15} {'snapshot ms/tick':>17} {'speedup':>8}")
+        for readers in (int(r) for r in options['readers'].split(',')):
+            before = self.measure(LockedDictStore(), readers, ticks, threads)
+            after = self.measure(LocalRoundStateStore(), readers, ticks, threads)
+            speedup = before / after if after else float('inf')
+            self.stdout.write(f"{readers:>8} {before:>15.3f} {after:>17.3f} {speedup:>7.1f}x")
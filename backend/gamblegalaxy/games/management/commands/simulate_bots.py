@@ -1,13 +1,17 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
+from django.db import transaction
 from games.models import AviatorBet, AviatorRound
+from games.signals import aviator_bets_cashed_out
+from games.event_frames import publish_event_sync, flush_event_frames_sync
+from games.tables import DEFAULT_TABLE
 from wallet.models import Wallet, Transaction
+from wallet.ledger import credit_wallets
 from django.contrib.auth import get_user_model
 import random
 import time
 import string
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from decimal import Decimal
 
 User = get_user_model()
@@ -50,6 +54,8 @@ class Command(BaseCommand):
             
             # 🔧 IMPROVED: Handle bot cashouts with live activity broadcasting
             self.handle_bot_cashouts(round_obj, multiplier)
+            # Everything the bots did this tick goes out as one frame
+            flush_event_frames_sync(channel_layer)
 
             if multiplier >= round_obj.crash_multiplier:
                 round_obj.is_active = False
@@ -58,7 +64,8 @@ class Command(BaseCommand):
                 print(f"[ROUND END] Crashed at {round_obj.crash_multiplier}x")
                 
                 # 🔧 NEW: Trigger global top winners refresh after round ends
-                async_to_sync(channel_layer.group_send)(
+                publish_event_sync(
+                    channel_layer,
                     'aviator_room',
                     {
                         'type': 'send_to_group',
@@ -67,18 +74,21 @@ class Command(BaseCommand):
                         'trigger_refresh': True
                     }
                 )
+                flush_event_frames_sync(channel_layer)
                 break
 
     def handle_bot_cashouts(self, round_obj, current_multiplier):
         channel_layer = get_channel_layer()
-        bets = AviatorBet.objects.filter(round=round_obj, cash_out_multiplier__isnull=True)
+        bets = AviatorBet.objects.filter(
+            round=round_obj, cash_out_multiplier__isnull=True
+        ).select_related('user', 'round')
         
-        significant_wins = []  # Track significant wins for global top winners update
+        cashouts = []  # (bet, multiplier, cashout type) triggered on this tick
         
         for bet in bets:
             # 🔧 IMPROVED: Auto cashout handling with live broadcasting
             if bet.auto_cashout and current_multiplier >= bet.auto_cashout:
-                self.process_bot_cashout(bet, bet.auto_cashout, round_obj, "AUTO", significant_wins)
+                cashouts.append((bet, bet.auto_cashout, "AUTO"))
                 
             # 🔧 IMPROVED: Manual cashout with better probability and timing
             elif not bet.auto_cashout:
@@ -86,13 +96,16 @@ class Command(BaseCommand):
                 cashout_probability = self.calculate_cashout_probability(current_multiplier, bet.user.is_bot)
                 
                 if random.random() < cashout_probability:
-                    cashout_multiplier = round(current_multiplier, 2)
-                    self.process_bot_cashout(bet, cashout_multiplier, round_obj, "MANUAL", significant_wins)
+                    cashouts.append((bet, round(current_multiplier, 2), "MANUAL"))
+        
+        # Track significant wins for global top winners update
+        significant_wins = self.process_bot_cashouts(cashouts, round_obj)
         
         # 🔧 NEW: If there were significant wins, trigger global top winners refresh
         if significant_wins:
             print(f"🏆 {len(significant_wins)} significant bot wins detected, triggering global top winners refresh")
-            async_to_sync(channel_layer.group_send)(
+            publish_event_sync(
+                channel_layer,
                 'aviator_room',
                 {
                     'type': 'send_to_group',
@@ -137,34 +150,41 @@ class Command(BaseCommand):
             else:
                 return 0.50
 
-    def process_bot_cashout(self, bet, cashout_multiplier, round_obj, cashout_type, significant_wins):
+    def process_bot_cashouts(self, cashouts, round_obj):
         """
-        Process a bot cashout with proper wallet updates, win tracking, and live broadcasting
+        Settle all bot cashouts of one tick: bet updates and wallet credits are
+        written in one batch, then each cashout is broadcast for live activity.
+        Returns the significant wins.
         """
+        if not cashouts:
+            return []
+
         channel_layer = get_channel_layer()
-        
-        # 🔧 CRITICAL: Update bet record properly
-        bet.cash_out_multiplier = cashout_multiplier
-        bet.final_multiplier = round_obj.crash_multiplier
-        bet.is_winner = cashout_multiplier < round_obj.crash_multiplier
-        bet.save()
-        
-        win_amount = bet.win_amount()  # Use model method
-        
-        # 🔧 IMPROVED: Update bot wallet balance
+        significant_wins = []
+
+        # 🔧 CRITICAL: Update bet records properly
+        for bet, cashout_multiplier, _ in cashouts:
+            bet.cash_out_multiplier = cashout_multiplier
+            bet.final_multiplier = round_obj.crash_multiplier
+            bet.is_winner = cashout_multiplier < round_obj.crash_multiplier
+
         try:
-            wallet = Wallet.objects.get(user=bet.user)
-            wallet.balance += Decimal(str(win_amount))
-            wallet.save()
-            
-            # 🔧 NEW: Create transaction record for bot wins
-            Transaction.objects.create(
-                user=bet.user,
-                amount=Decimal(str(win_amount)),
-                transaction_type='winning',
-                description=f'Bot Aviator win at {cashout_multiplier}x'
-            )
-            
+            with transaction.atomic():
+                bets = [bet for bet, _, _ in cashouts]
+                AviatorBet.objects.bulk_update(bets, ['cash_out_multiplier', 'final_multiplier', 'is_winner'])
+                aviator_bets_cashed_out.send(sender=AviatorBet, bets=[bet for bet in bets if bet.is_winner])
+
+                # 🔧 IMPROVED: Credit every bot wallet of this tick in one batch
+                credit_wallets(
+                    (bet.user_id, bet.win_amount(), f'Bot Aviator win at {cashout_multiplier}x')
+                    for bet, cashout_multiplier, _ in cashouts
+                )
+        except Exception as e:
+            print(f"❌ Error processing {len(cashouts)} bot cashouts: {e}")
+            return []
+
+        for bet, cashout_multiplier, cashout_type in cashouts:
+            win_amount = bet.win_amount()  # Use model method
             print(f"[{cashout_type} CASHOUT] {bet.user.username} cashed out at {cashout_multiplier}x for KES {win_amount}")
             
             # 🔧 NEW: Track significant wins for global top winners (lowered threshold)
@@ -177,7 +197,8 @@ class Command(BaseCommand):
                 })
             
             # 🔧 IMPROVED: Send WebSocket message with complete data for live activity
-            async_to_sync(channel_layer.group_send)(
+            publish_event_sync(
+                channel_layer,
                 'aviator_room',
                 {
                     'type': 'send_to_group',
@@ -192,9 +213,8 @@ class Command(BaseCommand):
                     'user_id': bet.user.id
                 }
             )
-            
-        except Exception as e:
-            print(f"❌ Error processing bot cashout for {bet.user.username}: {e}")
+
+        return significant_wins
 
     def place_bot_bet(self, bot, active_round, channel_layer):
         """
@@ -239,7 +259,8 @@ class Command(BaseCommand):
                 print(f"[BOT BET] {bot.username} placed KES {amount} bet, auto-cashout at {auto_cashout or 'manual'}")
                 
                 # 🔧 IMPROVED: Send WebSocket message for live activity display
-                async_to_sync(channel_layer.group_send)(
+                publish_event_sync(
+                    channel_layer,
                     'aviator_room',
                     {
                         'type': 'send_to_group',
@@ -271,7 +292,8 @@ class Command(BaseCommand):
         while True:
             try:
                 bots = User.objects.filter(is_bot=True)
-                active_round = AviatorRound.objects.filter(is_active=True).order_by('-start_time').first()
+                # Bots play the default table
+                active_round = AviatorRound.objects.filter(is_active=True, table=DEFAULT_TABLE).order_by('-start_time').first()
 
                 if not active_round:
                     print("No active round. Waiting...")
@@ -301,6 +323,7 @@ class Command(BaseCommand):
                             
                             # Small delay between bets for realism
                             time.sleep(random.uniform(0.1, 0.5))
+                            flush_event_frames_sync(channel_layer)
 
                 # 🔧 IMPROVED: Simulate the round with better tracking
                 self.simulate_multiplier_growth(active_round)
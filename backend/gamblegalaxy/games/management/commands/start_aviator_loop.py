@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from channels.layers import get_channel_layer, InMemoryChannelLayer
+import asyncio
+
+from games.game_loop import run_tables
+from games.tables import get_tables
+
+
+class Command(BaseCommand):
+    help = 'Run the Aviator game loops in their own process, publishing to web workers through the channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', action='append', dest='tables',
+                            help='Run only this table (repeatable); defaults to every table in AVIATOR_TABLES')
+
+    def handle(self, *args, **options):
+        channel_layer = get_channel_layer()
+
+        # Web workers only see what this process publishes if both sides share Redis
+        if channel_layer is None or isinstance(channel_layer, InMemoryChannelLayer):
+            raise CommandError("start_aviator_loop needs a shared channel layer; set REDIS_URL.")
+        if settings.AVIATOR_ROUND_STATE_BACKEND != 'redis':
+            raise CommandError("start_aviator_loop needs AVIATOR_ROUND_STATE_BACKEND=redis so web workers see the round state.")
+
+        if settings.AVIATOR_LOOP_IN_WEB:
+            self.stdout.write(self.style.WARNING(
+                "AVIATOR_LOOP_IN_WEB is on: web workers will still campaign for the loop. "
+                "Set AVIATOR_LOOP_IN_WEB=False on them so this process always runs it."
+            ))
+
+        tables = get_tables()
+        names = options['tables'] or list(tables)
+        unknown = [name for name in names if name not in tables]
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(unknown)}. Configured: {', '.join(tables)}")
+
+        self.stdout.write(self.style.SUCCESS(f"✈️ Aviator game loop worker started for tables: {', '.join(names)}"))
+        try:
+            # Each table's lease still guards against a second loop worker (or a web worker) running it too
+            asyncio.run(run_tables(channel_layer, [tables[name] for name in names]))
+        except KeyboardInterrupt:
+            self.stdout.write("Aviator game loop worker stopped")
@@ -1,7 +1,10 @@
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
-import random
+from .crash_sampler import CrashSampler, get_crash_sampler
+
+# Fallback distribution when no CrashMultiplierSetting is configured
+DEFAULT_CRASH_SAMPLER = CrashSampler([(1.00, 3.00, 80), (3.01, 10.00, 12), (10.01, 30.00, 7), (30.01, 1000.00, 1)])
 
 class AviatorRound(models.Model):
     start_time = models.DateTimeField(default=timezone.now)
@@ -9,22 +12,17 @@ class AviatorRound(models.Model):
     is_active = models.BooleanField(default=True)
     ended_at = models.DateTimeField(null=True, blank=True)
     delay_before_next = models.PositiveIntegerField(default=5)
+    # Pre-generated by the game loop's round schedule and not started yet
+    scheduled = models.BooleanField(default=False)
+    # sha256(previous chain_hash:salt:crash_multiplier) - commits to the multiplier before the round is played
+    salt = models.CharField(max_length=32, blank=True, default='')
+    chain_hash = models.CharField(max_length=64, blank=True, default='')
+    # Which AVIATOR_TABLES table played it; each table has its own round chain
+    table = models.CharField(max_length=32, default='default', db_index=True)
 
     def save(self, *args, **kwargs):
         if not self.crash_multiplier:
-            from .models import CrashMultiplierSetting
-            settings_qs = CrashMultiplierSetting.objects.all()
-            if settings_qs.exists():
-                ranges = [(s.min_value, s.max_value) for s in settings_qs]
-                weights = [s.weight for s in settings_qs]
-                selected_range = random.choices(ranges, weights=weights, k=1)[0]
-                self.crash_multiplier = round(random.uniform(*selected_range), 2)
-            else:
-                # Fallback default
-                ranges = [(1.00, 3.00), (3.01, 10.00), (10.01, 30.00), (30.01, 1000.00)]
-                weights = [80, 12, 7, 1]
-                selected_range = random.choices(ranges, weights=weights, k=1)[0]
-                self.crash_multiplier = round(random.uniform(*selected_range), 2)
+            self.crash_multiplier = get_crash_sampler(default=DEFAULT_CRASH_SAMPLER).draw()
 
         super().save(*args, **kwargs)
 
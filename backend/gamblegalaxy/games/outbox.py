@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+# Events that only carry the plane's position: a newer one makes any unsent one worthless
+CONFLATABLE_EVENTS = {'multiplier', 'sync'}
+
+
+def is_conflatable(message):
+    """Whether a client event (or a frame of them) only reports the multiplier"""
+    if message.get('type') == 'frame':
+        events = message.get('events') or []
+        return bool(events) and all(event.get('type') in CONFLATABLE_EVENTS for event in events)
+    return message.get('type') in CONFLATABLE_EVENTS
+
+
+class OutboxStats:
+    """Process-wide counters for every connection's outbox"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.conflated = 0
+        self.laggards_disconnected = 0
+
+    def add(self, conflated=0, laggards_disconnected=0):
+        with self._lock:
+            self.conflated += conflated
+            self.laggards_disconnected += laggards_disconnected
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'conflated': self.conflated,
+                'laggards_disconnected': self.laggards_disconnected,
+            }
+
+
+outbox_stats = OutboxStats()
+
+
+class ConnectionOutbox:
+    """
+    Frames waiting to be written to one socket.
+
+    The consumer's group message handler only enqueues, so a client on a slow
+    link can no longer stall the handler and let the channel layer's per-channel
+    queue overflow (where messages are dropped at random). A writer task drains
+    the outbox in order. With backpressure on (AVIATOR_OUTBOX_BACKPRESSURE):
+
+    - a conflatable frame (multiplier ticks) replaces the previous one if that
+      is still unsent, so a laggard skips straight to the latest multiplier;
+    - everything else (round_started, crash, bets, the client's own results) is
+      always delivered;
+    - a client whose backlog stays over AVIATOR_OUTBOX_LIMIT frames, or whose
+      oldest unsent frame is older than AVIATOR_OUTBOX_MAX_LAG seconds, is
+      disconnected via `on_laggard` and counted in outbox_stats. Its pending
+      tick is dropped, but the frames still queued behind it are written first
+      (for up to AVIATOR_OUTBOX_MAX_LAG seconds) so it does not lose a crash
+      or a result it is owed.
+
+    Backpressure is only seen through `send` blocking while the client is not
+    reading. Uvicorn and hypercorn await the transport's drain; daphne, which
+    render.yaml deploys, returns once Twisted has buffered the frame and that
+    buffer is invisible to the ASGI app. So the setting is off by default and
+    the outbox is then a plain in-order relay; turn it on only behind a
+    draining server. Under daphne, slow clients are dropped by the IdleReaper
+    once they stop answering pings.
+    """
+
+    def __init__(self, send, on_laggard, limit=None, max_lag=None, backpressure=None):
+        self._send = send
+        self._on_laggard = on_laggard
+        self.limit = limit or settings.AVIATOR_OUTBOX_LIMIT
+        self.max_lag = max_lag or settings.AVIATOR_OUTBOX_MAX_LAG
+        self.backpressure = settings.AVIATOR_OUTBOX_BACKPRESSURE if backpressure is None else backpressure
+        # [queued_at, text_data, bytes_data]; a conflated slot is blanked to None in place
+        self._queue = deque()
+        self._pending_tick = None
+        self._size = 0
+        self._wakeup = asyncio.Event()
+        self._writer = None
+        self.closed = False
+
+    def start(self):
+        self._writer = asyncio.create_task(self._drain())
+
+    def close(self):
+        self.closed = True
+        if self._writer:
+            self._writer.cancel()
+
+    def put(self, text_data=None, bytes_data=None, conflatable=False):
+        if self.closed:
+            return
+        slot = [time.monotonic(), text_data, bytes_data]
+        if conflatable and self.backpressure:
+            if self._drop_pending_tick():
+                outbox_stats.add(conflated=1)
+            self._pending_tick = slot
+        self._queue.append(slot)
+        self._size += 1
+        self._wakeup.set()
+
+        if self.backpressure and (self._size > self.limit or self._lag() > self.max_lag):
+            self._give_up()
+
+    def _drop_pending_tick(self):
+        """Blank the unsent tick, if any, keeping its place in line; True if there was one"""
+        if self._pending_tick is None or self._pending_tick[0] is None:
+            return False
+        self._pending_tick[0] = None
+        self._size -= 1
+        return True
+
+    def _lag(self):
+        while self._queue and self._queue[0][0] is None:
+            self._queue.popleft()
+        if not self._queue:
+            return 0.0
+        return time.monotonic() - self._queue[0][0]
+
+    def _give_up(self):
+        print(f"[OUTBOX] Disconnecting laggard: {self._size} frames queued, {self._lag():.1f}s behind")
+        # No more frames are taken; the stale tick goes, everything else is still owed
+        self.closed = True
+        self._drop_pending_tick()
+        self._wakeup.set()
+        outbox_stats.add(laggards_disconnected=1)
+        asyncio.create_task(self._flush_then_disconnect())
+
+    async def _flush_then_disconnect(self):
+        try:
+            await asyncio.wait_for(asyncio.shield(self._writer), self.max_lag)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        await self._on_laggard()
+
+    async def _drain(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._queue:
+                slot = self._queue.popleft()
+                queued_at, text_data, bytes_data = slot
+                if queued_at is None:
+                    continue
+                # Mark it taken so a later tick does not try to conflate it away
+                slot[0] = None
+                self._size -= 1
+                await self._send(text_data=text_data, bytes_data=bytes_data)
+            if self.closed:
+                return
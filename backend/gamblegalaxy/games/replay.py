@@ -0,0 +1,36 @@
+from collections import deque
+
+
+class ReplayBuffer:
+    """
+    The last `maxlen` events the game loop published in the current round, by sequence.
+
+    The loop resets it when a new round opens for betting, so a client that
+    missed a round boundary resyncs from the game_state snapshot instead of
+    replaying ticks of a round that is already over.
+    """
+
+    def __init__(self, maxlen):
+        self._events = deque(maxlen=maxlen)
+        # Sequence of the last event before the buffer's first one
+        self._floor = 0
+        self._last = 0
+
+    def reset(self):
+        self._events.clear()
+        self._floor = self._last
+
+    def append(self, sequence, event):
+        if len(self._events) == self._events.maxlen:
+            self._floor = self._events[0][0]
+        self._events.append((sequence, event))
+        self._last = sequence
+
+    def since(self, after):
+        """
+        Events with a sequence above `after`, oldest first, or None when the
+        buffer no longer reaches back that far (or `after` is from the future).
+        """
+        if after < self._floor or after > self._last:
+            return None
+        return [event for sequence, event in self._events if sequence > after]
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+
+def shard_groups(group):
+    """Channel-layer groups a room is split into; the room itself when sharding is off"""
+    shards = settings.AVIATOR_ROOM_SHARDS
+    if shards <= 1:
+        return [group]
+    return [f"{group}.{index}" for index in range(shards)]
+
+
+def shard_for(group, channel_name):
+    """The shard group a socket joins, by a stable hash of its channel name"""
+    groups = shard_groups(group)
+    return groups[zlib.crc32(channel_name.encode()) % len(groups)]
+
+
+class ShardLatency:
+    """Publish latency per shard group since the last report"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, group, seconds):
+        with self._lock:
+            count, total, worst = self._stats.get(group, (0, 0.0, 0.0))
+            self._stats[group] = (count + 1, total + seconds, max(worst, seconds))
+
+    def report(self):
+        """{shard: {'sends', 'avg_ms', 'max_ms'}}, then start a fresh window"""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+        return {
+            group: {
+                'sends': count,
+                'avg_ms': round(total * 1000 / count, 2),
+                'max_ms': round(worst * 1000, 2),
+            }
+            for group, (count, total, worst) in sorted(stats.items())
+        }
+
+
+shard_latency = ShardLatency()
+
+
+async def _timed_send(channel_layer, group, message):
+    started = time.perf_counter()
+    await channel_layer.group_send(group, message)
+    shard_latency.record(group, time.perf_counter() - started)
+
+
+async def send_to_room(channel_layer, group, message):
+    """
+    group_send to every shard of a room in parallel.
+
+    Each shard's member list is walked by its own task, so publish latency grows
+    with the largest shard rather than the whole audience.
+    """
+    groups = shard_groups(group)
+    if len(groups) == 1:
+        await _timed_send(channel_layer, groups[0], message)
+        return
+    await asyncio.gather(*(_timed_send(channel_layer, shard, message) for shard in groups))
@@ -0,0 +1,392 @@
+import asyncio
+import time
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .bet_book import BookEntry
+from .journal import get_journal, PlaceBet, CashOut, JournalRejected
+from .round_clock import cashout_price, TooLate
+from .settlement import settle_auto_cashouts, settle_crashed_round
+from .subscriptions import user_group
+from .tables import DEFAULT_TABLE, get_table, table_key
+
+# Channel-layer channel the loop owner's actor reads (aviator.round_actor.<table> for other
+# tables); any worker can send commands to it
+ROUND_ACTOR_CHANNEL = 'aviator.round_actor'
+
+# Actors of the tables whose loop runs in this process
+_local_actors = {}
+
+
+def actor_channel(table):
+    return table_key(ROUND_ACTOR_CHANNEL, table, '.')
+
+
+class RoundActorStats:
+    """Throughput and queueing delay of the actor since the last report"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.commands = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.busy = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, waited, depth):
+        self.commands += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.max_depth = max(self.max_depth, depth)
+
+    def report(self):
+        """Counters for the round just finished, then start a fresh window"""
+        report = {
+            'commands': self.commands,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'busy': self.busy,
+            'max_depth': self.max_depth,
+            'avg_wait_ms': round(self.total_wait * 1000 / self.commands, 2) if self.commands else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 2),
+        }
+        self.reset()
+        return report
+
+
+class RoundActor:
+    """
+    Sequencer for everything that changes the money side of a round.
+
+    The game loop owns one actor. Bets and cashouts from every worker, and the
+    loop's own betting/take-off/auto-cashout/crash commands, go through one
+    bounded queue and are handled one at a time in arrival order. A cashout
+    that reaches the actor before the crash is priced by the time since
+    take-off on the loop process's monotonic clock (as of joining the queue)
+    and journaled; one that arrives after it is refused. The crash waits for
+    every cashout and auto cashout accepted before it to commit, and only then
+    settles the round's losing bets. Nothing needs a lock, and the stats show how the queue holds
+    up at the crash boundary.
+
+    Commands are dicts with a 'type'. Player commands carry 'reply_to', the
+    channel that gets an 'actor_reply' with the outcome; they arrive via the
+    table's actor channel, or straight into the queue from consumers in the
+    loop's own process.
+    """
+
+    def __init__(self, channel_layer, publish, resume, table=None, maxsize=None):
+        self.channel_layer = channel_layer
+        # Whose rounds this actor sequences, and the stake limits bets are checked against
+        self.table = table or get_table(DEFAULT_TABLE)
+        self.channel = actor_channel(self.table.name)
+        # The game's sequenced room broadcast, and its replay lookup for resuming clients
+        self.publish = publish
+        self.resume = resume
+        self.queue = asyncio.Queue(maxsize=maxsize or settings.AVIATOR_ROUND_ACTOR_QUEUE)
+        self.stats = RoundActorStats()
+        self.round = None
+        self.bet_book = None
+        self.phase = 'idle'
+        # Bets this round's auto cashouts took, so a manual cashout queued after them is refused
+        self._auto_cashed = set()
+        # time.monotonic() of take-off in this (the loop's) process
+        self.started_at = None
+        self._in_flight = set()
+        self._tasks = []
+
+    async def start(self):
+        _local_actors[self.table.name] = self
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._process()),
+        ]
+
+    def close(self):
+        if _local_actors.get(self.table.name) is self:
+            del _local_actors[self.table.name]
+        for task in self._tasks:
+            task.cancel()
+
+    # Loop side
+
+    async def tell(self, command_type, **fields):
+        """
+        Queue a loop transition behind every command already waiting; waits for
+        room rather than dropping it. Returns a future for the transition's result.
+        """
+        done = asyncio.get_running_loop().create_future()
+        await self.queue.put(dict(fields, type=command_type, done=done, queued_at=time.monotonic()))
+        return done
+
+    # Player side
+
+    def offer(self, command):
+        """Queue a player command, or refuse it straight away if the actor is saturated"""
+        command['queued_at'] = time.monotonic()
+        try:
+            self.queue.put_nowait(command)
+        except asyncio.QueueFull:
+            self.stats.busy += 1
+            asyncio.create_task(self._reply(command, {"error": "Game server busy, please try again."}))
+
+    async def _listen(self):
+        while True:
+            command = await self.channel_layer.receive(self.channel)
+            self.offer(command)
+
+    async def _process(self):
+        while True:
+            command = await self.queue.get()
+            self.stats.record(time.monotonic() - command['queued_at'], self.queue.qsize() + 1)
+            try:
+                result = await getattr(self, f"on_{command['type']}")(command)
+            except Exception as e:
+                print(f"[ACTOR] {command['type']} failed: {e}")
+                if 'done' in command:
+                    command['done'].set_exception(e)
+                else:
+                    await self._reply(command, {"error": "Request failed, please try again."})
+                continue
+            if 'done' in command:
+                command['done'].set_result(result)
+
+    async def _reply(self, command, message):
+        if command.get('request_id') is not None:
+            message['request_id'] = command['request_id']
+        if command.get('reply_to'):
+            await self.channel_layer.send(command['reply_to'], {'type': 'actor_reply', 'message': message})
+
+    async def _reject(self, command, error):
+        self.stats.rejected += 1
+        await self._reply(command, {"error": error})
+
+    def _track(self, coroutine):
+        """Run work accepted in queue order in the background; the crash waits for all of it"""
+        task = asyncio.create_task(coroutine)
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    def _journal(self, command, event, on_commit, on_error=None):
+        """Journal the event in queue order; reply once the group commit holding it is durable"""
+        self.stats.accepted += 1
+        self._track(self._await_commit(command, event, on_commit, on_error))
+
+    async def _await_commit(self, command, event, on_commit, on_error):
+        try:
+            await asyncio.wrap_future(get_journal().submit(event))
+        except Exception as e:
+            if on_error:
+                on_error()
+            if isinstance(e, JournalRejected):
+                await self._reply(command, {"error": str(e)})
+            else:
+                print(f"Error journaling {command['type']}: {str(e)}")
+                await self._reply(command, {"error": f"Failed to create transaction: {str(e)}"})
+            return
+        await on_commit(event)
+
+    # Transitions
+
+    async def on_betting(self, command):
+        self.round = command['aviator_round']
+        self.bet_book = command['bet_book']
+        self.phase = 'betting'
+        self.started_at = None
+        self._auto_cashed = set()
+
+    async def on_take_off(self, command):
+        self.phase = 'flying'
+        self.started_at = command['started_at']
+
+    async def on_auto_cashout(self, command):
+        """
+        Take the open bets whose auto-cashout threshold the loop's multiplier crossed
+        out of the book and settle them, in queue order with manual cashouts: a
+        manual cashout accepted before this leaves the book first, one after it is
+        refused. Returns the bets taken.
+        """
+        if self.phase != 'flying':
+            return []
+        due = self.bet_book.pop_crossed(command['multiplier'])
+        if due:
+            self._auto_cashed.update(entry.bet_id for entry in due)
+            self._track(self._settle_auto_cashouts(due))
+        return due
+
+    async def _settle_auto_cashouts(self, due):
+        try:
+            settled = await database_sync_to_async(settle_auto_cashouts)(due)
+        except Exception as e:
+            print(f"[ACTOR] Auto cashout of {len(due)} bets in round {self.round.id} failed: {e}")
+            return
+        round_id = self.round.id
+        for entry in settled:
+            await self.publish({
+                'type': 'send_to_group',
+                'type_override': 'cash_out',
+                'username': entry.username,
+                'multiplier': entry.auto_cashout,
+                'amount': float(entry.amount),
+                'win_amount': entry.win_amount(),
+                'server_time': int(time.time() * 1000)
+            })
+            # 🔧 The owner hears about it even if they don't subscribe to everyone's cashouts
+            await self.channel_layer.group_send(user_group(self.table.room_group_name, entry.user_id), {
+                'type': 'player_result',
+                'message': {
+                    'type': 'auto_cashout',
+                    'bet_id': entry.bet_id,
+                    'round_id': round_id,
+                    'multiplier': entry.auto_cashout,
+                    'win_amount': entry.win_amount(),
+                    'server_time': int(time.time() * 1000)
+                }
+            })
+
+    async def on_crash(self, command):
+        """Close the round to cashouts, let accepted ones (and auto cashouts) commit, then settle the rest as lost"""
+        self.phase = 'crashed'
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        return await database_sync_to_async(settle_crashed_round)(self.round.id, self.round.crash_multiplier)
+
+    # Player commands
+
+    async def on_resume(self, command):
+        # Answered in queue order, so the replay holds every event published before it
+        await self._reply(command, self.resume(command['stream'], command['sequence']))
+
+    async def on_place_bet(self, command):
+        if self.phase != 'betting':
+            await self._reject(command, "Betting is not open.")
+            return
+        limit_error = self.table.bet_error(command['amount'])
+        if limit_error:
+            await self._reject(command, limit_error)
+            return
+
+        aviator_round = self.round
+        bet_book = self.bet_book
+        user = get_user_model()(pk=command['user_id'], username=command['username'])
+
+        async def placed(event):
+            # Straight into the round's book, so its auto cashout never waits on a DB poll
+            bet_book.add(BookEntry(event.bet.id, user.id, user.username, event.amount, event.auto_cashout))
+            await self.publish({
+                'type': 'send_to_group',
+                'type_override': 'bet_placed',
+                'username': user.username,
+                'amount': float(event.amount),
+                'auto_cashout': event.auto_cashout,
+                'round_id': aviator_round.id,
+                'user_id': user.id,
+                'server_time': int(time.time() * 1000)
+            })
+            await self._reply(command, {
+                "type": "bet_placed",
+                "message": "Bet placed successfully",
+                "round_id": aviator_round.id,
+                "amount": float(event.amount),
+                "bet_id": event.bet.id,
+                "user_id": user.id,
+                "new_balance": float(event.balance),
+                "server_time": int(time.time() * 1000)
+            })
+            print(f"[PLACE BET] SUCCESS: {user.username} placed bet {event.bet.id} in round {aviator_round.id}")
+
+        self._journal(command, PlaceBet(user, aviator_round, command['amount'], command.get('auto_cashout')), placed)
+
+    async def on_cashout(self, command):
+        if self.phase == 'crashed':
+            await self._reject(command, f"Too late, round crashed at {self.round.crash_multiplier}x!")
+            return
+        if self.phase != 'flying':
+            await self._reject(command, "Round is not active")
+            return
+        if command['bet_id'] in self._auto_cashed:
+            await self._reject(command, "Already cashed out.")
+            return
+
+        try:
+            # Both ends on this process's monotonic clock: take-off and the cashout joining the queue
+            multiplier = cashout_price(self.round.crash_multiplier, command['queued_at'] - self.started_at)
+        except TooLate as e:
+            await self._reject(command, str(e))
+            return
+
+        user = get_user_model()(pk=command['user_id'], username=command['username'])
+        round_id = self.round.id
+
+        # Out of the book now, so an auto cashout queued behind this one cannot take the bet too
+        bet_book = self.bet_book
+        entry = bet_book.discard(command['bet_id'])
+
+        def refused():
+            if entry is not None:
+                bet_book.add(entry)
+
+        async def cashed_out(event):
+            await self.publish({
+                'type': 'send_to_group',
+                'type_override': 'cash_out',
+                'username': user.username,
+                'multiplier': multiplier,
+                'amount': float(event.bet.amount),
+                'win_amount': event.win_amount,
+                'server_time': int(time.time() * 1000)
+            })
+            await self._reply(command, {
+                "type": "cash_out_success",
+                "message": "Cashout successful",
+                "win_amount": event.win_amount,
+                "multiplier": multiplier,
+                "new_balance": float(event.balance),
+                "user_id": user.id,
+                "server_time": int(time.time() * 1000)
+            })
+            print(f"[Cashout] SUCCESS: {user.username} cashed out at {multiplier}x for {event.win_amount} from round {round_id}")
+
+        self._journal(
+            command,
+            CashOut(user, command['bet_id'], multiplier, command['description'].format(multiplier=multiplier), round_id=round_id),
+            cashed_out,
+            refused
+        )
+
+
+async def send_to_round_actor(channel_layer, command, table=DEFAULT_TABLE):
+    """
+    Hand a player command to a table's actor: directly if that table's loop runs in
+    this process, else over the channel layer
+    """
+    actor = _local_actors.get(table)
+    if actor is not None:
+        actor.offer(command)
+    else:
+        await channel_layer.send(actor_channel(table), command)
+
+
+async def ask_round_actor(channel_layer, command, timeout=None, table=DEFAULT_TABLE):
+    """
+    Send a player command and wait for the actor's reply message (for REST views).
+
+    A command the actor has not answered within the timeout may still be applied,
+    so it is not reported as failed: the reply is a "pending" status and the client
+    checks the outcome with the bet status endpoint instead of retrying blindly.
+    """
+    command['reply_to'] = await channel_layer.new_channel()
+    await send_to_round_actor(channel_layer, command, table)
+    try:
+        reply = await asyncio.wait_for(
+            channel_layer.receive(command['reply_to']),
+            timeout or settings.AVIATOR_ROUND_ACTOR_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        return {"status": "pending", "message": "Game server is still processing this request, check the bet status."}
+    return reply['message']
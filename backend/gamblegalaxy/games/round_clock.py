@@ -0,0 +1,26 @@
+import math
+
+from .flight_curve import FlightCurve
+
+
+class TooLate(Exception):
+    """The round has crashed by the loop's clock"""
+
+
+def cashout_price(crash_multiplier, elapsed):
+    """
+    The multiplier a cashout is paid at, `elapsed` seconds after take-off.
+
+    It is read off the flight curve, rounded down to the cent - the same
+    multiplier the loop is streaming at that moment. Clients therefore only say
+    "cash out now"; whatever multiplier they last saw is irrelevant. `elapsed`
+    must come from the loop process's monotonic clock (the round actor measures
+    it from take-off to the moment the cashout joined its queue), never from a
+    web worker's wall clock. Raises TooLate with a client-facing message when
+    the round has crashed by then.
+    """
+    # The epsilon keeps 1.01 from flooring to 1.00 through float error
+    price = math.floor(FlightCurve.default().multiplier_at(max(0.0, elapsed)) * 100 + 1e-6) / 100
+    if price >= crash_multiplier - 0.01:
+        raise TooLate(f"Too late, round crashed at {crash_multiplier}x!")
+    return price
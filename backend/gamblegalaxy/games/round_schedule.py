@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import secrets
+from collections import deque
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import AviatorRound
+from .tables import DEFAULT_TABLE
+
+GENESIS_HASH = '0' * 64
+
+
+def chain_hash(previous_hash, salt, crash_multiplier):
+    """Hash committing to a round's crash multiplier and, through previous_hash, to every round before it"""
+    return hashlib.sha256(f"{previous_hash}:{salt}:{crash_multiplier:.2f}".encode()).hexdigest()
+
+
+def verify_chain(rounds, previous_hash=GENESIS_HASH):
+    """
+    Check that consecutive rounds (oldest first) were not altered after being scheduled.
+    Returns the first round whose hash does not match, or None if the chain holds.
+    """
+    for aviator_round in rounds:
+        if aviator_round.chain_hash != chain_hash(previous_hash, aviator_round.salt, aviator_round.crash_multiplier):
+            return aviator_round
+        previous_hash = aviator_round.chain_hash
+    return None
+
+
+def load_scheduled_rounds(table=DEFAULT_TABLE):
+    """Rounds a previous loop owner of the table scheduled but never started, in play order"""
+    return list(AviatorRound.objects.filter(scheduled=True, table=table).order_by('id'))
+
+
+def create_scheduled_rounds(crash_multipliers, table=DEFAULT_TABLE):
+    """Insert future rounds for the given multipliers with one bulk_create, chained onto the table's last round"""
+    last = AviatorRound.objects.filter(table=table).exclude(chain_hash='').order_by('-id').values_list('chain_hash', flat=True).first()
+    previous_hash = last or GENESIS_HASH
+
+    rounds = []
+    for crash_multiplier in crash_multipliers:
+        salt = secrets.token_hex(16)
+        previous_hash = chain_hash(previous_hash, salt, crash_multiplier)
+        rounds.append(AviatorRound(
+            crash_multiplier=crash_multiplier,
+            is_active=False,
+            scheduled=True,
+            salt=salt,
+            chain_hash=previous_hash,
+            table=table
+        ))
+    return AviatorRound.objects.bulk_create(rounds)
+
+
+def activate_round(aviator_round):
+    aviator_round.scheduled = False
+    aviator_round.is_active = True
+    aviator_round.start_time = timezone.now()
+    AviatorRound.objects.filter(id=aviator_round.id).update(
+        scheduled=False,
+        is_active=True,
+        start_time=aviator_round.start_time
+    )
+    return aviator_round
+
+
+def start_round_now(crash_multiplier, table=DEFAULT_TABLE):
+    """Create a round outside the pre-drawn batch (chained like the others) and activate it"""
+    return activate_round(create_scheduled_rounds([crash_multiplier], table)[0])
+
+
+def delete_scheduled_rounds(round_ids):
+    """Delete rounds that were drawn but never played; later batches chain onto the last round left"""
+    AviatorRound.objects.filter(id__in=round_ids, scheduled=True).delete()
+
+
+class RoundSchedule:
+    """
+    Queue of future rounds with their crash multipliers already drawn.
+
+    A background producer tops the queue up with AVIATOR_ROUND_BATCH_SIZE rounds
+    (one bulk_create) whenever it drops below AVIATOR_ROUND_LOW_WATER, so the game
+    loop starts a round with a pop instead of an INSERT. `draw` is the async
+    crash multiplier generator; it must not consume anything (like a sure odd)
+    that should only be used up once the round is played.
+
+    `distribution` is an optional async callable returning a key for the crash
+    distribution `draw` follows right now. Each batch is tagged with the key it
+    was drawn under, and queued rounds whose key no longer matches are deleted
+    unplayed when the next round is popped, so a change to the crash ranges
+    applies from the next round rather than after the queued batch. Rounds left
+    by a previous loop owner have no key and are played as they are.
+    """
+
+    def __init__(self, draw, table=DEFAULT_TABLE, batch_size=None, low_water=None, distribution=None):
+        self.draw = draw
+        self.distribution = distribution
+        self.table = table
+        self.batch_size = batch_size or settings.AVIATOR_ROUND_BATCH_SIZE
+        self.low_water = low_water or settings.AVIATOR_ROUND_LOW_WATER
+        self._queue = deque()
+        self._refill_task = None
+
+    async def start(self):
+        """Pick up rounds left scheduled by a previous loop owner, then fill the queue"""
+        self._queue.extend(await database_sync_to_async(load_scheduled_rounds)(self.table))
+        self._ensure_refill()
+
+    def close(self):
+        if self._refill_task:
+            self._refill_task.cancel()
+
+    def _ensure_refill(self):
+        if len(self._queue) < self.low_water and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        key = await self.distribution() if self.distribution else None
+        multipliers = [await self.draw() for _ in range(self.batch_size)]
+        rounds = await database_sync_to_async(create_scheduled_rounds)(multipliers, self.table)
+        for aviator_round in rounds:
+            aviator_round.distribution = key
+        self._queue.extend(rounds)
+        print(f"[SCHEDULE] Table {self.table}: scheduled rounds {rounds[0].id}-{rounds[-1].id}, {len(self._queue)} queued")
+
+    async def _drop_stale(self):
+        """Delete queued rounds drawn under a crash distribution that has since changed"""
+        key = await self.distribution()
+        stale = [r.id for r in self._queue if getattr(r, 'distribution', None) not in (None, key)]
+        if not stale:
+            return
+        self._queue = deque(r for r in self._queue if r.id not in set(stale))
+        await database_sync_to_async(delete_scheduled_rounds)(stale)
+        print(f"[SCHEDULE] Table {self.table}: crash distribution changed, dropped {len(stale)} unplayed rounds")
+
+    async def next_round(self):
+        """Pop the next round and mark it active"""
+        if self.distribution:
+            await self._drop_stale()
+        while not self._queue:
+            self._ensure_refill()
+            await asyncio.shield(self._refill_task)
+        aviator_round = self._queue.popleft()
+        self._ensure_refill()
+        return await database_sync_to_async(activate_round)(aviator_round)
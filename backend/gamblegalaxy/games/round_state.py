@@ -0,0 +1,221 @@
+import json
+import threading
+import time
+
+from django.conf import settings
+
+from .tables import DEFAULT_TABLE, table_key
+
+# Shape of the round state shared between the game loop, the consumers and the REST views
+DEFAULT_ROUND_STATE = {
+    'round_id': None,
+    'crash_multiplier': None,
+    'current_multiplier': 1.0,
+    'is_active': False,
+    'is_betting': False,
+    'crashed': False,
+    'last_update': 0,
+    'round_start_time': None
+}
+
+
+class RoundSnapshot:
+    """
+    Immutable round state.
+
+    The game loop never changes a snapshot: it builds a new one and swaps the
+    store's reference, which readers pick up with a plain attribute read - no
+    lock and no copy. Fields read as attributes or, like the dict this
+    replaces, with state['field'] / state.get('field').
+    """
+
+    __slots__ = tuple(DEFAULT_ROUND_STATE)
+
+    def __init__(self, **fields):
+        for field, default in DEFAULT_ROUND_STATE.items():
+            object.__setattr__(self, field, fields.pop(field, default))
+        if fields:
+            raise TypeError(f"Unknown round state fields: {', '.join(fields)}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RoundSnapshot is immutable; use replace()")
+
+    def replace(self, **fields):
+        """A new snapshot with `fields` changed"""
+        snapshot = object.__new__(RoundSnapshot)
+        for field in self.__slots__:
+            object.__setattr__(snapshot, field, fields.pop(field) if field in fields else getattr(self, field))
+        if fields:
+            raise TypeError(f"Unknown round state fields: {', '.join(fields)}")
+        return snapshot
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field) from None
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"RoundSnapshot({self.as_dict()})"
+
+
+class RoundStateStore:
+    """
+    Where the current Aviator round state lives.
+
+    The game loop is the only writer; consumers and REST views on any worker read it
+    with a single call and get a RoundSnapshot. Both sync and async entry points are provided so views never
+    need to spin up an event loop just to read a dict.
+    """
+
+    def get(self):
+        raise NotImplementedError
+
+    def update(self, **fields):
+        raise NotImplementedError
+
+    def set_state_frame(self, frames):
+        """Store the pre-encoded game_state frames ({codec: [text, bytes]}) late joiners get"""
+        raise NotImplementedError
+
+    def get_state_frame(self, codec_name):
+        """The stored game_state frame for one codec as (text_data, bytes_data), or None"""
+        raise NotImplementedError
+
+    async def aget(self):
+        return self.get()
+
+    async def aupdate(self, **fields):
+        self.update(**fields)
+
+    async def aset_state_frame(self, frames):
+        self.set_state_frame(frames)
+
+    async def aget_state_frame(self, codec_name):
+        return self.get_state_frame(codec_name)
+
+
+class LocalRoundStateStore(RoundStateStore):
+    """
+    In-process store, used for single-worker and local development setups.
+
+    Reads return the current snapshot as is; an update swaps in a new one in a
+    single reference assignment, so readers never wait on the writer.
+    """
+
+    def __init__(self):
+        self._snapshot = RoundSnapshot()
+        self._frames = {}
+        # Serialises writers only (the loop, and tests); readers never take it
+        self._write_lock = threading.Lock()
+
+    def get(self):
+        return self._snapshot
+
+    def update(self, **fields):
+        with self._write_lock:
+            self._snapshot = self._snapshot.replace(last_update=int(time.time() * 1000), **fields)
+
+    def set_state_frame(self, frames):
+        self._frames = frames
+
+    def get_state_frame(self, codec_name):
+        frame = self._frames.get(codec_name)
+        return tuple(frame) if frame else None
+
+
+class RedisRoundStateStore(RoundStateStore):
+    """
+    Store shared by every worker through Redis.
+
+    Each field is kept JSON-encoded in one hash so a read is a single HGETALL and a
+    write a single HSET, whichever daphne process performs it.
+    """
+
+    def __init__(self, url, key='aviator:round_state', frame_key='aviator:state_frame'):
+        # Imported lazily: redis is only installed alongside channels_redis
+        import redis
+        import redis.asyncio
+
+        self.key = key
+        self.frame_key = frame_key
+        self._client = redis.Redis.from_url(url)
+        self._async_client = redis.asyncio.Redis.from_url(url)
+
+    def _decode(self, raw):
+        return RoundSnapshot(**{
+            field.decode(): json.loads(value)
+            for field, value in raw.items()
+            if field.decode() in DEFAULT_ROUND_STATE
+        })
+
+    def _encode(self, fields):
+        fields = dict(fields, last_update=int(time.time() * 1000))
+        return {field: json.dumps(value) for field, value in fields.items()}
+
+    def get(self):
+        return self._decode(self._client.hgetall(self.key))
+
+    def update(self, **fields):
+        self._client.hset(self.key, mapping=self._encode(fields))
+
+    # Frames are stored one hash field per codec, tagged t/b for text or binary
+    def _encode_frames(self, frames):
+        return {
+            name: b't' + text_data.encode() if text_data is not None else b'b' + bytes_data
+            for name, (text_data, bytes_data) in frames.items()
+        }
+
+    def _decode_frame(self, raw):
+        if not raw:
+            return None
+        if raw[:1] == b't':
+            return raw[1:].decode(), None
+        return None, raw[1:]
+
+    def set_state_frame(self, frames):
+        self._client.hset(self.frame_key, mapping=self._encode_frames(frames))
+
+    def get_state_frame(self, codec_name):
+        return self._decode_frame(self._client.hget(self.frame_key, codec_name))
+
+    async def aget(self):
+        return self._decode(await self._async_client.hgetall(self.key))
+
+    async def aupdate(self, **fields):
+        await self._async_client.hset(self.key, mapping=self._encode(fields))
+
+    async def aset_state_frame(self, frames):
+        await self._async_client.hset(self.frame_key, mapping=self._encode_frames(frames))
+
+    async def aget_state_frame(self, codec_name):
+        return self._decode_frame(await self._async_client.hget(self.frame_key, codec_name))
+
+
+_stores = {}
+_store_lock = threading.Lock()
+
+
+def get_round_state_store(table=DEFAULT_TABLE):
+    """Return the process-wide round state store of a table, configured by AVIATOR_ROUND_STATE_BACKEND"""
+    store = _stores.get(table)
+    if store is None:
+        with _store_lock:
+            store = _stores.get(table)
+            if store is None:
+                if settings.AVIATOR_ROUND_STATE_BACKEND == 'redis':
+                    store = RedisRoundStateStore(
+                        settings.REDIS_URL,
+                        key=table_key('aviator:round_state', table),
+                        frame_key=table_key('aviator:state_frame', table)
+                    )
+                else:
+                    store = LocalRoundStateStore()
+                _stores[table] = store
+    return store
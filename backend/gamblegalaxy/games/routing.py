@@ -5,4 +5,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r"ws/aviator/$", consumers.AviatorConsumer.as_asgi()),
+    re_path(r"ws/aviator/(?P<table>[a-z0-9_-]+)/$", consumers.AviatorConsumer.as_asgi()),
 ]
\ No newline at end of file
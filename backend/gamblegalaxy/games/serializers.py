@@ -20,13 +20,17 @@ class AviatorRoundSerializer(serializers.ModelSerializer):
 
 class AviatorBetSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
-    round_crash = serializers.FloatField(source='round.crash_multiplier', read_only=True)
+    round_crash = serializers.SerializerMethodField()
 
     class Meta:
         model = AviatorBet
         fields = ['id', 'user', 'username', 'round', 'round_crash', 'amount', 'auto_cashout', 'cash_out_multiplier', 'final_multiplier', 'is_winner', 'created_at']
         read_only_fields = ['id', 'username', 'round_crash', 'cash_out_multiplier', 'final_multiplier', 'is_winner', 'created_at']
 
+    def get_round_crash(self, obj):
+        # Not revealed while the round is still flying
+        return None if obj.round.is_active else obj.round.crash_multiplier
+
     def validate(self, data):
         round = data.get("round")
         user = data.get("user")
@@ -0,0 +1,133 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AviatorRound, AviatorBet
+from .signals import aviator_bets_cashed_out
+from wallet.ledger import credit_wallets
+from wallet.models import Wallet
+
+
+def settle_auto_cashouts(entries):
+    """
+    Mark a tick's crossed auto-cashout bets as won and pay them out in one batch.
+
+    Rows are claimed with SELECT ... FOR UPDATE first, so a bet cashed out manually
+    in the meantime is skipped rather than paid twice. The winnings are credited
+    with a single wallet UPDATE and ledger insert in the same transaction.
+    Returns the claimed entries.
+
+    Locks are taken in the journal's order - wallets by id, then bets by id - so
+    a manual cashout of the same bet racing this one waits instead of deadlocking.
+    """
+    if not entries:
+        return []
+
+    with transaction.atomic():
+        list(Wallet.objects.select_for_update().filter(
+            user_id__in={entry.user_id for entry in entries}
+        ).order_by('id').values_list('id', flat=True))
+        claimed_ids = set(AviatorBet.objects.select_for_update().filter(
+            id__in=[entry.bet_id for entry in entries],
+            cash_out_multiplier__isnull=True
+        ).order_by('id').values_list('id', flat=True))
+        if not claimed_ids:
+            return []
+
+        AviatorBet.objects.filter(id__in=claimed_ids).update(
+            cash_out_multiplier=F('auto_cashout'),
+            final_multiplier=F('auto_cashout'),
+            is_winner=True
+        )
+
+        claimed = [entry for entry in entries if entry.bet_id in claimed_ids]
+        aviator_bets_cashed_out.send(sender=AviatorBet, bets=[
+            AviatorBet(
+                id=entry.bet_id,
+                user_id=entry.user_id,
+                amount=entry.amount,
+                cash_out_multiplier=entry.auto_cashout,
+                final_multiplier=entry.auto_cashout,
+                is_winner=True
+            )
+            for entry in claimed
+        ])
+        credit_wallets(
+            (entry.user_id, entry.win_amount(), f'Auto-cashout on Aviator at {entry.auto_cashout}x')
+            for entry in claimed
+        )
+    return claimed
+
+
+def settle_crashed_round(round_id, crash_multiplier):
+    """
+    Close a crashed round and mark every uncashed bet as lost with set-based statements.
+
+    The round and all of its losing bets are settled with two UPDATEs in one
+    transaction, whatever the number of bets. Returns (lost bet count, elapsed ms);
+    a round is reported when it takes longer than AVIATOR_SETTLEMENT_BUDGET_MS per
+    thousand bets, with rounds under a thousand bets held to one full budget.
+    """
+    started = time.perf_counter()
+    with transaction.atomic():
+        AviatorRound.objects.filter(id=round_id).update(
+            is_active=False,
+            ended_at=timezone.now()
+        )
+        # No dashboard activity is recorded for a loss, so skipping post_save loses nothing
+        lost = AviatorBet.objects.filter(
+            round_id=round_id,
+            cash_out_multiplier__isnull=True
+        ).update(
+            final_multiplier=crash_multiplier,
+            is_winner=False
+        )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    budget_ms = settings.AVIATOR_SETTLEMENT_BUDGET_MS * max(1, lost / 1000)
+    if elapsed_ms > budget_ms:
+        print(f"[SETTLEMENT] Round {round_id}: {lost} bets took {elapsed_ms:.1f}ms, "
+              f"over budget of {budget_ms:.1f}ms ({settings.AVIATOR_SETTLEMENT_BUDGET_MS}ms per 1000 bets)")
+    return lost, elapsed_ms
+
+
+def void_abandoned_rounds(table):
+    """
+    Void the rounds of a table left active by a loop owner that lost its lease.
+
+    Nobody knows how far such a round flew, so its open bets are neither won
+    nor lost: every stake is refunded and the bet is closed at 1.0x (not a
+    winner), which also keeps a late cashout from paying it. Bets already cashed
+    out keep their winnings. Call it after taking the table's lease and before
+    the first round starts. Returns (voided round count, refunded bet count).
+    """
+    with transaction.atomic():
+        round_ids = list(AviatorRound.objects.select_for_update().filter(
+            table=table,
+            is_active=True
+        ).values_list('id', flat=True))
+        if not round_ids:
+            return 0, 0
+
+        open_bets = AviatorBet.objects.filter(round_id__in=round_ids, cash_out_multiplier__isnull=True)
+        # Same lock order as the journal and auto cashouts: wallets by id, then bets by id
+        list(Wallet.objects.select_for_update().filter(
+            user_id__in=open_bets.values('user_id')
+        ).order_by('id').values_list('id', flat=True))
+        refunds = list(open_bets.select_for_update().order_by('id').values_list('id', 'user_id', 'amount', 'round_id'))
+
+        AviatorBet.objects.filter(id__in=[bet_id for bet_id, _, _, _ in refunds]).update(
+            cash_out_multiplier=1.0,
+            final_multiplier=1.0,
+            is_winner=False
+        )
+        AviatorRound.objects.filter(id__in=round_ids).update(is_active=False, ended_at=timezone.now())
+        credit_wallets(
+            ((user_id, amount, f'Aviator round {round_id} voided, stake refunded') for _, user_id, amount, round_id in refunds),
+            transaction_type='refund'
+        )
+    print(f"[SETTLEMENT] Table {table}: voided abandoned rounds {round_ids}, refunded {len(refunds)} bets")
+    return len(round_ids), len(refunds)
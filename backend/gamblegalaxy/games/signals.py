@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
+
+from .models import CrashMultiplierSetting, SureOdd
+from .crash_sampler import invalidate_crash_sampler, invalidate_sure_odds
+
+# Sent after bets are cashed out with set-based or bulk UPDATEs, which bypass post_save.
+# `bets` is a list of AviatorBet instances carrying id, user_id, amount and cash_out_multiplier.
+aviator_bets_cashed_out = Signal()
+
+# Sent by the game journal after it bulk-inserts new bets (`bets`);
+# bulk_create does not fire post_save either.
+aviator_bets_placed = Signal()
+
+
+@receiver([post_save, post_delete], sender=CrashMultiplierSetting)
+def rebuild_crash_sampler(sender, **kwargs):
+    invalidate_crash_sampler()
+
+@receiver([post_save, post_delete], sender=SureOdd)
+def recheck_sure_odds(sender, **kwargs):
+    invalidate_sure_odds()
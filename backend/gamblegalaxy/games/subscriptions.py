@@ -0,0 +1,56 @@
+"""
+Optional event classes of the Aviator room.
+
+Ticks and round transitions go to the room group itself and every socket gets
+them. Other players' bets and cashouts and the top winners list are published
+to a sub-group per class (aviator_room.bets ...), and a socket only joins the
+sub-groups it subscribed to, so an unsubscribed client never has those events
+batched, encoded or queued for it. A player's own results are not broadcasts:
+they come back as actor replies, or on the player's own group for auto cashouts.
+"""
+
+# Client event type -> the class a socket subscribes to for it
+EVENT_CLASSES = {
+    'bet_placed': 'bets',
+    'bot_bet': 'bets',
+    'cash_out': 'cashouts',
+    'bot_cashout': 'cashouts',
+    'top_winners_updated': 'winners',
+}
+
+SUBSCRIBABLE = frozenset(EVENT_CLASSES.values())
+
+
+def class_group(group, event_class):
+    return f"{group}.{event_class}"
+
+
+def event_group(group, event):
+    """The group a client event is published to: its class's sub-group, or the room"""
+    event_class = EVENT_CLASSES.get(event.get('type'))
+    return class_group(group, event_class) if event_class else group
+
+
+def user_group(group, user_id):
+    """Group holding every socket of one signed-in player, for results only they get"""
+    return f"{group}.user.{user_id}"
+
+
+def parse_subscriptions(classes):
+    """
+    The set of event classes from a list (or comma-separated string) of names.
+    Raises ValueError on a name that is not a subscribable class.
+    """
+    if isinstance(classes, str):
+        classes = classes.split(',')
+    subscriptions = {name.strip() for name in classes if name and name.strip()}
+    unknown = subscriptions - SUBSCRIBABLE
+    if unknown:
+        raise ValueError(f"Unknown event classes: {', '.join(sorted(unknown))}")
+    return subscriptions
+
+
+def is_subscribed(event, subscriptions):
+    """Whether a client event reaches a socket with these subscriptions"""
+    event_class = EVENT_CLASSES.get(event.get('type'))
+    return event_class is None or event_class in subscriptions
@@ -0,0 +1,73 @@
+import re
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .crash_sampler import CrashSampler
+
+# The table served on ws/aviator/; it keeps the room, keys and channels from before tables existed
+DEFAULT_TABLE = 'default'
+
+TABLE_NAME = re.compile(r'^[a-z0-9_-]{1,32}$')
+
+
+def table_key(key, table, separator=':'):
+    """A shared key, group or channel name scoped to one table (the default table keeps the bare name)"""
+    return key if table == DEFAULT_TABLE else f"{key}{separator}{table}"
+
+
+class AviatorTable:
+    """
+    One Aviator table: its own rounds, room, state and actor, and its game settings.
+
+    Tables come from AVIATOR_TABLES, e.g.
+    {"default": {}, "turbo": {"betting_seconds": 3, "max_bet": 500, "crash_ranges": [[1, 2, 90], [2, 10, 10]]}}
+    A table without crash_ranges draws from the admin's CrashMultiplierSetting ranges.
+    """
+
+    def __init__(self, name, betting_seconds=5, min_bet=None, max_bet=None, crash_ranges=None):
+        if not TABLE_NAME.match(name):
+            raise ImproperlyConfigured(f"AVIATOR_TABLES: invalid table name {name!r}")
+        self.name = name
+        self.betting_seconds = betting_seconds
+        self.min_bet = min_bet
+        self.max_bet = max_bet
+        self.sampler = CrashSampler(crash_ranges) if crash_ranges else None
+        # The room keeps the '.' suffixes free for shards and subscription classes
+        self.room_group_name = table_key('aviator_room', name, '-')
+
+    def bet_error(self, amount):
+        """Why a stake is outside this table's limits, or None if it is fine"""
+        if self.min_bet is not None and amount < self.min_bet:
+            return f"Minimum bet on this table is {self.min_bet}."
+        if self.max_bet is not None and amount > self.max_bet:
+            return f"Maximum bet on this table is {self.max_bet}."
+        return None
+
+    def __repr__(self):
+        return f"AviatorTable({self.name})"
+
+
+_tables = None
+_tables_lock = threading.Lock()
+
+
+def get_tables():
+    """Every configured table by name, built once from AVIATOR_TABLES"""
+    global _tables
+    if _tables is None:
+        with _tables_lock:
+            if _tables is None:
+                try:
+                    tables = {name: AviatorTable(name, **options) for name, options in settings.AVIATOR_TABLES.items()}
+                except TypeError as e:
+                    raise ImproperlyConfigured(f"AVIATOR_TABLES: {e}")
+                tables.setdefault(DEFAULT_TABLE, AviatorTable(DEFAULT_TABLE))
+                _tables = tables
+    return _tables
+
+
+def get_table(name=DEFAULT_TABLE):
+    """The table called `name`, or None if there is no such table"""
+    return get_tables().get(name)
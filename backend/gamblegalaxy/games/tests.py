@@ -1,3 +1,980 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import io
+import json
+import random
+import threading
+import time
+from contextlib import redirect_stdout
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, close_old_connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .bet_book import BookEntry
+from . import event_frames, journal, tables
+from .journal import CashOut, GameJournal, JournalRejected, PlaceBet, clean_bet, commit_group
+from .crash_sampler import CrashSampler, get_crash_sampler, invalidate_crash_sampler, invalidate_sure_odds
+from .consumers import AviatorConsumer
+from .event_frames import encoded_message, loop_flushes_frames, publish_event, run_frame_flusher
+from .game_loop import FALLBACK_CRASH_SAMPLER, AviatorGame
+from .loop_lease import LocalLoopLease, run_as_leader
+from .models import AviatorRound, AviatorBet, CrashMultiplierSetting, SureOdd
+from .outbox import ConnectionOutbox
+from .bet_book import RoundBetBook
+from .flight_curve import FlightCurve
+from .round_actor import RoundActor, ask_round_actor
+from .round_state import DEFAULT_ROUND_STATE, LocalRoundStateStore, RoundSnapshot
+from .room_shards import send_to_room, shard_for, shard_groups
+from .round_schedule import RoundSchedule
+from .tables import DEFAULT_TABLE, table_key
+from .subscriptions import event_group, is_subscribed, parse_subscriptions
+from .tick_scheduler import TickScheduler
+from .wire_format import SYNC, TICK, TICK_KINDS, CompactCodec, JsonCodec, encode_once, negotiate
+from .settlement import settle_auto_cashouts, settle_crashed_round, void_abandoned_rounds
+from wallet.models import Wallet, Transaction
+
+
+class AviatorTestCase(TransactionTestCase):
+    """Players with funded wallets and a round to bet on; committed for real so other threads see them"""
+
+    def make_player(self, name, balance=100):
+        user = get_user_model().objects.create(username=name, email=f"{name}@example.com")
+        Wallet.objects.filter(user=user).update(balance=balance)
+        return user
+
+    def balance(self, user):
+        return Wallet.objects.get(user=user).balance
+
+    def setUp(self):
+        self.round = AviatorRound.objects.create(crash_multiplier=5.0, is_active=True)
+
+
+class SettlementLockOrderTests(AviatorTestCase):
+    """Manual cashouts (journal) and auto cashouts (settlement) of the same bet"""
+
+    def setUp(self):
+        super().setUp()
+        self.player = self.make_player('pilot')
+        self.bet = AviatorBet.objects.create(user=self.player, round=self.round, amount=10, auto_cashout=2.0)
+        self.entry = BookEntry(self.bet.id, self.player.id, self.player.username, Decimal('10'), 2.0)
+
+    def manual_cashout(self):
+        event = CashOut(self.player, self.bet.id, 1.5, 'Cashout at 1.5x', round_id=self.round.id)
+        commit_group([event])
+        return event
+
+    def first_query_on(self, queries, table):
+        return next(i for i, query in enumerate(queries) if f'"{table}"' in query['sql'])
+
+    def test_both_paths_lock_wallets_before_bets(self):
+        with CaptureQueriesContext(connection) as manual:
+            self.manual_cashout()
+        self.bet.refresh_from_db()
+        AviatorBet.objects.filter(id=self.bet.id).update(cash_out_multiplier=None, is_winner=False)
+        with CaptureQueriesContext(connection) as auto:
+            settle_auto_cashouts([self.entry])
+
+        for queries in (manual.captured_queries, auto.captured_queries):
+            self.assertLess(
+                self.first_query_on(queries, 'wallet_wallet'),
+                self.first_query_on(queries, 'games_aviatorbet')
+            )
+
+    def test_auto_cashout_skips_bet_cashed_out_manually(self):
+        event = self.manual_cashout()
+        self.assertEqual(event.win_amount, 15.0)
+        self.assertEqual(settle_auto_cashouts([self.entry]), [])
+        self.assertEqual(self.balance(self.player), Decimal('115'))
+
+    def test_manual_cashout_refused_after_auto_cashout(self):
+        self.assertEqual(len(settle_auto_cashouts([self.entry])), 1)
+        event = self.manual_cashout()
+        with self.assertRaises(JournalRejected):
+            event.ack.result(timeout=0)
+        self.assertEqual(self.balance(self.player), Decimal('120'))
+
+    @skipUnless(connection.features.has_select_for_update, "needs row locks (e.g. PostgreSQL)")
+    def test_racing_cashouts_pay_once_without_deadlock(self):
+        barrier = threading.Barrier(2)
+        errors = []
+
+        def run(path):
+            try:
+                barrier.wait()
+                path()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [
+            threading.Thread(target=run, args=(self.manual_cashout,)),
+            threading.Thread(target=run, args=(lambda: settle_auto_cashouts([self.entry]),)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.bet.refresh_from_db()
+        self.assertTrue(self.bet.is_winner)
+        paid = {1.5: Decimal('115'), 2.0: Decimal('120')}[self.bet.cash_out_multiplier]
+        self.assertEqual(self.balance(self.player), paid)
+
+
+class JournalGroupIsolationTests(AviatorTestCase):
+    """One player's bad event must not take the other events of its group down with it"""
+
+    def setUp(self):
+        super().setUp()
+        self.players = [self.make_player(f'player{i}') for i in range(4)]
+
+    def assert_only_first_rejected(self, events):
+        with self.assertRaises(JournalRejected):
+            events[0].ack.result(timeout=5)
+        for event in events[1:]:
+            self.assertIsNotNone(event.ack.result(timeout=5).bet.id)
+        self.assertEqual(AviatorBet.objects.filter(round=self.round).count(), len(events) - 1)
+
+    def test_nan_stake_rejected_alone(self):
+        events = [PlaceBet(self.players[0], self.round, float('nan'))]
+        events += [PlaceBet(player, self.round, 10) for player in self.players[1:]]
+        commit_group(events)
+        self.assert_only_first_rejected(events)
+
+    def test_non_numeric_auto_cashout_rejected_alone(self):
+        events = [PlaceBet(self.players[0], self.round, 10, auto_cashout='soon')]
+        events += [PlaceBet(player, self.round, 10, auto_cashout=2) for player in self.players[1:]]
+        commit_group(events)
+        self.assert_only_first_rejected(events)
+
+    def test_failed_group_is_retried_event_by_event(self):
+        events = [PlaceBet(player, self.round, 10) for player in self.players]
+        poisoned = events[0]
+        real_commit_group = journal.commit_group
+
+        def commit_unless_poisoned(group):
+            if poisoned in group:
+                raise RuntimeError("database error")
+            real_commit_group(group)
+
+        group_journal = GameJournal(flush_interval=0.2, batch_size=len(events))
+        with mock.patch.object(journal, 'commit_group', side_effect=commit_unless_poisoned):
+            for event in events:
+                group_journal.submit(event)
+            with self.assertRaises(RuntimeError):
+                poisoned.ack.result(timeout=5)
+            for event in events[1:]:
+                self.assertEqual(event.ack.result(timeout=5).balance, Decimal('90'))
+
+
+class CleanBetTests(SimpleTestCase):
+    """Stakes and auto cashouts from sockets and the REST view, checked before they reach the actor"""
+
+    def test_rejects_bad_amounts(self):
+        for amount in (None, '', 'ten', 'nan', float('nan'), float('inf'), '-inf', 0, -5, '1e12'):
+            with self.subTest(amount=amount), self.assertRaises(JournalRejected):
+                clean_bet(amount)
+
+    def test_rejects_bad_auto_cashouts(self):
+        for auto_cashout in ('soon', [2], float('nan'), float('inf'), 1, 0.5, -2):
+            with self.subTest(auto_cashout=auto_cashout), self.assertRaises(JournalRejected):
+                clean_bet(10, auto_cashout)
+
+    def test_accepts_valid_bet(self):
+        self.assertEqual(clean_bet('10.129', '2.5'), (Decimal('10.12'), 2.5))
+        self.assertEqual(clean_bet(10, None), (Decimal('10.00'), None))
+
+
+class PendingBetTests(AviatorTestCase):
+    """A REST bet or cashout the actor has not answered in time is reported as pending, not failed"""
+
+    def setUp(self):
+        super().setUp()
+        self.player = self.make_player('pilot')
+        self.client = APIClient()
+        self.client.force_authenticate(self.player)
+
+    def test_unanswered_command_is_pending(self):
+        reply = async_to_sync(ask_round_actor)(InMemoryChannelLayer(), {'type': 'place_bet'}, timeout=0.05)
+        self.assertEqual(reply['status'], 'pending')
+        self.assertNotIn('error', reply)
+
+    def test_status_finds_bet_by_id_round_and_table(self):
+        bet = AviatorBet.objects.create(user=self.player, round=self.round, amount=10)
+        for query in ({'bet_id': bet.id}, {'round_id': self.round.id}, {}):
+            with self.subTest(query=query):
+                response = self.client.get('/api/games/aviator/bet/status/', query, secure=True)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['bet']['id'], bet.id)
+                self.assertEqual(response.data['status'], 'open')
+
+    def test_status_of_missing_bet(self):
+        other = AviatorBet.objects.create(user=self.make_player('other'), round=self.round, amount=10)
+        response = self.client.get('/api/games/aviator/bet/status/', {'bet_id': other.id}, secure=True)
+        self.assertEqual(response.status_code, 404)
+
+
+class VoidAbandonedRoundsTests(AviatorTestCase):
+    """A new loop owner refunds the open bets of rounds the previous owner left active"""
+
+    def setUp(self):
+        super().setUp()
+        self.player = self.make_player('pilot', balance=90)
+        self.winner = self.make_player('winner', balance=120)
+        self.open_bet = AviatorBet.objects.create(user=self.player, round=self.round, amount=10)
+        AviatorBet.objects.create(
+            user=self.winner, round=self.round, amount=10,
+            cash_out_multiplier=2.0, final_multiplier=2.0, is_winner=True
+        )
+        self.other_table = AviatorRound.objects.create(crash_multiplier=2.0, is_active=True, table='turbo')
+
+    def test_open_bets_refunded_and_round_closed(self):
+        self.assertEqual(void_abandoned_rounds('default'), (1, 1))
+
+        self.assertEqual(self.balance(self.player), Decimal('100'))
+        self.assertEqual(self.balance(self.winner), Decimal('120'))
+        self.assertTrue(Transaction.objects.filter(user=self.player, transaction_type='refund', amount=10).exists())
+        self.open_bet.refresh_from_db()
+        self.assertEqual((self.open_bet.cash_out_multiplier, self.open_bet.is_winner), (1.0, False))
+        self.round.refresh_from_db()
+        self.assertFalse(self.round.is_active)
+        self.assertIsNotNone(self.round.ended_at)
+        self.other_table.refresh_from_db()
+        self.assertTrue(self.other_table.is_active)
+
+        self.assertEqual(void_abandoned_rounds('default'), (0, 0))
+        self.assertEqual(self.balance(self.player), Decimal('100'))
+
+    def test_voided_bet_cannot_be_cashed_out(self):
+        void_abandoned_rounds('default')
+        event = CashOut(self.player, self.open_bet.id, 3.0, 'Cashout at 3x', round_id=self.round.id)
+        commit_group([event])
+        with self.assertRaises(JournalRejected):
+            event.ack.result(timeout=0)
+        self.assertEqual(self.balance(self.player), Decimal('100'))
+
+
+class SureOddSchedulingTests(AviatorTestCase):
+    """Sure odds are used up when their round starts, not when the schedule pre-draws a batch"""
+
+    def setUp(self):
+        super().setUp()
+        invalidate_sure_odds()
+        self.game = AviatorGame(InMemoryChannelLayer())
+        self.schedule = RoundSchedule(self.game.generate_crash_multiplier, batch_size=5, low_water=2)
+
+    def tearDown(self):
+        self.schedule.close()
+        invalidate_sure_odds()
+
+    def create_sure_odd(self):
+        odd = SureOdd.objects.create(user=self.make_player('buyer'), odd=Decimal('7.77'), verified_by_admin=True)
+        invalidate_sure_odds()
+        return odd
+
+    @async_to_sync
+    async def play_around_sure_odd(self):
+        """Start a round, let a sure odd be verified with a batch already drawn, then play two more"""
+        await self.schedule.start()
+        await self.game.next_round(self.schedule)
+        odd = await database_sync_to_async(self.create_sure_odd)()
+        return odd, [await self.game.next_round(self.schedule) for _ in range(2)]
+
+    def test_sure_odd_played_next_and_only_then_used(self):
+        odd, played = self.play_around_sure_odd()
+
+        self.assertEqual(played[0].crash_multiplier, 7.77)
+        self.assertTrue(played[0].is_active)
+        self.assertNotEqual(played[1].crash_multiplier, 7.77)
+        self.assertTrue(SureOdd.objects.get(id=odd.id).is_used)
+        self.assertEqual(AviatorRound.objects.filter(crash_multiplier=7.77).count(), 1)
+
+    def test_batch_does_not_use_sure_odd(self):
+        odd = self.create_sure_odd()
+
+        async def play_scheduled_round():
+            await self.schedule.start()
+            await self.schedule.next_round()
+
+        async_to_sync(play_scheduled_round)()
+        self.assertFalse(SureOdd.objects.get(id=odd.id).is_used)
+        self.assertFalse(AviatorRound.objects.filter(crash_multiplier=7.77).exists())
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class LoopLeaseTests(SimpleTestCase):
+    """One holder at a time, renewed by it alone, handed over once it expires"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.lease = LocalLoopLease(clock=self.clock)
+
+    def test_only_one_holder(self):
+        self.assertTrue(async_to_sync(self.lease.acquire)('a', 10))
+        self.assertFalse(async_to_sync(self.lease.acquire)('b', 10))
+        self.assertEqual(async_to_sync(self.lease.holder)(), 'a')
+
+    def test_renewal_extends_lease(self):
+        async_to_sync(self.lease.acquire)('a', 10)
+        self.clock.now = 8
+        self.assertTrue(async_to_sync(self.lease.renew)('a', 10))
+        self.assertFalse(async_to_sync(self.lease.renew)('b', 10))
+        self.clock.now = 15
+        self.assertFalse(async_to_sync(self.lease.acquire)('b', 10))
+
+    def test_expired_lease_handed_over(self):
+        async_to_sync(self.lease.acquire)('a', 10)
+        self.clock.now = 10
+        self.assertTrue(async_to_sync(self.lease.acquire)('b', 10))
+        self.assertFalse(async_to_sync(self.lease.renew)('a', 10))
+        async_to_sync(self.lease.release)('a')
+        self.assertEqual(async_to_sync(self.lease.holder)(), 'b')
+
+    def test_leader_stops_loop_when_lease_lost(self):
+        started, stopped = asyncio.Event(), asyncio.Event()
+
+        async def game_loop():
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                stopped.set()
+
+        async def lose_lease():
+            campaign = asyncio.create_task(run_as_leader(game_loop, lease=self.lease, owner='a', ttl=0.03))
+            try:
+                await asyncio.wait_for(started.wait(), 1)
+                # 'a' misses its renewal deadline and 'b' takes over
+                self.clock.now = 1
+                self.assertTrue(await self.lease.acquire('b', 10))
+                await asyncio.wait_for(stopped.wait(), 1)
+                return await self.lease.holder()
+            finally:
+                campaign.cancel()
+                await asyncio.gather(campaign, return_exceptions=True)
+
+        self.assertEqual(async_to_sync(lose_lease)(), 'b')
+
+
+class CrashDistributionChangeTests(AviatorTestCase):
+    """Queued rounds drawn before the crash ranges changed are dropped unplayed"""
+
+    def setUp(self):
+        super().setUp()
+        self.ranges = 'old'
+        self.multiplier = 2.0
+
+        async def draw():
+            return self.multiplier
+
+        async def distribution():
+            return self.ranges
+
+        self.schedule = RoundSchedule(draw, batch_size=5, low_water=2, distribution=distribution)
+
+    def tearDown(self):
+        self.schedule.close()
+
+    def test_stale_rounds_dropped_when_ranges_change(self):
+        async def play():
+            await self.schedule.start()
+            first = await self.schedule.next_round()
+            self.ranges, self.multiplier = 'new', 3.0
+            return first, await self.schedule.next_round()
+
+        first, second = async_to_sync(play)()
+        self.assertEqual(first.crash_multiplier, 2.0)
+        self.assertEqual(second.crash_multiplier, 3.0)
+        self.assertFalse(AviatorRound.objects.filter(crash_multiplier=2.0, scheduled=True).exists())
+
+    def test_unchanged_ranges_keep_queue(self):
+        async def play():
+            await self.schedule.start()
+            return [await self.schedule.next_round() for _ in range(2)]
+
+        played = async_to_sync(play)()
+        self.assertEqual(played[1].id, played[0].id + 1)
+
+
+class CrashPointSecrecyTests(AviatorTestCase):
+    """The crash multiplier chain_hash commits to is not sent before the crash"""
+
+    def state_frame(self, **state):
+        game = AviatorGame(InMemoryChannelLayer())
+
+        async def refresh():
+            await game.update_round_state(round_id=self.round.id, crash_multiplier=5.0, **state)
+            await game.refresh_state_frame()
+            return await game.store.aget_state_frame('json')
+
+        text_data, _ = async_to_sync(refresh)()
+        return JsonCodec().decode(text_data)
+
+    def test_state_frame_hides_crash_point_in_flight(self):
+        self.assertIsNone(self.state_frame(is_active=True)['crash_multiplier'])
+
+    def test_state_frame_reveals_crash_point_after_crash(self):
+        self.assertEqual(self.state_frame(crashed=True)['crash_multiplier'], 5.0)
+
+    def test_round_status_hides_active_round_crash_point(self):
+        client = APIClient()
+        client.force_authenticate(self.make_player('watcher'))
+        response = client.get(f'/api/games/aviator/round/{self.round.id}/status/', secure=True)
+        self.assertIsNone(response.json()['crash_multiplier'])
+
+
+@override_settings(AVIATOR_SETTLEMENT_BUDGET_MS=50)
+class SettlementBudgetTests(AviatorTestCase):
+    """The settlement budget scales per thousand bets, with one full budget as the floor"""
+
+    def setUp(self):
+        super().setUp()
+        AviatorBet.objects.create(user=self.make_player('pilot'), round=self.round, amount=10)
+
+    def settle_taking(self, elapsed_ms):
+        output = io.StringIO()
+        with mock.patch('games.settlement.time.perf_counter', side_effect=[0, elapsed_ms / 1000]), redirect_stdout(output):
+            lost, _ = settle_crashed_round(self.round.id, 5.0)
+        self.assertEqual(lost, 1)
+        return 'over budget' in output.getvalue()
+
+    def test_small_round_within_one_budget_not_reported(self):
+        self.assertFalse(self.settle_taking(10))
+
+    def test_small_round_over_one_budget_reported(self):
+        self.assertTrue(self.settle_taking(60))
+
+
+class RoundActorTests(AviatorTestCase):
+    """Cashouts sequenced and priced by a table's round actor"""
+
+    def setUp(self):
+        super().setUp()
+        self.layer = InMemoryChannelLayer()
+        self.players = [self.make_player(f'player{i}') for i in range(2)]
+        # The second bet auto-cashes out at 1.1x
+        self.bets = [
+            AviatorBet.objects.create(user=player, round=self.round, amount=10, auto_cashout=auto_cashout)
+            for player, auto_cashout in zip(self.players, (None, 1.1))
+        ]
+        self.book = RoundBetBook(self.round.id)
+        for bet, player in zip(self.bets, self.players):
+            self.book.add(BookEntry(bet.id, player.id, player.username, bet.amount, bet.auto_cashout))
+
+    def cashout(self, index, reply_to):
+        player = self.players[index]
+        return {
+            'type': 'cashout',
+            'user_id': player.id,
+            'username': player.username,
+            'bet_id': self.bets[index].id,
+            'description': 'Cashout at {multiplier}x',
+            'reply_to': reply_to,
+        }
+
+    @async_to_sync
+    async def fly(self, scenario, seconds_flown=2):
+        """Open the round, take off `seconds_flown` ago on the monotonic clock and run `scenario(actor, reply_to)`"""
+        async def publish(message):
+            pass
+
+        actor = RoundActor(self.layer, publish=publish, resume=lambda stream, sequence: {})
+        await actor.start()
+        try:
+            await actor.tell('betting', aviator_round=self.round, bet_book=self.book)
+            await actor.tell('take_off', started_at=time.monotonic() - seconds_flown)
+            reply_to = await self.layer.new_channel()
+            return await scenario(actor, reply_to)
+        finally:
+            actor.close()
+
+    def test_cashout_priced_from_take_off_on_monotonic_clock(self):
+        async def scenario(actor, reply_to):
+            actor.offer(self.cashout(0, reply_to))
+            return (await self.layer.receive(reply_to))['message']
+
+        # Wall-clock time frozen at the epoch: the price must come from the monotonic take-off alone
+        with mock.patch('time.time', return_value=0):
+            reply = self.fly(scenario)
+        self.assertAlmostEqual(reply['multiplier'], FlightCurve.default().multiplier_at(2), delta=0.02)
+
+    def test_cashout_queued_before_crash_wins_and_after_it_loses(self):
+        async def scenario(actor, reply_to):
+            actor.offer(self.cashout(0, reply_to))
+            settled = await actor.tell('crash')
+            actor.offer(self.cashout(1, reply_to))
+            replies = [(await self.layer.receive(reply_to))['message'] for _ in range(2)]
+            return await settled, replies
+
+        (lost, _), replies = self.fly(scenario)
+
+        self.assertEqual(lost, 1)
+        self.assertEqual(replies[0]['type'], 'cash_out_success')
+        self.assertEqual(replies[1]['error'], 'Too late, round crashed at 5.0x!')
+        first, second = (AviatorBet.objects.get(id=bet.id) for bet in self.bets)
+        self.assertTrue(first.is_winner)
+        self.assertFalse(second.is_winner)
+        self.assertEqual(second.final_multiplier, 5.0)
+        self.assertEqual(self.balance(self.players[0]), 100 + Decimal(str(replies[0]['win_amount'])))
+        self.assertEqual(self.balance(self.players[1]), Decimal('100'))
+
+    def test_auto_cashout_queued_before_crash_is_paid(self):
+        async def scenario(actor, reply_to):
+            due = await actor.tell('auto_cashout', multiplier=1.5)
+            settled = await actor.tell('crash')
+            return await due, await settled
+
+        due, (lost, _) = self.fly(scenario)
+
+        self.assertEqual([entry.bet_id for entry in due], [self.bets[1].id])
+        self.assertEqual(lost, 1)
+        auto = AviatorBet.objects.get(id=self.bets[1].id)
+        self.assertEqual((auto.is_winner, auto.cash_out_multiplier), (True, 1.1))
+        self.assertEqual(self.balance(self.players[1]), Decimal('111'))
+
+    def test_manual_cashout_after_auto_cashout_refused(self):
+        async def scenario(actor, reply_to):
+            await actor.tell('auto_cashout', multiplier=1.5)
+            actor.offer(self.cashout(1, reply_to))
+            reply = (await self.layer.receive(reply_to))['message']
+            await (await actor.tell('crash'))
+            return reply
+
+        self.assertEqual(self.fly(scenario)['error'], 'Already cashed out.')
+        self.assertEqual(self.balance(self.players[1]), Decimal('111'))
+
+    def test_accepted_bet_joins_book_for_auto_cashout(self):
+        latecomer = self.make_player('latecomer')
+        book = RoundBetBook(self.round.id)
+
+        async def scenario():
+            async def publish(message):
+                pass
+
+            actor = RoundActor(self.layer, publish=publish, resume=lambda stream, sequence: {})
+            await actor.start()
+            try:
+                await actor.tell('betting', aviator_round=self.round, bet_book=book)
+                reply_to = await self.layer.new_channel()
+                actor.offer({
+                    'type': 'place_bet', 'user_id': latecomer.id, 'username': latecomer.username,
+                    'amount': 10.0, 'auto_cashout': 1.5, 'reply_to': reply_to,
+                })
+                return (await self.layer.receive(reply_to))['message']
+            finally:
+                actor.close()
+
+        reply = async_to_sync(scenario)()
+        self.assertEqual(reply['type'], 'bet_placed')
+        self.assertEqual([entry.bet_id for entry in book.pop_crossed(1.5)], [reply['bet_id']])
+
+    def test_manual_cashout_before_auto_cashout_wins(self):
+        async def scenario(actor, reply_to):
+            actor.offer(self.cashout(1, reply_to))
+            due = await actor.tell('auto_cashout', multiplier=1.5)
+            reply = (await self.layer.receive(reply_to))['message']
+            await (await actor.tell('crash'))
+            return await due, reply
+
+        due, reply = self.fly(scenario)
+
+        self.assertEqual(due, [])
+        self.assertEqual(reply['type'], 'cash_out_success')
+        manual = AviatorBet.objects.get(id=self.bets[1].id)
+        self.assertEqual(manual.cash_out_multiplier, reply['multiplier'])
+        self.assertEqual(self.balance(self.players[1]), 100 + Decimal(str(reply['win_amount'])))
+
+
+@override_settings(AVIATOR_EVENT_FRAMES=True, AVIATOR_FRAME_INTERVAL=0.01)
+class FrameFlusherTests(SimpleTestCase):
+    """Only one flusher drains a process's event buffer at a time"""
+
+    def flush_for(self, seconds, loop_running):
+        async def run():
+            await publish_event(InMemoryChannelLayer(), 'aviator_room', {'type': 'send_to_group', 'type_override': 'bet_placed'})
+            flusher = asyncio.create_task(run_frame_flusher(InMemoryChannelLayer()))
+            if loop_running:
+                with loop_flushes_frames():
+                    await asyncio.sleep(seconds)
+            else:
+                await asyncio.sleep(seconds)
+            flusher.cancel()
+
+        async_to_sync(run)()
+        return event_frames._buffer.drain()
+
+    def test_flusher_stands_aside_while_loop_runs(self):
+        self.assertTrue(self.flush_for(0.05, loop_running=True))
+
+    def test_flusher_drains_without_loop(self):
+        self.assertFalse(self.flush_for(0.05, loop_running=False))
+
+
+class ResumeHeldFrameTests(SimpleTestCase):
+    """Events held while resuming are not sent again when the replay already covered them"""
+
+    def resume(self, held, replayed_up_to):
+        consumer = AviatorConsumer()
+        consumer.codec = JsonCodec()
+        consumer.subscriptions = set()
+        consumer.outbox = mock.Mock()
+        consumer.resume_timeout = mock.Mock()
+        consumer.held = held
+        async_to_sync(consumer.finish_resume)({"type": "resumed", "sequence": replayed_up_to, "events": []})
+        return [json.loads(call.args[0]) for call in consumer.outbox.put.call_args_list][1:]
+
+    def test_held_frame_drops_replayed_events(self):
+        frame = encoded_message({'type': 'frame', 'events': [
+            {'type': 'bet_placed', 'sequence': 4},
+            {'type': 'cashout', 'sequence': 5},
+            {'type': 'player_joined'},
+        ]})
+
+        sent = self.resume([frame], replayed_up_to=4)
+        self.assertEqual(sent[0]['events'], [{'type': 'cashout', 'sequence': 5}, {'type': 'player_joined'}])
+
+    def test_fully_replayed_frame_skipped(self):
+        frame = encoded_message({'type': 'frame', 'events': [{'type': 'bet_placed', 'sequence': 4}]})
+        self.assertEqual(self.resume([frame], replayed_up_to=4), [])
+
+
+class OutboxBackpressureTests(SimpleTestCase):
+    """The outbox only sees a slow client through a send that waits for the socket to drain"""
+
+    @async_to_sync
+    async def push(self, send, frames, backpressure=True, release=None):
+        """Put `frames` (text, conflatable) pairs; returns whether the client was disconnected"""
+        laggard = asyncio.Event()
+
+        async def on_laggard():
+            laggard.set()
+
+        outbox = ConnectionOutbox(send, on_laggard, limit=3, max_lag=0.2, backpressure=backpressure)
+        outbox.start()
+        try:
+            for text_data, conflatable in frames:
+                outbox.put(text_data, conflatable=conflatable)
+                await asyncio.sleep(0)
+            if release:
+                release.set()
+            # A laggard's queued frames get up to max_lag to go out before it is disconnected
+            await asyncio.sleep(0.3)
+            return laggard.is_set()
+        finally:
+            outbox.close()
+
+    def test_blocking_send_disconnects_laggard(self):
+        async def stalled_send(text_data=None, bytes_data=None):
+            await asyncio.Event().wait()
+
+        self.assertTrue(self.push(stalled_send, [('crash', False)] * 10))
+
+    def test_laggard_still_gets_frames_that_are_not_ticks(self):
+        sent = []
+        release = asyncio.Event()
+
+        async def slow_send(text_data=None, bytes_data=None):
+            await release.wait()
+            sent.append(text_data)
+
+        frames = [('round_started', False), ('tick1', True), ('bet', False), ('tick2', True), ('crash', False), ('result', False)]
+        self.assertTrue(self.push(slow_send, frames, release=release))
+        self.assertEqual(sent, ['round_started', 'bet', 'crash', 'result'])
+
+    def test_buffering_send_is_never_behind(self):
+        # What daphne does: the frame is buffered by the server and send returns at once
+        sent = []
+
+        async def buffered_send(text_data=None, bytes_data=None):
+            sent.append(text_data)
+
+        self.assertFalse(self.push(buffered_send, [('crash', False)] * 10))
+        self.assertEqual(len(sent), 10)
+
+    def test_without_backpressure_nothing_is_conflated_or_dropped(self):
+        sent = []
+        release = asyncio.Event()
+
+        async def slow_send(text_data=None, bytes_data=None):
+            await release.wait()
+            sent.append(text_data)
+
+        frames = [(f'tick{i}', True) for i in range(10)]
+        self.assertFalse(self.push(slow_send, frames, backpressure=False, release=release))
+        self.assertEqual(sent, [text_data for text_data, _ in frames])
+
+
+class WireFormatTests(SimpleTestCase):
+    """Compact ticks pack into fixed binary frames; msgpack falls back to JSON where it is missing"""
+
+    tick = {'type': 'multiplier', 'round_id': 7, 'sequence': 42, 'multiplier': 1.37, 'server_time': 1700000000123}
+
+    def test_compact_tick_round_trip(self):
+        text_data, bytes_data = CompactCodec().encode(self.tick)
+        self.assertIsNone(text_data)
+        self.assertEqual(TICK.unpack(bytes_data), (TICK_KINDS['multiplier'], 7, 42, 137, 1700000000123))
+
+    def test_compact_sync_carries_elapsed(self):
+        sync = dict(self.tick, type='sync', elapsed_ms=2500)
+        _, bytes_data = CompactCodec().encode(sync)
+        self.assertEqual(SYNC.unpack(bytes_data)[-1], 2500)
+
+    def test_compact_keeps_other_messages_json(self):
+        message = {'type': 'crash', 'round_id': 7, 'multiplier': 2.0}
+        text_data, bytes_data = CompactCodec().encode(message)
+        self.assertIsNone(bytes_data)
+        self.assertEqual(CompactCodec().decode(text_data), message)
+
+    def test_encode_once_has_a_frame_per_codec(self):
+        frames = encode_once(self.tick)
+        self.assertEqual(json.loads(frames['json'][0]), self.tick)
+        self.assertEqual(frames['compact'][1], CompactCodec().encode(self.tick)[1])
+
+    @skipUnless(importlib.util.find_spec('msgpack') is None, "msgpack installed")
+    def test_msgpack_falls_back_to_json_when_missing(self):
+        self.assertNotIn('msgpack', encode_once(self.tick))
+        codec, subprotocol = negotiate({'subprotocols': ['aviator.msgpack'], 'query_string': b'encoding=msgpack'})
+        self.assertIsInstance(codec, JsonCodec)
+        self.assertIsNone(subprotocol)
+
+    @skipUnless(importlib.util.find_spec('msgpack'), "msgpack not installed")
+    def test_msgpack_round_trip(self):
+        codec, subprotocol = negotiate({'subprotocols': ['aviator.msgpack']})
+        self.assertEqual(subprotocol, 'aviator.msgpack')
+        self.assertEqual(codec.decode(bytes_data=codec.encode(self.tick)[1]), self.tick)
+
+
+class CrashSamplerTests(SimpleTestCase):
+    """The alias table picks ranges in proportion to their weights"""
+
+    def test_ranges_drawn_by_weight(self):
+        sampler = CrashSampler([(1, 2, 1), (2, 5, 3), (5, 10, 6)])
+        rng = random.Random(0)
+        draws = [sampler.draw_range(rng) for _ in range(20000)]
+        for low_high, share in zip(sampler.ranges, (0.1, 0.3, 0.6)):
+            self.assertAlmostEqual(draws.count(low_high) / len(draws), share, delta=0.02)
+
+    def test_draw_stays_in_range(self):
+        sampler = CrashSampler([(1.5, 3, 1), (7, 8, 0)])
+        rng = random.Random(0)
+        self.assertTrue(all(1.5 <= sampler.draw(rng) <= 3 for _ in range(1000)))
+
+    def test_needs_a_positive_weight(self):
+        with self.assertRaises(ValueError):
+            CrashSampler([(1, 2, 0)])
+
+
+@override_settings(AVIATOR_CRASH_SAMPLER_TTL=3600)
+class CrashSamplerCacheTests(AviatorTestCase):
+    """The cached sampler is rebuilt when a setting is saved, not on every draw"""
+
+    def setUp(self):
+        super().setUp()
+        invalidate_crash_sampler()
+
+    def tearDown(self):
+        invalidate_crash_sampler()
+
+    def test_default_until_a_range_is_configured(self):
+        self.assertIs(get_crash_sampler(default=FALLBACK_CRASH_SAMPLER), FALLBACK_CRASH_SAMPLER)
+        CrashMultiplierSetting.objects.create(min_value=1, max_value=3, weight=1)
+        self.assertEqual(get_crash_sampler().ranges, [(1.0, 3.0)])
+
+    def test_cached_until_invalidated(self):
+        setting = CrashMultiplierSetting.objects.create(min_value=1, max_value=3, weight=1)
+        sampler = get_crash_sampler()
+        # A queryset update sends no signal, so only the TTL or an invalidation picks it up
+        CrashMultiplierSetting.objects.filter(id=setting.id).update(max_value=4)
+        self.assertIs(get_crash_sampler(), sampler)
+        invalidate_crash_sampler()
+        self.assertEqual(get_crash_sampler().ranges, [(1.0, 4.0)])
+
+
+class TickSchedulerTests(SimpleTestCase):
+    """Ticks land on absolute deadlines; a loop that falls behind merges the missed ticks"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.slept = []
+
+        async def sleep(seconds):
+            self.slept.append(seconds)
+            self.clock.now += seconds
+
+        self.scheduler = TickScheduler(clock=self.clock, sleep=sleep)
+
+    def test_work_between_ticks_does_not_drift(self):
+        async def run():
+            for _ in range(10):
+                self.clock.now += 0.03  # DB work and broadcasts
+                self.assertEqual(await self.scheduler.wait(0.1), 1)
+
+        async_to_sync(run)()
+        self.assertAlmostEqual(self.clock.now, 1.0)
+        self.assertTrue(all(abs(seconds - 0.07) < 1e-9 for seconds in self.slept))
+        self.assertEqual(self.scheduler.report()['late_ticks'], 0)
+
+    def test_missed_ticks_merged(self):
+        async def run():
+            self.clock.now += 0.35
+            return await self.scheduler.wait(0.1), await self.scheduler.wait(0.1)
+
+        # The first tick covers three intervals, the next is back on the 0.1s grid
+        self.assertEqual(async_to_sync(run)(), (3, 1))
+        self.assertAlmostEqual(self.clock.now, 0.4)
+        report = self.scheduler.report()
+        self.assertEqual((report['ticks'], report['late_ticks'], report['skipped_ticks']), (2, 1, 2))
+
+
+class FlightCurveTests(SimpleTestCase):
+    """The default curve matches the stream mode tick table"""
+
+    curve = FlightCurve.default()
+
+    def test_segments_follow_tick_table(self):
+        # 0.01x every 0.1s up to 2x, then 0.02x every 0.08s
+        self.assertAlmostEqual(self.curve.multiplier_at(10), 2.0)
+        self.assertAlmostEqual(self.curve.multiplier_at(10.8), 2.2)
+        self.assertEqual(self.curve.multiplier_at(-1), 1.0)
+
+    def test_elapsed_for_inverts_multiplier_at(self):
+        for target in (1.0, 1.5, 2.0, 3.7, 12.0, 150.0):
+            self.assertAlmostEqual(self.curve.multiplier_at(self.curve.elapsed_for(target)), target)
+
+    def test_tick_interval_per_segment(self):
+        self.assertEqual([self.curve.tick_interval(m) for m in (1.0, 2.0, 19.99, 500)], [0.1, 0.08, 0.06, 0.04])
+
+
+class RoomShardTests(SimpleTestCase):
+    """Sockets spread over stable shard groups and a room send reaches every shard"""
+
+    def test_unsharded_room_is_its_own_group(self):
+        with override_settings(AVIATOR_ROOM_SHARDS=1):
+            self.assertEqual(shard_groups('aviator_room'), ['aviator_room'])
+            self.assertEqual(shard_for('aviator_room', 'specific.abc'), 'aviator_room')
+
+    @override_settings(AVIATOR_ROOM_SHARDS=4)
+    def test_shard_names_and_stable_assignment(self):
+        self.assertEqual(shard_groups('aviator_room'), [f'aviator_room.{i}' for i in range(4)])
+        channels = [f'specific.{i}' for i in range(100)]
+        assigned = [shard_for('aviator_room', channel) for channel in channels]
+        self.assertEqual(assigned, [shard_for('aviator_room', channel) for channel in channels])
+        self.assertEqual(set(assigned), set(shard_groups('aviator_room')))
+
+    @override_settings(AVIATOR_ROOM_SHARDS=3)
+    def test_send_to_room_reaches_every_shard(self):
+        layer = InMemoryChannelLayer()
+
+        async def fan_out():
+            channels = [await layer.new_channel() for _ in range(3)]
+            for index, channel in enumerate(channels):
+                await layer.group_add(f'aviator_room.{index}', channel)
+            await send_to_room(layer, 'aviator_room', {'type': 'send_encoded'})
+            return [await layer.receive(channel) for channel in channels]
+
+        self.assertEqual(async_to_sync(fan_out)(), [{'type': 'send_encoded'}] * 3)
+
+
+class SubscriptionTests(SimpleTestCase):
+    """Optional event classes go to their own sub-group; everything else to the room"""
+
+    def test_events_routed_by_class(self):
+        self.assertEqual(event_group('aviator_room', {'type': 'bot_bet'}), 'aviator_room.bets')
+        self.assertEqual(event_group('aviator_room', {'type': 'cash_out'}), 'aviator_room.cashouts')
+        self.assertEqual(event_group('aviator_room', {'type': 'top_winners_updated'}), 'aviator_room.winners')
+        self.assertEqual(event_group('aviator_room', {'type': 'crash'}), 'aviator_room')
+
+    def test_parse_subscriptions(self):
+        self.assertEqual(parse_subscriptions('bets, cashouts,'), {'bets', 'cashouts'})
+        self.assertEqual(parse_subscriptions(''), set())
+        with self.assertRaises(ValueError):
+            parse_subscriptions('bets,ticks')
+
+    def test_room_events_reach_everyone(self):
+        self.assertTrue(is_subscribed({'type': 'multiplier'}, set()))
+        self.assertFalse(is_subscribed({'type': 'bet_placed'}, {'cashouts'}))
+        self.assertTrue(is_subscribed({'type': 'bet_placed'}, {'bets'}))
+
+
+class RoundSnapshotTests(SimpleTestCase):
+    """Snapshots are never changed in place; the store swaps in new ones"""
+
+    def test_defaults_and_dict_access(self):
+        state = RoundSnapshot(round_id=3)
+        self.assertEqual(state.as_dict(), dict(DEFAULT_ROUND_STATE, round_id=3))
+        self.assertEqual(state['round_id'], 3)
+        self.assertIsNone(state.get('missing'))
+        with self.assertRaises(KeyError):
+            state['missing']
+
+    def test_immutable(self):
+        state = RoundSnapshot()
+        with self.assertRaises(AttributeError):
+            state.crashed = True
+        with self.assertRaises(TypeError):
+            RoundSnapshot(altitude=1)
+
+    def test_replace_leaves_original(self):
+        state = RoundSnapshot(round_id=3, is_active=True)
+        crashed = state.replace(crashed=True)
+        self.assertFalse(state.crashed)
+        self.assertEqual((crashed.round_id, crashed.is_active, crashed.crashed), (3, True, True))
+        with self.assertRaises(TypeError):
+            state.replace(altitude=1)
+
+    def test_store_update_swaps_snapshot(self):
+        store = LocalRoundStateStore()
+        before = store.get()
+        store.update(current_multiplier=1.5)
+        self.assertEqual(before.current_multiplier, 1.0)
+        self.assertEqual(store.get().current_multiplier, 1.5)
+
+
+class TablesTests(SimpleTestCase):
+    """AVIATOR_TABLES is parsed once into tables with their own rooms and limits"""
+
+    def parse(self, config):
+        with override_settings(AVIATOR_TABLES=config), mock.patch.object(tables, '_tables', None):
+            return tables.get_tables()
+
+    def test_turbo_table(self):
+        parsed = self.parse({'turbo': {'betting_seconds': 3, 'max_bet': 500, 'crash_ranges': [[1, 2, 90], [2, 10, 10]]}})
+        turbo = parsed['turbo']
+        self.assertEqual(turbo.betting_seconds, 3)
+        self.assertEqual(turbo.room_group_name, 'aviator_room-turbo')
+        self.assertEqual(turbo.sampler.ranges, [(1.0, 2.0), (2.0, 10.0)])
+        self.assertEqual(turbo.bet_error(501), "Maximum bet on this table is 500.")
+        self.assertIsNone(turbo.bet_error(500))
+
+    def test_default_table_always_present(self):
+        default = self.parse({'turbo': {}})[DEFAULT_TABLE]
+        self.assertEqual(default.room_group_name, 'aviator_room')
+        self.assertIsNone(default.sampler)
+
+    def test_bad_config_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.parse({'Turbo Table': {}})
+        with self.assertRaises(ImproperlyConfigured):
+            self.parse({'turbo': {'speed': 2}})
+
+    def test_table_scoped_keys(self):
+        self.assertEqual(table_key('aviator:round_state', DEFAULT_TABLE), 'aviator:round_state')
+        self.assertEqual(table_key('aviator:round_state', 'turbo'), 'aviator:round_state:turbo')
@@ -0,0 +1,59 @@
+import asyncio
+
+
+class TickScheduler:
+    """
+    Paces the game loop on absolute deadlines instead of relative sleeps.
+
+    Each tick's deadline is the previous deadline plus the interval, measured on
+    the event loop clock, so time spent on DB work and broadcasts between ticks
+    does not push the rest of the round back. When the loop falls more than a
+    whole interval behind, the missed ticks are merged into the next one and
+    `wait()` reports how many intervals it covers, so callers can advance by that
+    many steps and keep round duration independent of load.
+
+    Ticks more than `late_after` seconds past their deadline count as late.
+    Pass a fake `clock` and `sleep` to step through scheduling without waiting.
+    """
+
+    def __init__(self, late_after=0.01, clock=None, sleep=asyncio.sleep):
+        self.late_after = late_after
+        self.clock = clock or asyncio.get_running_loop().time
+        self.sleep = sleep
+        self._deadline = self.clock()
+        self.ticks = 0
+        self.late_ticks = 0
+        self.skipped_ticks = 0
+        self.max_lateness = 0.0
+
+    async def wait(self, interval):
+        """Sleep until the next deadline; returns the number of intervals elapsed (>= 1)"""
+        self._deadline += interval
+        now = self.clock()
+        if now < self._deadline:
+            await self.sleep(self._deadline - now)
+            now = self.clock()
+
+        lateness = max(0.0, now - self._deadline)
+        self.ticks += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+        if lateness > self.late_after:
+            self.late_ticks += 1
+
+        elapsed = 1
+        if lateness >= interval:
+            # Too far behind to catch up tick by tick: merge the missed ticks into this one
+            missed = int(lateness // interval)
+            self._deadline += missed * interval
+            self.skipped_ticks += missed
+            elapsed += missed
+        return elapsed
+
+    def report(self):
+        """Lateness summary since the scheduler started"""
+        return {
+            'ticks': self.ticks,
+            'late_ticks': self.late_ticks,
+            'skipped_ticks': self.skipped_ticks,
+            'max_lateness_ms': round(self.max_lateness * 1000, 1),
+        }
@@ -6,7 +6,9 @@ urlpatterns = [
     path('aviator/start/', views.start_aviator_round, name='start_aviator_round'),
     path('aviator/bet/', views.place_aviator_bet, name='place_aviator_bet'),
     path('aviator/cashout/', views.cashout_aviator_bet, name='cashout_aviator_bet'),
+    path('aviator/bet/status/', views.aviator_bet_status, name='aviator_bet_status'),
     path('aviator/round/<int:round_id>/status/', views.get_round_status, name='get_round_status'),
+    path('aviator/socket-stats/', views.socket_stats, name='socket_stats'),
     path('aviator/past-crashes/', views.past_crashes, name='past_crashes'),
     path('aviator/sure-odds/', views.user_sure_odds, name='user_sure_odds'),
     path('aviator/top-winners/', top_winners_today, name='top_winners_today'),
@@ -1,14 +1,15 @@
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from decimal import Decimal, InvalidOperation
 import random
-import asyncio
 import time
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import F, Q
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 import logging
 
 from .models import AviatorRound, AviatorBet, SureOdd, SureOddPurchase
@@ -19,7 +20,12 @@ from .serializers import (
     TopWinnerSerializer,
 )
 from wallet.models import Wallet, Transaction
-from .consumers import AviatorConsumer
+from .journal import JournalRejected, clean_bet
+from .event_frames import publish_event_sync
+from .outbox import outbox_stats
+from .idle_reaper import idle_reaper
+from .round_actor import ask_round_actor
+from .tables import DEFAULT_TABLE, get_table, get_tables
 
 logger = logging.getLogger(__name__)
 
@@ -59,97 +65,86 @@ def place_aviator_bet(request):
 
         print(f"[API BET] User: {user.username}, Round: {round_id}, Amount: {amount}")
 
-        if not round_id or not amount:
-            return Response({'error': 'Round ID and amount are required.'}, status=400)
-
-        aviator_round = None
-        
-        try:
-            aviator_round = AviatorRound.objects.get(id=round_id, is_active=True)
-            print(f"[API BET] Found requested round {aviator_round.id}")
-        except AviatorRound.DoesNotExist:
-            print(f"[API BET] Requested round {round_id} not found or inactive")
-            
-            current_state = get_current_round_state_sync()
-            if current_state and current_state.get('round_id'):
-                try:
-                    aviator_round = AviatorRound.objects.get(id=current_state['round_id'], is_active=True)
-                    print(f"[API BET] Using current active round {aviator_round.id} from global state")
-                except AviatorRound.DoesNotExist:
-                    print(f"[API BET] Current round {current_state['round_id']} also not found")
-            
-            if not aviator_round:
-                aviator_round = AviatorRound.objects.filter(is_active=True).order_by('-start_time').first()
-                if aviator_round:
-                    print(f"[API BET] Using latest active round {aviator_round.id}")
-                else:
-                    print(f"[API BET] No active rounds found, creating new one")
-                    crash = round(random.uniform(1.5, 3.0), 2)
-                    aviator_round = AviatorRound.objects.create(
-                        crash_multiplier=crash,
-                        is_active=True
-                    )
-                    print(f"[API BET] Created new round {aviator_round.id}")
-
-        if not aviator_round:
-            return Response({'error': 'No active round available.'}, status=400)
-
-        existing_bet = AviatorBet.objects.filter(user=user, round=aviator_round).first()
-        if existing_bet:
-            return Response({'error': 'You already have a bet in this round.'}, status=400)
+        if not amount:
+            return Response({'error': 'Amount is required.'}, status=400)
 
+        # Same checks as the socket: no NaN, infinite or non-numeric stakes or auto cashouts
         try:
-            amount_decimal = Decimal(str(amount))
-            if amount_decimal <= 0:
-                raise ValueError
-        except (InvalidOperation, ValueError):
-            return Response({'error': 'Invalid amount format.'}, status=400)
-
-        with transaction.atomic():
-            try:
-                wallet = Wallet.objects.select_for_update().get(user=user)
-            except Wallet.DoesNotExist:
-                return Response({'error': 'Wallet not found.'}, status=400)
-
-            if wallet.balance < amount_decimal:
-                return Response({'error': 'Insufficient wallet balance.'}, status=400)
-
-            wallet.balance -= amount_decimal
-            wallet.save()
-
-            try:
-                Transaction.objects.create(
-                    user=user,
-                    amount=-amount_decimal,
-                    transaction_type='withdraw',
-                    description='Aviator bet placed'
-                )
-            except Exception as e:
-                logger.exception("Error creating transaction")
-                return Response({'error': f'Failed to create transaction: {str(e)}'}, status=500)
+            amount_decimal, auto_cashout = clean_bet(amount, data.get('auto_cashout'))
+        except JournalRejected as e:
+            return Response({'error': str(e)}, status=400)
+
+        # round_id only picks the table; like a socket bet, it goes into the round open for betting
+        table = data.get('table') or DEFAULT_TABLE
+        if round_id:
+            table = AviatorRound.objects.filter(id=round_id).values_list('table', flat=True).first() or table
+        if get_table(table) is None:
+            return Response({'error': f'Unknown table: {table}'}, status=400)
+
+        # 🔧 The table's round actor checks the phase and limits and orders the bet against take-off
+        reply = async_to_sync(ask_round_actor)(get_channel_layer(), {
+            'type': 'place_bet',
+            'user_id': user.id,
+            'username': user.username,
+            'amount': float(amount_decimal),
+            'auto_cashout': auto_cashout,
+        }, table=table)
+        if reply.get('status') == 'pending':
+            return Response({**reply, 'table': table}, status=202)
+        if 'error' in reply:
+            print(f"[API BET] Rejected for {user.username}: {reply['error']}")
+            return Response({'error': reply['error']}, status=400)
+
+        bet = AviatorBet.objects.get(id=reply['bet_id'])
+        serializer = AviatorBetSerializer(bet)
+
+        print(f"[API BET] SUCCESS: Created bet {bet.id} for user {user.username} in round {bet.round_id}")
 
-            bet = AviatorBet.objects.create(
-                user=user,
-                round=aviator_round,
-                amount=amount_decimal,
-                auto_cashout=data.get('auto_cashout')
-            )
-
-            serializer = AviatorBetSerializer(bet)
-            
-            print(f"[API BET] SUCCESS: Created bet {bet.id} for user {user.username} in round {aviator_round.id}")
-            
-            return Response({
-                'bet': serializer.data,
-                'new_balance': float(wallet.balance),
-                'round_id': aviator_round.id
-            }, status=201)
+        return Response({
+            'bet': serializer.data,
+            'new_balance': reply['new_balance'],
+            'round_id': bet.round_id
+        }, status=201)
 
     except Exception as e:
         logger.exception("Error placing Aviator bet")
         print(f"[API BET] ERROR: {str(e)}")
         return Response({'error': str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def aviator_bet_status(request):
+    """
+    Where a bet or cashout answered "pending" ended up: the player's bet by bet_id,
+    or their bet in round_id, or else their latest bet on the table
+    """
+    bets = AviatorBet.objects.filter(user=request.user).select_related('round')
+    bet_id = request.query_params.get('bet_id')
+    round_id = request.query_params.get('round_id')
+    try:
+        if bet_id:
+            bets = bets.filter(id=int(bet_id))
+        elif round_id:
+            bets = bets.filter(round_id=int(round_id))
+        else:
+            bets = bets.filter(round__table=request.query_params.get('table', DEFAULT_TABLE))
+    except ValueError:
+        return Response({'error': 'bet_id and round_id must be numbers.'}, status=400)
+
+    bet = bets.order_by('-id').first()
+    if bet is None:
+        return Response({'status': 'not_found'}, status=404)
+    if bet.cash_out_multiplier is None:
+        bet_status = 'open' if bet.round.is_active else 'settled'
+    else:
+        # Bets of a voided round are closed at 1.0x without winning
+        bet_status = 'cashed_out' if bet.is_winner else 'refunded'
+    return Response({
+        'status': bet_status,
+        'bet': AviatorBetSerializer(bet).data,
+        'round_id': bet.round_id,
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_wallet_balance(request):
@@ -206,19 +201,21 @@ def update_wallet_balance(request):
                         if win_amount >= 500:  # Lower threshold for more frequent updates
                             print(f"🏆 Significant win detected: {win_amount}, refreshing global top winners")
                             from channels.layers import get_channel_layer
-                            from asgiref.sync import async_to_sync
                             
                             channel_layer = get_channel_layer()
                             if channel_layer:
-                                async_to_sync(channel_layer.group_send)(
-                                    'aviator_room',
-                                    {
-                                        'type': 'send_to_group',
-                                        'type_override': 'top_winners_updated',
-                                        'message': 'Global top winners updated',
-                                        'trigger_refresh': True
-                                    }
-                                )
+                                # The top winners list is global, so every table refreshes it
+                                for table in get_tables().values():
+                                    publish_event_sync(
+                                        channel_layer,
+                                        table.room_group_name,
+                                        {
+                                            'type': 'send_to_group',
+                                            'type_override': 'top_winners_updated',
+                                            'message': 'Global top winners updated',
+                                            'trigger_refresh': True
+                                        }
+                                    )
                         
                 except AviatorBet.DoesNotExist:
                     print(f"Bet {bet_id} not found for user {user.id}")
@@ -235,43 +232,16 @@ def update_wallet_balance(request):
         logger.exception("Error updating wallet balance")
         return Response({'error': str(e)}, status=500)
 
-def get_current_round_state_sync():
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        current_state = loop.run_until_complete(AviatorConsumer.get_current_round_state())
-        loop.close()
-        return current_state
-    except Exception as e:
-        print(f"[REST API] Error getting current state: {e}")
-        try:
-            current_round = AviatorRound.objects.filter(is_active=True).order_by('-start_time').first()
-            if current_round:
-                return {
-                    'round_id': current_round.id,
-                    'crash_multiplier': float(current_round.crash_multiplier),
-                    'is_active': current_round.is_active,
-                    'crashed': False,
-                    'current_multiplier': 1.0,
-                    'is_betting': False
-                }
-        except Exception as fallback_error:
-            print(f"[REST API] Fallback error: {fallback_error}")
-        
-        return None
-
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def cashout_aviator_bet(request):
+    # Priced by the round actor when the request reaches the game loop; a posted multiplier is ignored
     print(f"[REST API Cashout] cashout_aviator_bet request.data: {request.data}")
 
     bet_id = request.data.get('bet_id')
-    multiplier = request.data.get('multiplier')
 
-    if not bet_id or not multiplier:
-        return Response({
-            'error': f'Bet ID and multiplier are required. Received: bet_id={bet_id}, multiplier={multiplier}'
-        }, status=400)
+    if not bet_id:
+        return Response({'error': 'Bet ID is required.'}, status=400)
 
     try:
         bet_id = int(bet_id)
@@ -279,116 +249,56 @@ def cashout_aviator_bet(request):
         return Response({'error': f'Invalid bet_id format: {bet_id}'}, status=400)
 
     try:
-        multiplier = float(multiplier)
-        if multiplier <= 0:
-            raise ValueError
-    except (ValueError, TypeError):
-        return Response({'error': f'Invalid multiplier format: {multiplier}'}, status=400)
-
-    try:
-        bet = AviatorBet.objects.get(id=bet_id, user=request.user)
+        bet = AviatorBet.objects.select_related('round').get(id=bet_id, user=request.user)
     except AviatorBet.DoesNotExist:
         return Response({'error': 'Bet not found.'}, status=404)
 
     if bet.cash_out_multiplier is not None:
         return Response({'error': 'Bet already cashed out.'}, status=400)
 
-    current_state = get_current_round_state_sync()
-    
-    if not current_state:
-        print(f"[REST API Cashout] Unable to get current game state")
-        return Response({'error': 'Unable to validate current game state'}, status=500)
-
-    print(f"[REST API Cashout] Current state: {current_state}")
-    print(f"[REST API Cashout] Bet round: {bet.round.id}, Current round: {current_state['round_id']}")
-
-    current_round_id = current_state.get('round_id')
-    bet_round_id = bet.round.id
-    
-    if current_state.get('crashed', False):
-        print(f"[REST API Cashout] Round already crashed at {current_state['crash_multiplier']}x")
-        return Response({
-            'error': f"Too late, round crashed at {current_state['crash_multiplier']}x!"
-        }, status=400)
-
-    if bet_round_id != current_round_id:
-        try:
-            bet_round = AviatorRound.objects.get(id=bet_round_id)
-            if bet_round.is_active:
-                print(f"[REST API Cashout] Bet round {bet_round_id} is still active, allowing cashout")
-            else:
-                if multiplier >= bet_round.crash_multiplier:
-                    print(f"[REST API Cashout] Bet round {bet_round_id} crashed at {bet_round.crash_multiplier}x, multiplier {multiplier}x too high")
-                    return Response({
-                        'error': f"Too late, round {bet_round_id} crashed at {bet_round.crash_multiplier}x!"
-                    }, status=400)
-                else:
-                    print(f"[REST API Cashout] Allowing late cashout for round {bet_round_id} at {multiplier}x (crashed at {bet_round.crash_multiplier}x)")
-        except AviatorRound.DoesNotExist:
-            return Response({'error': 'Bet round not found'}, status=400)
-    else:
-        if not current_state.get('is_active', False):
-            print(f"[REST API Cashout] Current round not active")
-            return Response({'error': 'Round is not active'}, status=400)
-
-        current_crash_multiplier = current_state.get('crash_multiplier')
-        if current_crash_multiplier and multiplier >= (current_crash_multiplier - 0.01):
-            print(f"[REST API Cashout] Multiplier too high: {multiplier} >= {current_crash_multiplier} for current round {current_round_id}")
-            return Response({
-                'error': f"Too late, will crash at {current_crash_multiplier}x!"
-            }, status=400)
-
-    with transaction.atomic():
-        win_amount = round(float(bet.amount) * multiplier, 2)
-        bet.cash_out_multiplier = multiplier
-        bet.final_multiplier = multiplier
-        bet.is_winner = True
-        bet.save()
-
-        try:
-            wallet = Wallet.objects.select_for_update().get(user=request.user)
-        except Wallet.DoesNotExist:
-            return Response({'error': 'Wallet not found.'}, status=400)
-
-        wallet.balance += Decimal(str(win_amount))
-        wallet.save()
-
-        try:
-            Transaction.objects.create(
-                user=request.user,
-                amount=Decimal(str(win_amount)),
-                transaction_type='winning',
-                description=f'Aviator Bet Cashout at {multiplier}x'
-            )
-        except Exception as e:
-            logger.exception("Error creating transaction")
-            print(f"[REST API Cashout] Transaction record failed but cashout succeeded: {e}")
+    # The actor of the bet's table prices it and orders it against the crash, like a socket cashout
+    channel_layer = get_channel_layer()
+    reply = async_to_sync(ask_round_actor)(channel_layer, {
+        'type': 'cashout',
+        'user_id': request.user.id,
+        'username': request.user.username,
+        'bet_id': bet.id,
+        'description': 'Aviator Bet Cashout at {multiplier}x',
+    }, table=bet.round.table)
+    if reply.get('status') == 'pending':
+        return Response({**reply, 'bet_id': bet.id}, status=202)
+    if 'error' in reply:
+        print(f"[REST API Cashout] Rejected for round {bet.round_id}: {reply['error']}")
+        return Response({'error': reply['error']}, status=400)
+
+    bet_round_id = bet.round_id
+    multiplier = reply['multiplier']
+    win_amount = reply['win_amount']
 
     print(f"[REST API Cashout] SUCCESS: {request.user.username} cashed out at {multiplier}x for {win_amount} from round {bet_round_id}")
 
     # 🔧 NEW: Check if this should update global top winners
     if win_amount >= 500:  # Lower threshold for more frequent updates
         print(f"🏆 Significant win detected: {win_amount}, triggering global top winners refresh")
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-        
-        channel_layer = get_channel_layer()
         if channel_layer:
-            async_to_sync(channel_layer.group_send)(
-                'aviator_room',
-                {
-                    'type': 'send_to_group',
-                    'type_override': 'top_winners_updated',
-                    'message': 'Global top winners updated',
-                    'trigger_refresh': True
-                }
-            )
+            # The top winners list is global, so every table refreshes it
+            for table in get_tables().values():
+                publish_event_sync(
+                    channel_layer,
+                    table.room_group_name,
+                    {
+                        'type': 'send_to_group',
+                        'type_override': 'top_winners_updated',
+                        'message': 'Global top winners updated',
+                        'trigger_refresh': True
+                    }
+                )
 
     return Response({
         'message': 'Cashout successful',
         'win_amount': win_amount,
         'multiplier': multiplier,
-        'new_balance': float(wallet.balance),
+        'new_balance': reply['new_balance'],
         'user_id': request.user.id,
         'server_time': int(time.time() * 1000),
         'updated_top_winners': win_amount >= 500
@@ -398,10 +308,12 @@ def cashout_aviator_bet(request):
 @permission_classes([IsAuthenticated])
 def get_round_status(request, round_id):
     try:
-        round = AviatorRound.objects.get(id=round_id)
+        # Scheduled rounds have not been played yet and the active one is still flying;
+        # their crash multipliers must stay secret
+        round = AviatorRound.objects.get(id=round_id, scheduled=False)
         return Response({
             'is_active': round.is_active,
-            'crash_multiplier': round.crash_multiplier,
+            'crash_multiplier': None if round.is_active else round.crash_multiplier,
             'start_time': round.start_time
         })
     except AviatorRound.DoesNotExist:
@@ -409,7 +321,8 @@ def get_round_status(request, round_id):
 
 @api_view(['GET'])
 def past_crashes(request):
-    recent_rounds = AviatorRound.objects.order_by('-start_time')[:20]
+    table = request.query_params.get('table', DEFAULT_TABLE)
+    recent_rounds = AviatorRound.objects.filter(scheduled=False, is_active=False, table=table).order_by('-start_time')[:20]
     data = [
         {
             "id": r.id,
@@ -553,3 +466,9 @@ def get_balance(request):
         return Response({"balance": float(wallet.balance)})
     except Wallet.DoesNotExist:
         return Response({"error": "Wallet not found"}, status=404)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def socket_stats(request):
+    # Counters for this worker process since it started
+    return Response(dict(outbox_stats.snapshot(), connections=idle_reaper.snapshot()))
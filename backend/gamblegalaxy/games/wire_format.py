@@ -0,0 +1,143 @@
+import json
+import struct
+from urllib.parse import parse_qs
+
+# WebSocket subprotocols a client may offer, mapped to the encoding they select
+SUBPROTOCOLS = {
+    'aviator.json': 'json',
+    'aviator.compact': 'compact',
+    'aviator.msgpack': 'msgpack',
+}
+
+# Binary tick layouts used by the compact encoding, little-endian:
+#   kind (u8), round_id (u32), sequence (u32), multiplier in hundredths (u32), server_time ms (u64)
+# a sync beacon appends elapsed_ms (u32)
+TICK_KINDS = {'multiplier': 1, 'sync': 2}
+TICK = struct.Struct('<BIIIQ')
+SYNC = struct.Struct('<BIIIQI')
+
+
+class JsonCodec:
+    """Default encoding: every message is a JSON text frame"""
+
+    name = 'json'
+
+    def encode(self, message):
+        """Return (text_data, bytes_data) for consumer.send(); exactly one is set"""
+        return json.dumps(message), None
+
+    def decode(self, text_data=None, bytes_data=None):
+        return json.loads(text_data if text_data is not None else bytes_data)
+
+
+class CompactCodec(JsonCodec):
+    """
+    Multiplier ticks and sync beacons - the bulk of the traffic - become fixed
+    21/25-byte binary frames; the rarer messages stay JSON text frames, so no
+    extra dependency is needed on either side.
+    """
+
+    name = 'compact'
+
+    def encode(self, message):
+        kind = TICK_KINDS.get(message.get('type'))
+        if kind is None or message.get('round_id') is None:
+            return super().encode(message)
+
+        fields = (
+            kind,
+            message['round_id'],
+            message.get('sequence', 0),
+            int(round(message['multiplier'] * 100)),
+            message['server_time'],
+        )
+        if kind == TICK_KINDS['sync']:
+            return None, SYNC.pack(*fields, message['elapsed_ms'])
+        return None, TICK.pack(*fields)
+
+
+class MsgpackCodec(JsonCodec):
+    """Every message is a MessagePack binary frame"""
+
+    name = 'msgpack'
+
+    def __init__(self):
+        # Imported lazily: msgpack is only needed when a client asks for it
+        import msgpack
+
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def encode(self, message):
+        return None, self._packb(message)
+
+    def decode(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            return self._unpackb(bytes_data)
+        return super().decode(text_data)
+
+
+CODECS = {
+    'json': JsonCodec,
+    'compact': CompactCodec,
+    'msgpack': MsgpackCodec,
+}
+
+
+def _load(encoding):
+    try:
+        return CODECS[encoding]()
+    except ImportError:
+        print(f"[WebSocket] {encoding} encoding requested but not installed")
+        return None
+
+
+def negotiate(scope):
+    """
+    Pick the codec for a connection and the subprotocol to accept it with.
+
+    The first offered `aviator.*` subprotocol we can serve wins over the `encoding`
+    query parameter; anything unknown or unavailable (msgpack not installed) falls
+    back to JSON. Returns (codec, subprotocol or None).
+    """
+    for subprotocol in scope.get('subprotocols', []):
+        codec = _load(SUBPROTOCOLS[subprotocol]) if subprotocol in SUBPROTOCOLS else None
+        if codec:
+            return codec, subprotocol
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    encoding = query.get('encoding', ['json'])[0]
+    codec = _load(encoding) if encoding in CODECS else None
+    return codec or JsonCodec(), None
+
+
+_shared_codecs = None
+
+
+def shared_codecs():
+    """One instance of every codec this process can serve, for encoding broadcasts"""
+    global _shared_codecs
+    if _shared_codecs is None:
+        codecs = []
+        for codec_class in CODECS.values():
+            try:
+                codecs.append(codec_class())
+            except ImportError:
+                pass
+        _shared_codecs = codecs
+    return _shared_codecs
+
+
+def encode_once(message):
+    """
+    Encode a broadcast for every available codec up front.
+
+    The result rides along in the group message, so each consumer forwards the
+    frame for its own codec verbatim instead of encoding the same message again:
+    one encode per codec per broadcast, whatever the number of sockets.
+    """
+    frames = {}
+    for codec in shared_codecs():
+        text_data, bytes_data = codec.encode(message)
+        frames[codec.name] = [text_data, bytes_data]
+    return frames
@@ -0,0 +1,30 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    auth = JWTAuthentication()
+    return auth.get_user(auth.get_validated_token(raw_token))
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate a WebSocket with the same access token the REST API takes,
+    passed as ?token=<access>. Without a token (or with a bad one) the session
+    user set by AuthMiddlewareStack is left as is.
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        token = (query.get("token") or [None])[0]
+        if token:
+            try:
+                scope["user"] = await get_user_for_token(token)
+            except (InvalidToken, AuthenticationFailed) as e:
+                print(f"[WebSocket] Rejected token: {e}")
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,49 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, DecimalField
+
+from .models import Wallet, Transaction
+from .signals import transactions_recorded
+
+
+def credit_wallets(credits, transaction_type='winning'):
+    """
+    Apply many wallet credits in one UPDATE and record them in one bulk insert.
+
+    `credits` is an iterable of (user_id, amount, description); several credits for
+    the same user are summed into their wallet but each keeps its own ledger row.
+    Credits for users without a wallet are skipped. Returns the created transactions.
+    """
+    credits = [(user_id, Decimal(str(amount)), description) for user_id, amount, description in credits]
+    if not credits:
+        return []
+
+    totals = defaultdict(Decimal)
+    for user_id, amount, _ in credits:
+        totals[user_id] += amount
+
+    with transaction.atomic():
+        funded = set(Wallet.objects.filter(user_id__in=totals).values_list('user_id', flat=True))
+        for user_id in totals.keys() - funded:
+            print(f"[WALLET] No wallet for user {user_id}, credit skipped")
+        if not funded:
+            return []
+
+        Wallet.objects.filter(user_id__in=funded).update(balance=F('balance') + Case(
+            *[When(user_id=user_id, then=Value(totals[user_id])) for user_id in funded],
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ))
+        ledger = Transaction.objects.bulk_create([
+            Transaction(
+                user_id=user_id,
+                amount=amount,
+                transaction_type=transaction_type,
+                description=description
+            )
+            for user_id, amount, description in credits
+            if user_id in funded
+        ])
+        transactions_recorded.send(sender=Transaction, transactions=ledger)
+    return ledger
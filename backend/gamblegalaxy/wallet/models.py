@@ -28,6 +28,7 @@ class Transaction(models.Model):
         WINNING = 'winning', _('Winning')  # Bonus type for winnings
         BONUS = 'bonus', _('Bonus')
         PENALTY = 'penalty', _('Penalty')
+        REFUND = 'refund', _('Refund')  # Stakes of voided Aviator rounds
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions')
     amount = models.DecimalField(max_digits=12, decimal_places=2)
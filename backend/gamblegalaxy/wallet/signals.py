@@ -1,9 +1,13 @@
 from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.dispatch import receiver, Signal
 from django.conf import settings
 from .models import Wallet
 
+# Sent after transactions are bulk-inserted, which bypasses post_save.
+# `transactions` is the list of created Transaction instances.
+transactions_recorded = Signal()
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_wallet(sender, instance, created, **kwargs):
     if created and not hasattr(instance, 'wallet'):
-        Wallet.objects.create(user=instance)
\ No newline at end of file
+        Wallet.objects.create(user=instance)
@@ -178,214 +178,218 @@ export const useWebSocket = create<WebSocketState>((set, get) => ({
 
     newSocket.onmessage = (event) => {
       try {
-        const data = JSON.parse(event.data)
-        console.log("📨 WebSocket message:", data.type, data)
-        const currentState = get()
-        const now = data.server_time || Date.now()
-
-        switch (data.type) {
-          case "betting_open":
-            console.log("🎰 BETTING PHASE - Server authoritative")
-            if (bettingCountdownInterval) clearInterval(bettingCountdownInterval)
-
-            set({
-              gamePhase: "betting",
-              isBettingPhase: true,
-              isRoundActive: false,
-              roundCrashed: false,
-              currentMultiplier: 1.0,
-              serverCrashMultiplier: null,
-              currentRoundId: null,
-              bettingTimeLeft: data.countdown || 5,
-              activeBets: new Map(),
-              recentCashouts: [],
-              serverTime: now,
-              lastServerSync: now,
-            })
-
-            let timeLeft = data.countdown || 5
-            bettingCountdownInterval = setInterval(() => {
-              timeLeft -= 1
-              set({ bettingTimeLeft: Math.max(0, timeLeft) })
-              if (timeLeft <= 0) {
-                clearInterval(bettingCountdownInterval!)
-                set({ isBettingPhase: false })
-              }
-            }, 1000)
-            break
-
-          case "round_started":
-            console.log("🚀 ROUND STARTED - Server authoritative")
-            console.log(`🎯 Round ID: ${data.round_id}, Server crash point: ${data.crash_multiplier}x`)
-            if (bettingCountdownInterval) clearInterval(bettingCountdownInterval)
-
-            set({
-              gamePhase: "flying",
-              currentRoundId: data.round_id,
-              isRoundActive: true,
-              isBettingPhase: false,
-              roundCrashed: false,
-              currentMultiplier: data.multiplier || 1.0,
-              serverCrashMultiplier: data.crash_multiplier,
-              roundStartTime: now,
-              bettingTimeLeft: 0,
-              serverTime: now,
-              lastServerSync: now,
-            })
-            break
-
-          case "multiplier":
-          case "multiplier_update":
-            if (!currentState.roundCrashed) {
-              console.log(`📈 Server multiplier: ${data.multiplier}x`)
+        const message = JSON.parse(event.data)
+        // 🔧 With AVIATOR_EVENT_FRAMES on, the server batches a tick's bets and cashouts into one 'frame'
+        const events = message.type === "frame" ? message.events : [message]
+        for (const data of events) {
+          console.log("📨 WebSocket message:", data.type, data)
+          const currentState = get()
+          const now = data.server_time || Date.now()
+
+          switch (data.type) {
+            case "betting_open":
+              console.log("🎰 BETTING PHASE - Server authoritative")
+              if (bettingCountdownInterval) clearInterval(bettingCountdownInterval)
+
               set({
-                currentMultiplier: Number.parseFloat((data.multiplier || 1.0).toFixed(2)),
-                isRoundActive: true,
-                gamePhase: "flying",
+                gamePhase: "betting",
+                isBettingPhase: true,
+                isRoundActive: false,
+                roundCrashed: false,
+                currentMultiplier: 1.0,
+                serverCrashMultiplier: null,
+                currentRoundId: null,
+                bettingTimeLeft: data.countdown || 5,
+                activeBets: new Map(),
+                recentCashouts: [],
                 serverTime: now,
                 lastServerSync: now,
               })
 
-              const totalBets = currentState.activeBets?.size || 0
-              set({ livePlayers: totalBets })
-            }
-            break
-
-          case "crash":
-          case "round_crashed":
-            console.log("💥 ROUND CRASHED - Server authoritative")
-            console.log(`🎯 Final crash: ${data.multiplier}x`)
-            const crashMultiplier = Number.parseFloat((data.multiplier || 1.0).toFixed(2))
-            const newPastCrashes = currentState.addCrashToHistory(crashMultiplier)
-
-            set({
-              gamePhase: "crashed",
-              isRoundActive: false,
-              isBettingPhase: false,
-              roundCrashed: true,
-              lastCrashMultiplier: crashMultiplier,
-              currentMultiplier: crashMultiplier,
-              livePlayers: 0,
-              serverTime: now,
-              lastServerSync: now,
-            })
-
-            if (typeof window !== "undefined") {
-              window.dispatchEvent(
-                new CustomEvent("planeCrashed", {
-                  detail: { crashMultiplier, pastCrashes: newPastCrashes },
-                }),
-              )
-            }
-            playSound("crash")
-            break
-
-          case "game_state":
-          case "game_state_sync":
-            console.log("🔄 GAME STATE SYNC from server")
-            console.log(
-              `📊 Server state: round=${data.round_id}, multiplier=${data.current_multiplier}, crashed=${data.crashed}, crash_at=${data.crash_multiplier}, betting=${data.is_betting}`,
-            )
-
-            set({
-              currentRoundId: data.round_id,
-              currentMultiplier: data.current_multiplier || 1.0,
-              serverCrashMultiplier: data.crash_multiplier,
-              isRoundActive: data.is_active || false,
-              isBettingPhase: data.is_betting || false,
-              roundCrashed: data.crashed || false,
-              serverTime: now,
-              lastServerSync: now,
-            })
-            break
-
-          case "bet_placed":
-            console.log("✅ Bet placed via WebSocket:", data)
-            if (data.user_id && data.bet_id) {
-              const currentBets = currentState.activeBets || new Map<number, BetInfo>()
-              const newBets = new Map(currentBets)
-              newBets.set(data.user_id, {
-                id: data.bet_id,
-                amount: data.amount,
-                auto_cashout: data.auto_cashout,
-                placed_at: now,
+              let timeLeft = data.countdown || 5
+              bettingCountdownInterval = setInterval(() => {
+                timeLeft -= 1
+                set({ bettingTimeLeft: Math.max(0, timeLeft) })
+                if (timeLeft <= 0) {
+                  clearInterval(bettingCountdownInterval!)
+                  set({ isBettingPhase: false })
+                }
+              }, 1000)
+              break
+
+            case "round_started":
+              console.log("🚀 ROUND STARTED - Server authoritative")
+              console.log(`🎯 Round ID: ${data.round_id}, Server crash point: ${data.crash_multiplier}x`)
+              if (bettingCountdownInterval) clearInterval(bettingCountdownInterval)
+
+              set({
+                gamePhase: "flying",
+                currentRoundId: data.round_id,
+                isRoundActive: true,
+                isBettingPhase: false,
+                roundCrashed: false,
+                currentMultiplier: data.multiplier || 1.0,
+                serverCrashMultiplier: data.crash_multiplier,
+                roundStartTime: now,
+                bettingTimeLeft: 0,
+                serverTime: now,
+                lastServerSync: now,
               })
-              set({ activeBets: newBets })
+              break
+
+            case "multiplier":
+            case "multiplier_update":
+              if (!currentState.roundCrashed) {
+                console.log(`📈 Server multiplier: ${data.multiplier}x`)
+                set({
+                  currentMultiplier: Number.parseFloat((data.multiplier || 1.0).toFixed(2)),
+                  isRoundActive: true,
+                  gamePhase: "flying",
+                  serverTime: now,
+                  lastServerSync: now,
+                })
+
+                const totalBets = currentState.activeBets?.size || 0
+                set({ livePlayers: totalBets })
+              }
+              break
+
+            case "crash":
+            case "round_crashed":
+              console.log("💥 ROUND CRASHED - Server authoritative")
+              console.log(`🎯 Final crash: ${data.multiplier}x`)
+              const crashMultiplier = Number.parseFloat((data.multiplier || 1.0).toFixed(2))
+              const newPastCrashes = currentState.addCrashToHistory(crashMultiplier)
 
-              console.log("📥 Updated activeBets via WebSocket:", {
-                userId: data.user_id,
-                betId: data.bet_id,
-                totalBets: newBets.size,
-                allBets: Array.from(newBets.entries()),
+              set({
+                gamePhase: "crashed",
+                isRoundActive: false,
+                isBettingPhase: false,
+                roundCrashed: true,
+                lastCrashMultiplier: crashMultiplier,
+                currentMultiplier: crashMultiplier,
+                livePlayers: 0,
+                serverTime: now,
+                lastServerSync: now,
               })
-            }
 
-            if (typeof data.new_balance === "number" && typeof window !== "undefined") {
-              window.dispatchEvent(
-                new CustomEvent("walletBalanceUpdate", {
-                  detail: { balance: data.new_balance },
-                }),
-              )
-            }
-            break
-
-          case "cash_out":
-            console.log("💰 Cash out:", data)
-            if (data.username) {
-              const newCashout: RecentCashout = {
-                username: data.username,
-                multiplier: data.multiplier,
-                amount: data.amount,
-                win_amount: data.win_amount,
-                timestamp: new Date().toISOString(),
-                is_bot: false,
+              if (typeof window !== "undefined") {
+                window.dispatchEvent(
+                  new CustomEvent("planeCrashed", {
+                    detail: { crashMultiplier, pastCrashes: newPastCrashes },
+                  }),
+                )
               }
-              const newRecentCashouts = [newCashout, ...currentState.recentCashouts].slice(0, 20)
-              set({ recentCashouts: newRecentCashouts })
-            }
-            break
-
-          case "cash_out_success":
-            console.log("💰 Cashout successful:", data)
-            if (data.user_id) {
-              const currentBets = currentState.activeBets || new Map<number, BetInfo>()
-              const newBets = new Map(currentBets)
-              newBets.delete(data.user_id)
-              set({ activeBets: newBets })
-            }
-
-            if (typeof data.new_balance === "number" && typeof window !== "undefined") {
-              window.dispatchEvent(
-                new CustomEvent("walletBalanceUpdate", {
-                  detail: { balance: data.new_balance },
-                }),
+              playSound("crash")
+              break
+
+            case "game_state":
+            case "game_state_sync":
+              console.log("🔄 GAME STATE SYNC from server")
+              console.log(
+                `📊 Server state: round=${data.round_id}, multiplier=${data.current_multiplier}, crashed=${data.crashed}, crash_at=${data.crash_multiplier}, betting=${data.is_betting}`,
               )
-            }
-            playSound("cashout")
-            break
-
-          case "bet_error":
-          case "cashout_error":
-            console.error("❌ Server error:", data.message)
-            if (data.server_crash) {
-              console.error(`🚨 Server says round crashed at ${data.server_crash}x`)
-            }
-            toast.error("Game Error", {
-              description: data.message || "An error occurred",
-            })
-            break
-
-          case "round_summary":
-            console.log("📊 Round summary:", data)
-            break
-
-          case "pong":
-            set({ serverTime: now, lastServerSync: now })
-            break
-
-          default:
-            console.warn("⚠️ Unknown message type:", data.type)
-            break
+
+              set({
+                currentRoundId: data.round_id,
+                currentMultiplier: data.current_multiplier || 1.0,
+                serverCrashMultiplier: data.crash_multiplier,
+                isRoundActive: data.is_active || false,
+                isBettingPhase: data.is_betting || false,
+                roundCrashed: data.crashed || false,
+                serverTime: now,
+                lastServerSync: now,
+              })
+              break
+
+            case "bet_placed":
+              console.log("✅ Bet placed via WebSocket:", data)
+              if (data.user_id && data.bet_id) {
+                const currentBets = currentState.activeBets || new Map<number, BetInfo>()
+                const newBets = new Map(currentBets)
+                newBets.set(data.user_id, {
+                  id: data.bet_id,
+                  amount: data.amount,
+                  auto_cashout: data.auto_cashout,
+                  placed_at: now,
+                })
+                set({ activeBets: newBets })
+
+                console.log("📥 Updated activeBets via WebSocket:", {
+                  userId: data.user_id,
+                  betId: data.bet_id,
+                  totalBets: newBets.size,
+                  allBets: Array.from(newBets.entries()),
+                })
+              }
+
+              if (typeof data.new_balance === "number" && typeof window !== "undefined") {
+                window.dispatchEvent(
+                  new CustomEvent("walletBalanceUpdate", {
+                    detail: { balance: data.new_balance },
+                  }),
+                )
+              }
+              break
+
+            case "cash_out":
+              console.log("💰 Cash out:", data)
+              if (data.username) {
+                const newCashout: RecentCashout = {
+                  username: data.username,
+                  multiplier: data.multiplier,
+                  amount: data.amount,
+                  win_amount: data.win_amount,
+                  timestamp: new Date().toISOString(),
+                  is_bot: false,
+                }
+                const newRecentCashouts = [newCashout, ...currentState.recentCashouts].slice(0, 20)
+                set({ recentCashouts: newRecentCashouts })
+              }
+              break
+
+            case "cash_out_success":
+              console.log("💰 Cashout successful:", data)
+              if (data.user_id) {
+                const currentBets = currentState.activeBets || new Map<number, BetInfo>()
+                const newBets = new Map(currentBets)
+                newBets.delete(data.user_id)
+                set({ activeBets: newBets })
+              }
+
+              if (typeof data.new_balance === "number" && typeof window !== "undefined") {
+                window.dispatchEvent(
+                  new CustomEvent("walletBalanceUpdate", {
+                    detail: { balance: data.new_balance },
+                  }),
+                )
+              }
+              playSound("cashout")
+              break
+
+            case "bet_error":
+            case "cashout_error":
+              console.error("❌ Server error:", data.message)
+              if (data.server_crash) {
+                console.error(`🚨 Server says round crashed at ${data.server_crash}x`)
+              }
+              toast.error("Game Error", {
+                description: data.message || "An error occurred",
+              })
+              break
+
+            case "round_summary":
+              console.log("📊 Round summary:", data)
+              break
+
+            case "pong":
+              set({ serverTime: now, lastServerSync: now })
+              break
+
+            default:
+              console.warn("⚠️ Unknown message type:", data.type)
+              break
+          }
         }
       } catch (error) {
         console.error("❌ Error parsing WebSocket message:", error)